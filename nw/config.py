@@ -27,6 +27,7 @@
 
 import logging
 import configparser
+import importlib.util
 import shutil
 import json
 import sys
@@ -111,6 +112,7 @@ class Config:
         ## Project
         self.autoSaveProj = 60 # Interval for auto-saving project in seconds
         self.autoSaveDoc  = 30 # Interval for auto-saving document in seconds
+        self.indexFormat  = nwConst.IDX_JSON # Storage format of the project index
 
         ## Text Editor
         self.textFont        = None  # Editor font
@@ -217,6 +219,7 @@ class Config:
 
         # Packages
         self.hasEnchant   = False # The pyenchant package
+        self.hasNumPy     = False # The numpy package
         self.hasAssistant = False # The Qt Assistant executable
 
         # Recent Cache
@@ -428,6 +431,9 @@ class Config:
         self.autoSaveDoc = self._parseLine(
             cnfParse, cnfSec, "autosavedoc", self.CNF_INT, self.autoSaveDoc
         )
+        self.indexFormat = self._parseLine(
+            cnfParse, cnfSec, "indexformat", self.CNF_STR, self.indexFormat
+        )
 
         ## Editor
         cnfSec = "Editor"
@@ -611,6 +617,7 @@ class Config:
         cnfParse.add_section(cnfSec)
         cnfParse.set(cnfSec, "autosaveproject", str(self.autoSaveProj))
         cnfParse.set(cnfSec, "autosavedoc",     str(self.autoSaveDoc))
+        cnfParse.set(cnfSec, "indexformat",     str(self.indexFormat))
 
         ## Editor
         cnfSec = "Editor"
@@ -974,6 +981,17 @@ class Config:
             self.hasEnchant = False
             logger.debug("Checking package 'pyenchant': Missing")
 
+        # NumPy is slow to import, so it is only looked up here, and is
+        # imported when first used
+        try:
+            self.hasNumPy = importlib.util.find_spec("numpy") is not None
+        except Exception:
+            self.hasNumPy = False
+        if self.hasNumPy:
+            logger.debug("Checking package 'numpy': Ok")
+        else:
+            logger.debug("Checking package 'numpy': Missing")
+
         assistPath = shutil.which("assistant")
         self.hasAssistant = assistPath is not None
         if self.hasAssistant:
@@ -41,6 +41,17 @@ class nwConst():
     MAX_DOCSIZE   = 5000000  # Maxium size of a single document
     MAX_BUILDSIZE = 10000000 # Maxium size of a project build
 
+    # Build Settings
+    MIN_PARALLEL_BUILD = 100 # Minimum number of documents for a parallel project build
+
+    # Index Settings
+    MIN_PARALLEL_INDEX = 200 # Minimum number of documents for a parallel index rebuild
+
+    # Index Storage Formats
+    IDX_JSON   = "json"
+    IDX_SQLITE = "sqlite"
+    IDX_BINARY = "binary"
+
     # Spell Check Providers
     SP_INTERNAL = "internal"
     SP_ENCHANT  = "enchant"
@@ -75,9 +86,15 @@ class nwFiles():
     TOC_TXT     = "ToC.txt"
     SESS_STATS  = "sessionStats.log"
     INDEX_FILE  = "tagsIndex.json"
+    INDEX_DB    = "tagsIndex.sqlite"
+    INDEX_BIN   = "tagsIndex.nwi"
+    INDEX_TEXT  = "textIndex"
+    INDEX_JNL   = "tagsIndex.jnl"
     OPTS_FILE   = "guiOptions.json"
     RECENT_FILE = "recentProjects.json"
     BUILD_CACHE = "prevBuild.json"
+    BUILD_DOCS  = "buildDocs.json"
+    BUILD_DIR   = "buildDocs"
 
 # END Class nwFiles
 
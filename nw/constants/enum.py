@@ -145,3 +145,17 @@ class nwOutline(Enum):
     SYNOP  = 15
 
 # END Enum nwOutline
+
+class nwIndexEvent(Enum):
+
+    INDEX_RESET    = 0
+    HEAD_ADDED     = 1
+    HEAD_REMOVED   = 2
+    HEAD_CHANGED   = 3
+    TAG_ADDED      = 4
+    TAG_MOVED      = 5
+    TAG_REMOVED    = 6
+    REFS_CHANGED   = 7
+    COUNTS_CHANGED = 8
+
+# END Enum nwIndexEvent
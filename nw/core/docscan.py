@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Document Scanning
+
+ novelWriter – Document Scanning
+=================================
+ Functions for reading and scanning document files outside of NWDoc
+
+ File History:
+ Created: 2021-02-12 [1.1rc1]
+
+ This file is a part of novelWriter
+ Copyright 2018–2021, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================================== #
+#  Read a Document File
+# =============================================================================================== #
+
+def readDocFile(docPath):
+    """Read the text of a document file from disk, skipping the meta
+    data lines at the top like NWDoc does. This function is used by the
+    index and build workers, which may run in worker processes, so it
+    only depends on the path. Returns the text and the file stamp, which
+    is the modification time and size of the file. A file that does not
+    exist has an empty text and no stamp, and a file that could not be
+    read has neither.
+    """
+    theText = ""
+    fileStamp = None
+    if not os.path.isfile(docPath):
+        return theText, fileStamp
+
+    try:
+        theStat = os.stat(docPath)
+        with open(docPath, mode="r", encoding="utf8") as inFile:
+            # Skip the meta data lines at the top of the file
+            for i in range(10):
+                inLine = inFile.readline()
+                if not inLine.startswith(r"%%~"):
+                    theText = inLine
+                    break
+            theText += inFile.read()
+        fileStamp = [theStat.st_mtime_ns, theStat.st_size]
+
+    except Exception as e:
+        logger.error("Failed to read document file %s" % docPath)
+        logger.error(str(e))
+        return None, None
+
+    return theText, fileStamp
+
+# =============================================================================================== #
+#  Check @ Lines
+# =============================================================================================== #
+
+def scanThis(aLine):
+    """Scan a line starting with @ to check that it's valid. Then
+    split it up into its elements and positions as two arrays.
+    """
+    theBits = [] # The elements of the string
+    thePos  = [] # The absolute position of each element
+
+    aLine = aLine.rstrip() # Remove all trailing white spaces
+    nChar = len(aLine)
+    if nChar < 2:
+        return False, theBits, thePos
+    if aLine[0] != "@":
+        return False, theBits, thePos
+
+    cKey, _, cVals = aLine.partition(":")
+    sKey = cKey.strip()
+    if sKey == "@":
+        return False, theBits, thePos
+
+    cPos = 0
+    theBits.append(sKey)
+    thePos.append(cPos)
+    cPos += len(cKey) + 1
+
+    if not cVals:
+        # No values, so we're done
+        return True, theBits, thePos
+
+    for cVal in cVals.split(","):
+        sVal = cVal.strip()
+        rLen = len(cVal.lstrip())
+        tLen = len(cVal)
+        theBits.append(sVal)
+        thePos.append(cPos + tLen - rLen)
+        cPos += tLen + 1
+
+    return True, theBits, thePos
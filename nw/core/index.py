@@ -27,21 +27,33 @@
 
 import nw
 import logging
-import json
+import multiprocessing
+import hashlib
 import os
 
+from array import array
+from bisect import bisect_left, bisect_right, insort
 from time import time
 
 from nw.constants import (
-    nwFiles, nwKeyWords, nwItemType, nwItemClass, nwItemLayout, nwAlert
+    nwConst, nwFiles, nwKeyWords, nwItemType, nwItemClass, nwItemLayout, nwAlert, nwIndexEvent
 )
+from nw.core.docscan import readDocFile, scanThis
 from nw.core.document import NWDoc
-from nw.core.tools import countWords
+from nw.core.indexstore import (
+    NWIndexJson, NWIndexDB, NWIndexFile, NWIndexJournal, NWIndexMap, NWHeading, NWHeadingMap
+)
+from nw.core.refquery import NWRefQuery
+from nw.core.refstats import NWRefStats
+from nw.core.textindex import NWTextIndex
+from nw.core.tools import countSections
 
 logger = logging.getLogger(__name__)
 
 class NWIndex():
 
+    JOURNAL_MAX = 500 # Journal entries before it is compacted
+
     def __init__(self, theProject, theParent):
 
         # Internal
@@ -49,19 +61,54 @@ class NWIndex():
         self.theProject  = theProject
         self.theParent   = theParent
         self.indexBroken = False
+        self.indexFormat = self.mainConf.indexFormat
+        self.indexStore  = None
+        self.indexJnl    = None
 
         # Indices
         self.tagIndex   = None
+        self.tagHandles = None
+        self.tagNames   = None
         self.refIndex   = None
+        self.tagRefs    = None
         self.novelIndex = None
         self.noteIndex  = None
         self.textCounts = None
+        self.fileStamps = None
+
+        # Full-text index, loaded from file when first needed
+        self.textIndex   = NWTextIndex()
+        self._textLoaded = True
 
         # TimeStamps
         self.timeNovel = 0
         self.timeNote  = 0
         self.timeIndex = 0
 
+        # The section records of the last scan of each document, keyed
+        # by the hash of the section
+        self._docSections = {}
+
+        # Handles changed since the index was last loaded or saved
+        self._changedHandles = set()
+        self._changedAll     = True
+
+        # Novel structure version tracking and cache
+        self._novelVersion = 0    # Incremented when the novel structure changes
+        self._novelReset   = 0    # The last version that requires a full rebuild
+        self._novelChanges = {}   # The last version each novel document changed
+        self._novelCache   = {}   # Cached structures, keyed by skipExcluded
+        self._treeVersion  = None # The last seen project tree version
+
+        # Reference query lookup, rebuilt when the novel or the
+        # references change
+        self._refVersion = 0
+        self._refQuery   = {}
+        self._refStats   = {}
+
+        # Functions called with the change events of each index update
+        self._indexListeners = []
+
         self.clearIndex()
 
         return
@@ -73,14 +120,28 @@ class NWIndex():
     def clearIndex(self):
         """Clear the index dictionaries and time stamps.
         """
-        self.tagIndex   = {}
-        self.refIndex   = {}
-        self.novelIndex = {}
-        self.noteIndex  = {}
-        self.textCounts = {}
-        self.timeNovel  = 0
-        self.timeNote   = 0
-        self.timeIndex  = 0
+        self._resetIndex()
+        self._notifyListeners([(nwIndexEvent.INDEX_RESET, None, None)])
+        return
+
+    def addListener(self, theListener):
+        """Register a function to be called after each change to the
+        index. It is called with a list of change events, where each
+        event is a tuple of an nwIndexEvent, the handle of the document,
+        and a key. The key is the line number of the header for header
+        events, the tag name for tag events, and None otherwise. An
+        INDEX_RESET event, which has no handle, means that the whole
+        index has changed.
+        """
+        if theListener not in self._indexListeners:
+            self._indexListeners.append(theListener)
+        return
+
+    def removeListener(self, theListener):
+        """Remove a function registered with addListener.
+        """
+        if theListener in self._indexListeners:
+            self._indexListeners.remove(theListener)
         return
 
     def deleteHandle(self, tHandle):
@@ -88,25 +149,28 @@ class NWIndex():
         """
         logger.debug("Removing item %s from the index" % tHandle)
 
-        delTags = []
-        for tTag in self.tagIndex:
-            if self.tagIndex[tTag][1] == tHandle:
-                delTags.append(tTag)
+        if tHandle in self.novelIndex:
+            self._changedNovel(tHandle)
 
-        for tTag in delTags:
-            self.tagIndex.pop(tTag, None)
+        theEvents = []
+        self._diffHeads(tHandle, self._getHeads(tHandle), {}, theEvents)
+        self._diffTags(tHandle, self._getTags(tHandle), {}, theEvents)
+        if self.refIndex.get(tHandle):
+            theEvents.append((nwIndexEvent.REFS_CHANGED, tHandle, None))
+        if tHandle in self.textCounts:
+            theEvents.append((nwIndexEvent.COUNTS_CHANGED, tHandle, None))
 
-        self.refIndex.pop(tHandle, None)
-        self.novelIndex.pop(tHandle, None)
-        self.noteIndex.pop(tHandle, None)
-        self.textCounts.pop(tHandle, None)
+        self._removeHandle(tHandle)
+        self._journalDelete(tHandle)
+        self._notifyListeners(theEvents)
 
         return
 
     def reIndexHandle(self, tHandle):
         """Put a file back into the index. This is used when files are
         moved from the archive or trash folders back into the active
-        project.
+        project. An empty document is also indexed, so that it has
+        entries in the index, but a document that cannot be read is not.
         """
         logger.debug("Re-indexing item %s" % tHandle)
 
@@ -118,102 +182,175 @@ class NWIndex():
 
         theDoc = NWDoc(self.theProject, self.theParent)
         theText = theDoc.openDocument(tHandle, showStatus=False)
-        if theText:
+        if theText is not None:
             self.scanText(tHandle, theText)
 
         return True
 
+    def reIndexChanged(self):
+        """Compare the file stamps of all documents on disk with the
+        ones recorded when they were last indexed, and rescan only the
+        documents that differ. This catches documents that have been
+        changed outside of novelWriter, or after the index was last
+        saved. Returns a list of the handles that were rescanned.
+        """
+        logger.debug("Checking for documents changed since last indexed")
+        diskStamps = self._getFileStamps()
+
+        theHandles = []
+        for tHandle in self.theProject.projTree.handles():
+            tItem = self.theProject.projTree[tHandle]
+            if tItem is None or tItem.itemType != nwItemType.FILE:
+                continue
+            if tItem.itemLayout == nwItemLayout.NO_LAYOUT:
+                continue
+
+            fileStamp = diskStamps.get(tHandle, None)
+            if fileStamp == self.fileStamps.get(tHandle, None):
+                continue
+
+            if fileStamp is None:
+                logger.debug("Document %s no longer exists on disk" % tHandle)
+                self.deleteHandle(tHandle)
+            else:
+                logger.debug("Document %s has changed on disk" % tHandle)
+                self.reIndexHandle(tHandle)
+
+            theHandles.append(tHandle)
+
+        logger.debug("Re-indexed %d changed document(s)" % len(theHandles))
+
+        return theHandles
+
     ##
     #  Load and Save Index to/from File
     ##
 
     def loadIndex(self):
         """Load index from last session from the project meta folder.
+        Only the tags, counts and file stamps are loaded here, and the
+        references and headers of each document are loaded and checked
+        when first needed. A document whose entries turn out to be
+        damaged is scanned again. If the database or binary index file
+        doesn't exist yet, the JSON index file is loaded instead, and is
+        converted on the next save.
         """
-        theData   = {}
-        indexFile = os.path.join(self.theProject.projMeta, nwFiles.INDEX_FILE)
-
-        if os.path.isfile(indexFile):
-            logger.debug("Loading index file")
-            try:
-                with open(indexFile, mode="r", encoding="utf8") as inFile:
-                    theData = json.load(inFile)
-            except Exception as e:
-                logger.error("Failed to load index file")
-                logger.error(str(e))
+        self._resetNovel()
+        self._docSections = {}
+        self.indexFormat = self.mainConf.indexFormat
+
+        theStore = self._getIndexStore()
+        isConverted = False
+        if not theStore.storeExists() and self.indexFormat != nwConst.IDX_JSON:
+            jsonStore = NWIndexJson(os.path.join(self.theProject.projMeta, nwFiles.INDEX_FILE))
+            if jsonStore.storeExists():
+                theStore = jsonStore
+                isConverted = True
+
+        if theStore.storeExists():
+            logger.debug("Loading index from %s" % theStore.storePath)
+            if not theStore.readIndex(self):
                 return False
 
-            self.tagIndex   = theData.get("tagIndex", {})
-            self.refIndex   = theData.get("refIndex", {})
-            self.novelIndex = theData.get("novelIndex", {})
-            self.noteIndex  = theData.get("noteIndex", {})
-            self.textCounts = theData.get("textCounts", {})
+            for theMap in (self.refIndex, self.novelIndex, self.noteIndex):
+                if isinstance(theMap, NWIndexMap):
+                    theMap.setFailureHandler(self._repairHandle)
+
+            self._buildTagHandles()
+            self._changedHandles = set()
+            self._changedAll = isConverted
+            self._replayJournal()
 
             nowTime = round(time())
             self.timeNovel = nowTime
             self.timeNote  = nowTime
             self.timeIndex = nowTime
 
+            self.textIndex   = NWTextIndex()
+            self._textLoaded = False
+
         self.checkIndex()
+        self._notifyListeners([(nwIndexEvent.INDEX_RESET, None, None)])
 
         return True
 
     def saveIndex(self):
-        """Save the current index as a json file in the project meta
-        data folder.
+        """Save the current index to the project meta data folder, in
+        the chosen storage format. If the index is stored in a database,
+        only the entries of documents that have changed are saved. The
+        full-text index is saved to its own folder if it has changed.
         """
-        logger.debug("Saving index file")
-        indexFile = os.path.join(self.theProject.projMeta, nwFiles.INDEX_FILE)
+        self._saveTextIndex()
 
-        try:
-            with open(indexFile, mode="w+", encoding="utf8") as outFile:
-                json.dump({
-                    "tagIndex"   : self.tagIndex,
-                    "refIndex"   : self.refIndex,
-                    "novelIndex" : self.novelIndex,
-                    "noteIndex"  : self.noteIndex,
-                    "textCounts" : self.textCounts,
-                }, outFile, indent=2)
-        except Exception as e:
-            logger.error("Failed to save index file")
-            logger.error(str(e))
+        theStore = self._getIndexStore()
+        logger.debug("Saving index to %s" % theStore.storePath)
+        if self.indexFormat == nwConst.IDX_SQLITE:
+            theHandles = None if self._changedAll else self._changedHandles
+            if not theStore.writeIndex(self, theHandles):
+                return False
+        elif not theStore.writeIndex(self):
             return False
 
+        self._changedHandles = set()
+        self._changedAll = False
+        self._clearJournal()
+
         return True
 
+    def syncJournal(self):
+        """Sync the changes added to the journal since the last sync to
+        disk. This is done on a timer rather than on every scan.
+        """
+        theJournal = self._getJournal()
+        if theJournal is None:
+            return True
+        return theJournal.syncJournal()
+
     def checkIndex(self):
-        """Check that the entries in the index are valid and contain the
-        elements it should.
+        """Check that the tags, counts and file stamps in the index are
+        valid, as well as the references and headers that have already
+        been loaded. The rest are checked when they are loaded. A
+        document with invalid entries is scanned again on its own. Only
+        if the index cannot be checked at all, it is cleared and marked
+        as broken, so that it is rebuilt in full.
         """
         logger.debug("Checking index")
         self.indexBroken = False
 
+        badTags = []
+        badHandles = set()
         try:
-            for tTag in self.tagIndex:
-                if len(self.tagIndex[tTag]) != 4:
-                    self.indexBroken = True
-
-            for tHandle in self.refIndex:
-                for sTitle in self.refIndex[tHandle]:
-                    for tEntry in self.refIndex[tHandle][sTitle]["tags"]:
-                        if len(tEntry) != 3:
-                            self.indexBroken = True
-
-            for tHandle in self.novelIndex:
-                for sLine in self.novelIndex[tHandle]:
-                    if len(self.novelIndex[tHandle][sLine].keys()) != 8:
-                        self.indexBroken = True
-
-            for tHandle in self.noteIndex:
-                for sLine in self.noteIndex[tHandle]:
-                    if len(self.noteIndex[tHandle][sLine].keys()) != 8:
-                        self.indexBroken = True
-
-            for tHandle in self.textCounts:
-                if len(self.textCounts[tHandle]) != 3:
-                    self.indexBroken = True
-
-        except Exception:
+            for tTag, tagEntry in self.tagIndex.items():
+                if not isinstance(tagEntry, list) or len(tagEntry) != 4:
+                    # The document defining the tag must be known
+                    if tagEntry[1] not in self.textCounts:
+                        raise ValueError("Invalid tag entry '%s'" % tTag)
+                    badTags.append(tTag)
+                    badHandles.add(tagEntry[1])
+
+            for tHandle, theRefs in self._loadedEntries(self.refIndex):
+                if not self._validRefs(theRefs):
+                    badHandles.add(tHandle)
+
+            for tHandle, theHeads in self._loadedEntries(self.novelIndex):
+                if not self._validHeadings(theHeads):
+                    badHandles.add(tHandle)
+
+            for tHandle, theHeads in self._loadedEntries(self.noteIndex):
+                if not self._validHeadings(theHeads):
+                    badHandles.add(tHandle)
+
+            for tHandle, theCounts in self.textCounts.items():
+                if not isinstance(theCounts, list) or len(theCounts) != 3:
+                    badHandles.add(tHandle)
+
+            for tHandle, fileStamp in self.fileStamps.items():
+                if fileStamp is not None and len(fileStamp) != 2:
+                    badHandles.add(tHandle)
+
+        except Exception as e:
+            logger.error("Failed to check index")
+            logger.error(str(e))
             self.indexBroken = True
 
         logger.debug("Index check complete")
@@ -223,6 +360,14 @@ class NWIndex():
                 "The project index is outdated or broken. Rebuilding index.",
                 nwAlert.WARN
             )
+            return
+
+        for tHandle in sorted(badHandles):
+            self._repairHandle(tHandle)
+        for tTag in badTags:
+            tagEntry = self.tagIndex.get(tTag, None)
+            if tagEntry is not None and len(tagEntry) != 4:
+                self.tagIndex.pop(tTag)
 
         return
 
@@ -236,84 +381,496 @@ class NWIndex():
         and text as separate inputs as we want to primarily scan the
         files before we save them, unless we're rebuilding the index.
         """
+        theEvents = []
+        isIndexed = self._scanText(tHandle, theText, theEvents)
+        self._notifyListeners(theEvents)
+
+        return isIndexed
+
+    def scanTexts(self, theTexts):
+        """Scan a batch of texts, given as a dictionary of handles and
+        texts, and notify the listeners of all the changes once at the
+        end. Returns the number of documents indexed.
+        """
+        theEvents = []
+        nIndexed = 0
+        for tHandle, theText in theTexts.items():
+            if self._scanText(tHandle, theText, theEvents):
+                nIndexed += 1
+        self._notifyListeners(theEvents)
+
+        return nIndexed
+
+    def scanMetaLines(self, tHandle, theLines, nFirst=1, nOld=None, nNew=None):
+        """Update the tags, references and headers of a document from
+        the lines of its text that start with @ or #, while the text is
+        being edited. The lines are given as a list of line number and
+        text. If nOld and nNew are given, only the lines starting at
+        line nFirst have changed, where nOld lines of the text were
+        replaced by nNew lines, and theLines only holds the lines of
+        that range. The entries of the other lines are kept, and the
+        ones after the range are moved by the change in line count.
+        Otherwise, theLines holds the lines of the whole document. The
+        counts of the document are left alone until the full text is
+        scanned on save.
+        """
+        theItem, isIndexed = self._checkItem(tHandle)
+        if theItem is None or not isIndexed:
+            return False
+
+        if nOld is None:
+            nFirst, nEnd, nDelta = 1, None, 0
+        else:
+            nEnd, nDelta = nFirst + nOld, nNew - nOld
+
+        isNovel = theItem.itemLayout != nwItemLayout.NOTE
+        oldRefs = self.refIndex.get(tHandle, {})
+        oldHeads = self._getHeads(tHandle)
+        oldTags = self._getTags(tHandle)
+
+        # Scan the headings of the changed lines first, as the sections
+        # of the other lines depend on them
+        theRecord = {
+            "handle" : tHandle,
+            "refs"   : {"T000000": {"tags": [], "updated": round(time())}},
+            "heads"  : NWHeadingMap(),
+            "tags"   : {},
+        }
+        for nLine, aLine in theLines:
+            if aLine.startswith(r"#"):
+                self._indexTitle(theRecord, aLine, nLine, theItem.itemLayout)
+
+        # A heading that replaced one on the same line keeps its counts
+        # until the text is saved
+        newHeads = theRecord["heads"]
+        for nLine, theHead in newHeads.items():
+            oldHead = oldHeads.get(nLine)
+            if not isinstance(oldHead, NWHeading):
+                continue
+            if self._moveLine(nLine, nFirst, nEnd, nDelta) is None:
+                theHead.synopsis = oldHead.synopsis
+                theHead.cCount = oldHead.cCount
+                theHead.wCount = oldHead.wCount
+                theHead.pCount = oldHead.pCount
+                if theHead.sameContent(oldHead):
+                    newHeads[nLine] = oldHead
+
+        # Move the headings and sections of the unchanged lines, and
+        # record which section of the previous text each section was
+        oldTitles = {0: "T000000"}
+        for sTitle in theRecord["refs"]:
+            nLine = int(sTitle[1:])
+            if self._moveLine(nLine, nFirst, nEnd, nDelta) is None:
+                oldTitles[nLine] = sTitle
+        for nLine, theHead in oldHeads.items():
+            mLine = self._moveLine(nLine, nFirst, nEnd, nDelta)
+            if mLine is not None:
+                newHeads[mLine] = theHead
+        for sTitle in oldRefs:
+            mLine = self._moveLine(int(sTitle[1:]), nFirst, nEnd, nDelta)
+            if mLine is not None and mLine > 0:
+                theRecord["refs"]["T%06d" % mLine] = {"tags": [], "updated": round(time())}
+                oldTitles[mLine] = sTitle
+
+        newRefs = {sTitle: theRecord["refs"][sTitle] for sTitle in sorted(theRecord["refs"])}
+        theTitles = [int(sTitle[1:]) for sTitle in newRefs]
+
+        # Move the references and tags of the unchanged lines into the
+        # sections they now belong to, and add those of the changed lines
+        theEntries = []
+        for sTitle, theRefs in oldRefs.items():
+            for nLine, theKey, theValue in theRefs.get("tags", []):
+                mLine = self._moveLine(nLine, nFirst, nEnd, nDelta)
+                if mLine is not None:
+                    theEntries.append((mLine, theKey, theValue))
+        for theTag, tagEntry in oldTags.items():
+            mLine = self._moveLine(tagEntry[0], nFirst, nEnd, nDelta)
+            if mLine is not None:
+                nTitle = theTitles[bisect_right(theTitles, mLine) - 1]
+                theRecord["tags"][theTag] = [mLine, tHandle, tagEntry[2], "T%06d" % nTitle]
+
+        for nLine, aLine in theLines:
+            if aLine.startswith(r"@"):
+                nTitle = theTitles[bisect_right(theTitles, nLine) - 1]
+                self._indexNoteRef(theRecord, aLine, nLine, nTitle)
+                self._indexTag(theRecord, aLine, nLine, nTitle, theItem.itemClass)
+
+        for nLine, theKey, theValue in theEntries:
+            nTitle = theTitles[bisect_right(theTitles, nLine) - 1]
+            newRefs["T%06d" % nTitle]["tags"].append([nLine, theKey, theValue])
+        for theRefs in newRefs.values():
+            theRefs["tags"].sort(key=lambda tEntry: tEntry[0])
+
+        # Keep the entries of the sections where nothing has changed,
+        # and the time stamps of those that have only moved. A changed
+        # line is compared to the line it replaced.
+        for sTitle, theRefs in newRefs.items():
+            oldTitle = oldTitles.get(int(sTitle[1:]), None)
+            if oldTitle not in oldRefs:
+                continue
+            oldEntries = oldRefs[oldTitle].get("tags", [])
+            movedEntries = []
+            for nLine, theKey, theValue in oldEntries:
+                mLine = self._moveLine(nLine, nFirst, nEnd, nDelta)
+                movedEntries.append([nLine if mLine is None else mLine, theKey, theValue])
+            if movedEntries != theRefs["tags"]:
+                continue
+            if oldTitle == sTitle and movedEntries == oldEntries:
+                newRefs[sTitle] = oldRefs[oldTitle]
+            else:
+                theRefs["updated"] = oldRefs[oldTitle].get("updated", theRefs["updated"])
+
+        theEvents = []
+
+        # Replace the tags that have changed
+        newTags = theRecord["tags"]
+        self._diffTags(tHandle, oldTags, newTags, theEvents)
+        for theTag in oldTags:
+            if theTag not in newTags:
+                self._removeTag(theTag)
+        for theTag, tagEntry in newTags.items():
+            if oldTags.get(theTag, None) != tagEntry:
+                self._setTag(theTag, tagEntry)
+
+        # Replace the references and headers if they have changed
+        nEvents = len(theEvents)
+        self._diffRefs(tHandle, oldRefs, newRefs, theEvents)
+        if len(theEvents) > nEvents:
+            self._setHandleRefs(tHandle, newRefs)
+
+        newHeads = NWHeadingMap(sorted(newHeads.items(), key=lambda tHead: tHead[0]))
+        nEvents = len(theEvents)
+        self._diffHeads(tHandle, oldHeads, newHeads, theEvents)
+        if len(theEvents) > nEvents:
+            if isNovel:
+                self._changedNovel(tHandle)
+                self.novelIndex[tHandle] = newHeads
+            else:
+                self.noteIndex[tHandle] = newHeads
+
+        if theEvents:
+            self._changedHandles.add(tHandle)
+            self.timeIndex = round(time())
+            self._notifyListeners(theEvents)
+
+        return True
+
+    def rebuildIndex(self, numWorkers=None):
+        """Clear the index and rebuild it from the document files on
+        disk. For large projects, the files are read and scanned in a
+        pool of worker processes, and the results are then merged into
+        the index in project tree order. The result is the same as
+        calling scanText on each file in turn. If numWorkers is None, a
+        worker per CPU core is used when the project is large enough.
+        """
+        theJobs = self.makeScanJobs()
+        self.mergeScanResults(self.scanDocFiles(theJobs, numWorkers=numWorkers))
+        return True
+
+    def makeScanJobs(self):
+        """Make the list of documents to be scanned when rebuilding the
+        index, in project tree order. Each job is a tuple that can be
+        passed to a worker process.
+        """
+        theJobs = []
+        for tHandle in self.theProject.projTree.handles():
+            theItem, isIndexed = self._checkItem(tHandle)
+            if theItem is None:
+                continue
+            docPath = os.path.join(self.theProject.projContent, tHandle+".nwd")
+            theJobs.append((tHandle, docPath, theItem.itemClass, theItem.itemLayout, isIndexed))
+        return theJobs
+
+    @staticmethod
+    def scanDocFiles(theJobs, numWorkers=None):
+        """Read and scan the documents of a list of scan jobs, and yield
+        the results in the same order as the jobs. This does not touch
+        the index, so it can be run outside the main thread. Closing the
+        generator early stops any worker processes.
+        """
+        if numWorkers is None:
+            numWorkers = 1
+            if len(theJobs) >= nwConst.MIN_PARALLEL_INDEX:
+                numWorkers = os.cpu_count() or 1
+
+        thePool = None
+        if numWorkers > 1 and len(theJobs) > 1:
+            logger.debug("Scanning %d documents using %d workers" % (len(theJobs), numWorkers))
+            try:
+                thePool = multiprocessing.get_context("spawn").Pool(numWorkers)
+            except Exception as e:
+                logger.error("Failed to start index worker processes")
+                logger.error(str(e))
+                thePool = None
+
+        if thePool is None:
+            yield from map(_scanDocFile, theJobs)
+        else:
+            nChunk = max(1, len(theJobs)//(4*numWorkers))
+            with thePool:
+                yield from thePool.imap(_scanDocFile, theJobs, nChunk)
+
+        return
+
+    def mergeScanResults(self, theResults):
+        """Clear the index, and merge the results from scanDocFiles into
+        it in the order they are provided. The listeners are notified
+        of a single index reset when all results have been merged.
+        """
+        self._resetIndex()
+        for tHandle, fileStamp, theRecord in theResults:
+            if theRecord is None:
+                logger.error("Failed to index document %s" % tHandle)
+                continue
+            self.fileStamps[tHandle] = fileStamp
+            self._applyRecord(theRecord)
+
+        # The journal holds changes to the index that was replaced
+        self._clearJournal()
+        self._notifyListeners([(nwIndexEvent.INDEX_RESET, None, None)])
+        return
+
+    ##
+    #  Internal Indexers
+    ##
+
+    def _checkItem(self, tHandle):
+        """Check if an item can be indexed. Returns the item, or None if
+        it cannot be scanned at all, and a flag for whether the item's
+        content should be indexed or only counted. Only the counts are
+        indexed for archived or trashed items.
+        """
         theItem = self.theProject.projTree[tHandle]
         theRoot = self.theProject.projTree.getRootItem(tHandle)
 
         if theItem is None:
             logger.info("Not indexing unknown item %s" % tHandle)
-            return False
+            return None, False
         if theItem.itemType != nwItemType.FILE:
             logger.info("Not indexing non-file item %s" % tHandle)
-            return False
+            return None, False
         if theItem.itemLayout == nwItemLayout.NO_LAYOUT:
             logger.info("Not indexing no-layout item %s" % tHandle)
-            return False
+            return None, False
         if theItem.itemParent is None:
             logger.info("Not indexing orphaned item %s" % tHandle)
-            return False
-
-        # Run word counter for the whole text
-        cC, wC, pC = countWords(theText)
-        self.textCounts[tHandle] = [cC, wC, pC]
+            return None, False
 
-        # If the file is archived or trashed, we don't index the file itself
         if self.theProject.projTree.isTrashRoot(theItem.itemParent):
             logger.info("Not indexing trash item %s" % tHandle)
-            return False
+            return theItem, False
         if theRoot.itemClass == nwItemClass.ARCHIVE:
             logger.info("Not indexing archived item %s" % tHandle)
-            return False
+            return theItem, False
+
+        return theItem, True
 
-        itemClass  = theItem.itemClass
-        itemLayout = theItem.itemLayout
+    def _applyRecord(self, theRecord, theEvents=None):
+        """Merge the index record of a single document, as generated by
+        _scanDocument, into the index. Returns True if the document
+        content was indexed, and False if only the counts were updated.
+        If a list of events is provided, the changes made to the index
+        are added to it.
+        """
+        tHandle = theRecord["handle"]
+        if theEvents is not None:
+            self._diffRecord(theRecord, theEvents)
+
+        self.textCounts[tHandle] = theRecord["counts"]
+        if "words" in theRecord:
+            self.textIndex.setDocument(tHandle, theRecord["words"])
+        else:
+            # Records from the journal have no words, so the document
+            # is added to the text index again when it is next needed
+            self.textIndex.deleteDocument(tHandle)
+
+        # Keep the section records for the next scan of the document
+        theSections = theRecord.pop("sections", None)
+        if theSections is None:
+            self._docSections.pop(tHandle, None)
+        else:
+            self._docSections[tHandle] = theSections
+        self._changedHandles.add(tHandle)
+        if not theRecord["indexed"]:
+            return False
 
         logger.debug("Indexing item with handle %s" % tHandle)
 
-        # Check file type, and reset its old index
-        # Also add a dummy entry T000000 in case the file has no title
-        self.refIndex[tHandle] = {}
-        self.refIndex[tHandle]["T000000"] = {
-            "tags"    : [],
-            "updated" : round(time()),
-        }
-        if itemLayout == nwItemLayout.NOTE:
+        if theRecord["novel"] or tHandle in self.novelIndex:
+            self._changedNovel(tHandle)
+
+        # Replace the old references and headers of the file
+        self._setHandleRefs(tHandle, theRecord["refs"])
+        if theRecord["novel"]:
+            self.novelIndex[tHandle] = theRecord["heads"]
+            self.noteIndex.pop(tHandle, None)
+        else:
             self.novelIndex.pop(tHandle, None)
-            self.noteIndex[tHandle] = {}
-            isNovel = False
+            self.noteIndex[tHandle] = theRecord["heads"]
+
+        # Replace the tags defined in the file
+        self._clearHandleTags(tHandle)
+        for theTag, tagEntry in theRecord["tags"].items():
+            self._setTag(theTag, tagEntry)
+
+        # Update timestamps for index changes
+        nowTime = round(time())
+        self.timeIndex = nowTime
+        if theRecord["novel"]:
+            self.timeNovel = nowTime
         else:
-            self.novelIndex[tHandle] = {}
-            self.noteIndex.pop(tHandle, None)
-            isNovel = True
+            self.timeNote = nowTime
 
-        # Also clear references to file in tag index
-        clearTags = []
-        for aTag in self.tagIndex:
-            if self.tagIndex[aTag][1] == tHandle:
-                clearTags.append(aTag)
-        for aTag in clearTags:
-            self.tagIndex.pop(aTag)
+        return True
 
-        nLine  = 0
-        nTitle = 0
+    def _scanText(self, tHandle, theText, theEvents):
+        """Scan the text of a document and apply its record to the
+        index, adding the changes to the list of events.
+        """
+        theItem, isIndexed = self._checkItem(tHandle)
+        if theItem is None:
+            return False
+
+        theRecord = self._scanDocument(
+            tHandle, theText, theItem.itemClass, theItem.itemLayout, isIndexed,
+            oldSections=self._docSections.get(tHandle)
+        )
+
+        # Record the state of the file on disk at the time of indexing
+        self.fileStamps[tHandle] = self._getFileStamp(tHandle)
+
+        isIndexed = self._applyRecord(theRecord, theEvents)
+        self._journalScan(tHandle, theRecord)
+
+        return isIndexed
+
+    @staticmethod
+    def _scanDocument(tHandle, theText, itemClass, itemLayout, isIndexed, oldSections=None):
+        """Scan the text of a document and return its index record. The
+        record holds the document's counts and words, and if isIndexed
+        is True, its references, headers and tags. This function does
+        not touch the index itself, so it can also be used by worker
+        processes.
+
+        The text is scanned one section at a time, where each heading
+        starts a new section. The records of the sections are added to
+        the record under their hash, and if the sections of the previous
+        scan of the document are provided, the records of sections that
+        have not changed are reused instead of being scanned again.
+        """
         theLines = theText.splitlines()
+        theRecord = {
+            "handle"   : tHandle,
+            "counts"   : [0, 0, 0],
+            "words"    : {},
+            "indexed"  : isIndexed,
+            "novel"    : itemLayout != nwItemLayout.NOTE,
+            "refs"     : {},
+            "heads"    : NWHeadingMap(),
+            "tags"     : {},
+            "sections" : {},
+        }
+        if isIndexed:
+            # Add a dummy entry T000000 in case the file has no title
+            theRecord["refs"]["T000000"] = {
+                "tags"    : [],
+                "updated" : round(time()),
+            }
+
+        # The section records also depend on the item's settings
+        hashSalt = ("%s:%s:%s\n" % (itemClass.name, itemLayout.name, isIndexed)).encode("utf-8")
+        theWords = {}
+        for nStart, nEnd in NWIndex._splitSections(theLines):
+            secLines = theLines[nStart:nEnd]
+            secHash = hashlib.sha1(hashSalt + "\n".join(secLines).encode("utf-8")).hexdigest()
+            theSection = oldSections.get(secHash) if oldSections else None
+            if theSection is None:
+                theSection = NWIndex._scanSection(
+                    tHandle, secLines, nStart, itemClass, itemLayout, isIndexed
+                )
+            theRecord["sections"][secHash] = theSection
+            NWIndex._addSection(theRecord, theWords, theSection, nStart)
+
+        # Join the word positions of the sections
+        for theTerm, theParts in theWords.items():
+            thePos = array("I", theParts[0])
+            for i in range(1, len(theParts)):
+                thePos.extend(theParts[i])
+            theRecord["words"][theTerm] = thePos
+
+        return theRecord
+
+    @staticmethod
+    def _moveLine(nLine, nFirst, nEnd, nDelta):
+        """Return the line number a line has after the lines from nFirst
+        up to nEnd were replaced, which changed the line count by nDelta.
+        Returns None for a line that was replaced. If nEnd is None, all
+        lines from nFirst were replaced.
+        """
+        if nLine < nFirst:
+            return nLine
+        if nEnd is None or nLine < nEnd:
+            return None
+        return nLine + nDelta
+
+    @staticmethod
+    def _splitSections(theLines):
+        """Split the lines of a document into sections, where each
+        heading starts a new section. Returns a list of the start and
+        end line index of each section.
+        """
+        theSections = []
+        nStart = 0
+        for nLine, aLine in enumerate(theLines):
+            if aLine.startswith(("# ", "## ", "### ", "#### ")) and nLine > nStart:
+                theSections.append((nStart, nLine))
+                nStart = nLine
+        if nStart < len(theLines):
+            theSections.append((nStart, len(theLines)))
+        return theSections
+
+    @staticmethod
+    def _scanSection(tHandle, theLines, nStart, itemClass, itemLayout, isIndexed):
+        """Scan the lines of a single section starting nStart lines into
+        the document, and return its record. The record has the same
+        layout as the record of a document, and also holds the start
+        line it was scanned at.
+        """
+        theCounts, theSections = countSections(theLines)
+        theRecord = {
+            "handle"  : tHandle,
+            "start"   : nStart,
+            "counts"  : theCounts,
+            "words"   : NWTextIndex.scanLines(theLines, nStart + 1),
+            "refs"    : {},
+            "heads"   : NWHeadingMap(),
+            "tags"    : {},
+        }
+        if not isIndexed:
+            return theRecord
+
+        # Lines before the first heading are recorded under T000000
+        theRecord["refs"]["T000000"] = {
+            "tags"    : [],
+            "updated" : round(time()),
+        }
+
+        nLine  = nStart
+        nTitle = 0
         for aLine in theLines:
-            aLine  = aLine
             nLine += 1
             nChar  = len(aLine.strip())
             if nChar == 0:
                 continue
 
             if aLine.startswith(r"#"):
-                isTitle = self._indexTitle(tHandle, isNovel, aLine, nLine, itemLayout)
+                isTitle = NWIndex._indexTitle(theRecord, aLine, nLine, itemLayout)
                 if isTitle and nLine > 0:
-                    if nTitle > 0:
-                        lastText = "\n".join(theLines[nTitle-1:nLine-1])
-                        self._indexWordCounts(tHandle, isNovel, lastText, nTitle)
                     nTitle = nLine
 
             elif aLine.startswith(r"@"):
-                self._indexNoteRef(tHandle, aLine, nLine, nTitle)
-                self._indexTag(tHandle, aLine, nLine, nTitle, itemClass)
+                NWIndex._indexNoteRef(theRecord, aLine, nLine, nTitle)
+                NWIndex._indexTag(theRecord, aLine, nLine, nTitle, itemClass)
 
             elif aLine.startswith(r"%"):
                 if nTitle > 0:
@@ -323,30 +880,66 @@ class NWIndex():
                     cLen = len(toCheck)
                     cOff = tLen - cLen
                     if synTag == "synopsis:":
-                        self._indexSynopsis(tHandle, isNovel, aLine[cOff+9:].strip(), nTitle)
+                        NWIndex._indexSynopsis(theRecord, aLine[cOff+9:].strip(), nTitle)
 
-        # Count words for remaining text after last heading
-        if nTitle > 0:
-            lastText = "\n".join(theLines[nTitle-1:])
-            self._indexWordCounts(tHandle, isNovel, lastText, nTitle)
+        # Save the counts of the section to its header
+        for nTitle, secCounts in theSections.items():
+            NWIndex._indexWordCounts(theRecord, secCounts, nTitle + nStart)
 
-        # Update timestamps for index changes
-        nowTime = round(time())
-        self.timeIndex = nowTime
-        if isNovel:
-            self.timeNovel = nowTime
-        else:
-            self.timeNote = nowTime
+        return theRecord
 
-        return True
+    @staticmethod
+    def _addSection(theRecord, theWords, theSection, nStart):
+        """Add the record of a section to the record of a document, when
+        the section starts nStart lines into the document. The section
+        record itself is not changed, so that it can be reused. The word
+        positions are added to theWords, to be joined when all sections
+        have been added.
+        """
+        nOffset = nStart - theSection["start"]
 
-    ##
-    #  Internal Indexers
-    ##
+        for i in range(3):
+            theRecord["counts"][i] += theSection["counts"][i]
 
-    def _indexTitle(self, tHandle, isNovel, aLine, nLine, itemLayout):
+        for theTerm, thePos in theSection["words"].items():
+            if nOffset != 0:
+                thePos = array("I", thePos)
+                thePos[0::3] = array("I", [nLine + nOffset for nLine in thePos[0::3]])
+            if theTerm in theWords:
+                theWords[theTerm].append(thePos)
+            else:
+                theWords[theTerm] = [thePos]
+
+        for sTitle, theRefs in theSection["refs"].items():
+            nTitle = int(sTitle[1:])
+            if nTitle > 0:
+                sTitle = "T%06d" % (nTitle + nOffset)
+            elif nStart > 0:
+                # A section starting with a heading has no lines before
+                # the heading
+                continue
+            theRecord["refs"][sTitle] = {
+                "tags"    : [[nLine + nOffset, k, v] for nLine, k, v in theRefs["tags"]],
+                "updated" : theRefs["updated"],
+            }
+
+        for nLine, theHead in theSection["heads"].items():
+            theRecord["heads"][nLine + nOffset] = NWHeading(*theHead.toDict().values())
+
+        for theTag, tagEntry in theSection["tags"].items():
+            nTitle = int(tagEntry[3][1:])
+            if nTitle > 0:
+                nTitle += nOffset
+            theRecord["tags"][theTag] = [
+                tagEntry[0] + nOffset, tagEntry[1], tagEntry[2], "T%06d" % nTitle
+            ]
+
+        return
+
+    @staticmethod
+    def _indexTitle(theRecord, aLine, nLine, itemLayout):
         """Save information about the title and its location in the
-        file to the index.
+        file to the index record.
         """
         if aLine.startswith("# "):
             hDepth = "H1"
@@ -364,137 +957,594 @@ class NWIndex():
             return False
 
         sTitle = "T%06d" % nLine
-        self.refIndex[tHandle][sTitle] = {
+        theRecord["refs"][sTitle] = {
             "tags"    : [],
             "updated" : round(time()),
         }
-        theData = {
-            "level"    : hDepth,
-            "title"    : hText,
-            "layout"   : itemLayout.name,
-            "synopsis" : "",
-            "cCount"   : 0,
-            "wCount"   : 0,
-            "pCount"   : 0,
-            "updated"  : round(time()),
-        }
 
         if hText != "":
-            if isNovel:
-                if tHandle in self.novelIndex:
-                    self.novelIndex[tHandle][sTitle] = theData
-            else:
-                if tHandle in self.noteIndex:
-                    self.noteIndex[tHandle][sTitle] = theData
+            theRecord["heads"][nLine] = NWHeading(
+                hDepth, hText, itemLayout.name, updated=round(time())
+            )
 
         return True
 
-    def _indexWordCounts(self, tHandle, isNovel, theText, nTitle):
-        """Count text stats and save the counts to the index.
+    @staticmethod
+    def _indexWordCounts(theRecord, theCounts, nTitle):
+        """Save the text stats of a section to the index record.
         """
-        cC, wC, pC = countWords(theText)
-        sTitle = "T%06d" % nTitle
-        if isNovel:
-            if tHandle in self.novelIndex:
-                if sTitle in self.novelIndex[tHandle]:
-                    self.novelIndex[tHandle][sTitle]["cCount"] = cC
-                    self.novelIndex[tHandle][sTitle]["wCount"] = wC
-                    self.novelIndex[tHandle][sTitle]["pCount"] = pC
-                    self.novelIndex[tHandle][sTitle]["updated"] = round(time())
-        else:
-            if tHandle in self.noteIndex:
-                if sTitle in self.noteIndex[tHandle]:
-                    self.noteIndex[tHandle][sTitle]["cCount"] = cC
-                    self.noteIndex[tHandle][sTitle]["wCount"] = wC
-                    self.noteIndex[tHandle][sTitle]["pCount"] = pC
-                    self.noteIndex[tHandle][sTitle]["updated"] = round(time())
+        cC, wC, pC = theCounts
+        theHead = theRecord["heads"].get(nTitle)
+        if theHead is not None:
+            theHead.cCount = cC
+            theHead.wCount = wC
+            theHead.pCount = pC
+            theHead.updated = round(time())
         return
 
-    def _indexSynopsis(self, tHandle, isNovel, theText, nTitle):
-        """Save the synopsis to the index.
+    @staticmethod
+    def _indexSynopsis(theRecord, theText, nTitle):
+        """Save the synopsis to the index record.
         """
-        sTitle = "T%06d" % nTitle
-        if isNovel:
-            if tHandle in self.novelIndex:
-                if sTitle in self.novelIndex[tHandle]:
-                    self.novelIndex[tHandle][sTitle]["synopsis"] = theText
-                    self.novelIndex[tHandle][sTitle]["updated"] = round(time())
-        else:
-            if tHandle in self.noteIndex:
-                if sTitle in self.noteIndex[tHandle]:
-                    self.noteIndex[tHandle][sTitle]["synopsis"] = theText
-                    self.noteIndex[tHandle][sTitle]["updated"] = round(time())
+        theHead = theRecord["heads"].get(nTitle)
+        if theHead is not None:
+            theHead.synopsis = theText
+            theHead.updated = round(time())
         return
 
-    def _indexNoteRef(self, tHandle, aLine, nLine, nTitle):
+    @staticmethod
+    def _indexNoteRef(theRecord, aLine, nLine, nTitle):
         """Validate and save the information about a reference to a tag
         in another file.
         """
-        isValid, theBits, _ = self.scanThis(aLine)
+        isValid, theBits, _ = scanThis(aLine)
         if not isValid or len(theBits) == 0:
             return False
 
         sTitle = "T%06d" % nTitle
-        if sTitle in self.refIndex[tHandle] and theBits[0] != nwKeyWords.TAG_KEY:
+        if sTitle in theRecord["refs"] and theBits[0] != nwKeyWords.TAG_KEY:
             for aVal in theBits[1:]:
-                self.refIndex[tHandle][sTitle]["tags"].append([nLine, theBits[0], aVal])
+                theRecord["refs"][sTitle]["tags"].append([nLine, theBits[0], aVal])
 
         return True
 
-    def _indexTag(self, tHandle, aLine, nLine, nTitle, itemClass):
+    @staticmethod
+    def _indexTag(theRecord, aLine, nLine, nTitle, itemClass):
         """Validate and save the information from a tag.
         """
-        isValid, theBits, thePos = self.scanThis(aLine)
+        isValid, theBits, thePos = scanThis(aLine)
         if not isValid or len(theBits) != 2:
             return False
 
         if theBits[0] == nwKeyWords.TAG_KEY:
             sTitle = "T%06d" % nTitle
-            self.tagIndex[theBits[1]] = [nLine, tHandle, itemClass.name, sTitle]
+            theRecord["tags"][theBits[1]] = [nLine, theRecord["handle"], itemClass.name, sTitle]
 
         return True
 
     ##
-    #  Check @ Lines
+    #  Index Changes
     ##
 
-    def scanThis(self, aLine):
-        """Scan a line starting with @ to check that it's valid. Then
-        split it up into its elements and positions as two arrays.
+    def _resetIndex(self):
+        """Reset the index dictionaries and time stamps without
+        notifying the listeners.
         """
-        theBits = [] # The elements of the string
-        thePos  = [] # The absolute position of each element
+        self.tagIndex   = {}
+        self.tagHandles = {}
+        self.tagNames   = {}
+        self.refIndex   = {}
+        self.tagRefs    = {}
+        self.novelIndex = {}
+        self.noteIndex  = {}
+        self.textCounts = {}
+        self.fileStamps = {}
+        self.timeNovel  = 0
+        self.timeNote   = 0
+        self.timeIndex  = 0
+        self._changedHandles = set()
+        self._changedAll     = True
+        self.textIndex.clear()
+        self._textLoaded = True
+        self._docSections = {}
+        self._resetNovel()
+        return
+
+    def _notifyListeners(self, theEvents):
+        """Send a list of change events to all the listeners.
+        """
+        if not theEvents:
+            return
+        for theListener in self._indexListeners:
+            try:
+                theListener(theEvents)
+            except Exception as e:
+                logger.error("Index change listener failed")
+                logger.error(str(e))
+        return
+
+    def _diffRecord(self, theRecord, theEvents):
+        """Compare the index record of a document with what is in the
+        index, and add the changes to the list of events.
+        """
+        tHandle = theRecord["handle"]
+        if self.textCounts.get(tHandle, None) != theRecord["counts"]:
+            theEvents.append((nwIndexEvent.COUNTS_CHANGED, tHandle, None))
+        if not theRecord["indexed"]:
+            return
+
+        self._diffHeads(tHandle, self._getHeads(tHandle), theRecord["heads"], theEvents)
+        self._diffTags(tHandle, self._getTags(tHandle), theRecord["tags"], theEvents)
+
+        self._diffRefs(tHandle, self.refIndex.get(tHandle, {}), theRecord["refs"], theEvents)
+
+        return
+
+    def _diffHeads(self, tHandle, oldHeads, newHeads, theEvents):
+        """Add the header changes between two header maps of a document
+        to the list of events.
+        """
+        for nLine, theHead in oldHeads.items():
+            if nLine not in newHeads:
+                theEvents.append((nwIndexEvent.HEAD_REMOVED, tHandle, nLine))
+        for nLine, theHead in newHeads.items():
+            oldHead = oldHeads.get(nLine, None)
+            if oldHead is None:
+                theEvents.append((nwIndexEvent.HEAD_ADDED, tHandle, nLine))
+            elif not theHead.sameContent(oldHead):
+                theEvents.append((nwIndexEvent.HEAD_CHANGED, tHandle, nLine))
+        return
+
+    def _diffTags(self, tHandle, oldTags, newTags, theEvents):
+        """Add the tag changes between two sets of tags defined in a
+        document to the list of events. A tag that was previously
+        defined elsewhere, or at another location, has moved.
+        """
+        for theTag in oldTags:
+            if theTag not in newTags:
+                theEvents.append((nwIndexEvent.TAG_REMOVED, tHandle, theTag))
+        for theTag, tagEntry in newTags.items():
+            if theTag in oldTags:
+                if oldTags[theTag] != tagEntry:
+                    theEvents.append((nwIndexEvent.TAG_MOVED, tHandle, theTag))
+            elif theTag in self.tagIndex:
+                theEvents.append((nwIndexEvent.TAG_MOVED, tHandle, theTag))
+            else:
+                theEvents.append((nwIndexEvent.TAG_ADDED, tHandle, theTag))
+        return
+
+    def _diffRefs(self, tHandle, oldRefs, newRefs, theEvents):
+        """Add a change event to the list of events if the references
+        made in a document have changed.
+        """
+        if oldRefs.keys() != newRefs.keys() or any(
+            oldRefs[sTitle].get("tags") != newRefs[sTitle]["tags"] for sTitle in newRefs
+        ):
+            theEvents.append((nwIndexEvent.REFS_CHANGED, tHandle, None))
+        return
+
+    def _removeHandle(self, tHandle):
+        """Remove all entries of a document from the index, without
+        recording any events.
+        """
+        self._clearHandleTags(tHandle)
+        self._clearHandleRefs(tHandle)
+        self.refIndex.pop(tHandle, None)
+        self.novelIndex.pop(tHandle, None)
+        self.noteIndex.pop(tHandle, None)
+        self.textCounts.pop(tHandle, None)
+        self.fileStamps.pop(tHandle, None)
+        self.textIndex.deleteDocument(tHandle)
+        self._docSections.pop(tHandle, None)
+        self._changedHandles.add(tHandle)
+        return
+
+    def _getHeads(self, tHandle):
+        """Return the novel or notes headers of a document, or an empty
+        dictionary if it has none.
+        """
+        if tHandle in self.novelIndex:
+            return self.novelIndex.get(tHandle, None) or {}
+        if tHandle in self.noteIndex:
+            return self.noteIndex.get(tHandle, None) or {}
+        return {}
+
+    def _getTags(self, tHandle):
+        """Return the tags defined in a document and their entries.
+        """
+        return {
+            theTag: self.tagIndex[theTag]
+            for theTag in self.tagHandles.get(tHandle, set()) if theTag in self.tagIndex
+        }
+
+    ##
+    #  Tag Index Maintenance
+    ##
+
+    def _setTag(self, theTag, tagEntry):
+        """Add or replace a tag in the tag index, and keep the reverse
+        lookup of tags per handle in sync. If the tag was previously
+        defined in another file, it is moved to the new file.
+        """
+        oldEntry = self.tagIndex.get(theTag, None)
+        if oldEntry is not None:
+            oldTags = self.tagHandles.get(oldEntry[1], None)
+            if oldTags is not None:
+                oldTags.discard(theTag)
+                if not oldTags:
+                    self.tagHandles.pop(oldEntry[1], None)
+            self._dropTagName(theTag, oldEntry[2])
+
+        self.tagIndex[theTag] = tagEntry
+        self.tagHandles.setdefault(tagEntry[1], set()).add(theTag)
+        self._addTagName(theTag, tagEntry[2])
+
+        return
+
+    def _removeTag(self, theTag):
+        """Remove a single tag from the tag index, and from the reverse
+        lookup of tags per handle.
+        """
+        tagEntry = self.tagIndex.pop(theTag, None)
+        if tagEntry is not None:
+            theTags = self.tagHandles.get(tagEntry[1], None)
+            if theTags is not None:
+                theTags.discard(theTag)
+                if not theTags:
+                    self.tagHandles.pop(tagEntry[1], None)
+            self._dropTagName(theTag, tagEntry[2])
+        return
+
+    def _clearHandleTags(self, tHandle):
+        """Remove all tags defined in a given file from the tag index.
+        This only touches the tags belonging to the file itself.
+        """
+        for theTag in self.tagHandles.pop(tHandle, set()):
+            tagEntry = self.tagIndex.get(theTag, None)
+            if tagEntry is not None and tagEntry[1] == tHandle:
+                self.tagIndex.pop(theTag, None)
+                self._dropTagName(theTag, tagEntry[2])
+        return
+
+    def _addTagName(self, theTag, tClass):
+        """Add a tag to the sorted tag names of its class.
+        """
+        insort(self.tagNames.setdefault(tClass, []), (theTag.lower(), theTag))
+        return
+
+    def _dropTagName(self, theTag, tClass):
+        """Remove a tag from the sorted tag names of its class.
+        """
+        theNames = self.tagNames.get(tClass, None)
+        if theNames is None:
+            return
+        theName = (theTag.lower(), theTag)
+        nPos = bisect_left(theNames, theName)
+        if nPos < len(theNames) and theNames[nPos] == theName:
+            del theNames[nPos]
+            if not theNames:
+                self.tagNames.pop(tClass, None)
+        return
+
+    def _clearHandleRefs(self, tHandle):
+        """Remove all references made in a given file from the tag
+        references lookup. Only the file's own references are checked.
+        """
+        self._refVersion += 1
+        for sTitle in self.refIndex.get(tHandle, {}):
+            for tEntry in self.refIndex[tHandle][sTitle].get("tags", []):
+                theRefs = self.tagRefs.get(tEntry[2], None)
+                if theRefs is not None:
+                    theRefs.pop(tHandle, None)
+                    if not theRefs:
+                        self.tagRefs.pop(tEntry[2], None)
+        return
+
+    def _setHandleRefs(self, tHandle, theRefs):
+        """Replace the references made in a given file, and update the
+        tag references lookup with them.
+        """
+        self._clearHandleRefs(tHandle)
+        self.refIndex[tHandle] = theRefs
+        for sTitle in theRefs:
+            for tEntry in theRefs[sTitle]["tags"]:
+                self.tagRefs.setdefault(tEntry[2], {}).setdefault(tHandle, sTitle)
+        return
+
+    def _buildTagHandles(self):
+        """Rebuild the reverse lookup of tags per handle, and the sorted
+        tag names per class, from the tag index. This is needed after
+        the tag index has been loaded from file, as neither is saved.
+        """
+        self.tagHandles = {}
+        self.tagNames = {}
+        for theTag, tagEntry in self.tagIndex.items():
+            if isinstance(tagEntry, list) and len(tagEntry) == 4:
+                self.tagHandles.setdefault(tagEntry[1], set()).add(theTag)
+                self.tagNames.setdefault(tagEntry[2], []).append((theTag.lower(), theTag))
+        for theNames in self.tagNames.values():
+            theNames.sort()
+        return
+
+    ##
+    #  Index Storage
+    ##
+
+    def _getIndexStore(self):
+        """Return the storage object for the index format in use. The
+        same object is reused for as long as the format and project stay
+        the same, as the JSON and binary formats keep the content of the
+        file they last read or wrote.
+        """
+        if self.indexFormat == nwConst.IDX_SQLITE:
+            storeClass, storeFile = NWIndexDB, nwFiles.INDEX_DB
+        elif self.indexFormat == nwConst.IDX_BINARY:
+            storeClass, storeFile = NWIndexFile, nwFiles.INDEX_BIN
+        else:
+            storeClass, storeFile = NWIndexJson, nwFiles.INDEX_FILE
+
+        storePath = os.path.join(self.theProject.projMeta, storeFile)
+        if not isinstance(self.indexStore, storeClass) or self.indexStore.storePath != storePath:
+            self.indexStore = storeClass(storePath)
+
+        return self.indexStore
+
+    @staticmethod
+    def _loadedEntries(theIndex):
+        """Return the entries of one of the per-document indices that
+        are in memory. Entries not yet loaded from the index database
+        are skipped.
+        """
+        if isinstance(theIndex, NWIndexMap):
+            return theIndex.loadedItems()
+        return theIndex.items()
+
+    def _repairHandle(self, tHandle):
+        """Scan a document again because its index entries are damaged.
+        This is called by checkIndex, and by the per-document indices
+        when an entry fails to load. The damaged entries are dropped
+        without loading them, so the document's old references are
+        removed from the tag references lookup by searching it. If the
+        document cannot be read, it is left out of the index.
+        """
+        logger.warning("Rescanning document %s with damaged index entries" % tHandle)
+        self.refIndex.pop(tHandle, None)
+        self.novelIndex.pop(tHandle, None)
+        self.noteIndex.pop(tHandle, None)
+        for theTag in list(self.tagRefs):
+            theRefs = self.tagRefs[theTag]
+            if theRefs.pop(tHandle, None) is not None and not theRefs:
+                self.tagRefs.pop(theTag)
+        self._removeHandle(tHandle)
+        self.reIndexHandle(tHandle)
+        return
+
+    @staticmethod
+    def _validRefs(theRefs):
+        """Check that the references entry of a document is a map of
+        section titles to lists of references.
+        """
+        if not isinstance(theRefs, dict):
+            return False
+        for theRef in theRefs.values():
+            if not isinstance(theRef, dict) or not isinstance(theRef.get("tags", None), list):
+                return False
+            for tEntry in theRef["tags"]:
+                if not isinstance(tEntry, list) or len(tEntry) != 3:
+                    return False
+        return True
+
+    @staticmethod
+    def _validHeadings(theHeads):
+        """Check that the headings entry of a document is a map of line
+        numbers to heading records.
+        """
+        if not isinstance(theHeads, NWHeadingMap):
+            return False
+        for nLine, theHead in theHeads.items():
+            if not isinstance(nLine, int) or not isinstance(theHead, NWHeading):
+                return False
+        return True
+
+    def _loadTextIndex(self):
+        """Load the saved full-text index, if it hasn't been loaded since
+        the index was loaded. Documents that have been rescanned since
+        then keep their new entries.
+        """
+        if self._textLoaded:
+            return
+        self._textLoaded = True
+        textDir = os.path.join(self.theProject.projMeta, nwFiles.INDEX_TEXT)
+        self.textIndex.readFiles(textDir, self.fileStamps)
+        return
+
+    def _saveTextIndex(self):
+        """Save the entries of the documents that have changed in the
+        full-text index. The saved index doesn't have to be loaded for
+        this, as each document has its own file.
+        """
+        if not self.textIndex.isChanged:
+            return True
+        textDir = os.path.join(self.theProject.projMeta, nwFiles.INDEX_TEXT)
+        return self.textIndex.writeFiles(textDir, self.fileStamps)
+
+    def _completeTextIndex(self):
+        """Scan the text of the documents that are in the index, but
+        are missing from the full-text index. This is the case when the
+        saved entry is missing, or is older than the index.
+        """
+        self._loadTextIndex()
+        theDoc = NWDoc(self.theProject, self.theParent)
+        for tHandle in self.textCounts:
+            if self.textIndex.hasDocument(tHandle):
+                continue
+            logger.debug("Adding document %s to the text index" % tHandle)
+            theText = theDoc.openDocument(tHandle, showStatus=False)
+            if theText is not None:
+                self.textIndex.setDocument(tHandle, NWTextIndex.scanLines(theText.splitlines()))
+        return
+
+    ##
+    #  Index Journal
+    ##
+
+    def _getJournal(self):
+        """Return the journal of the index changes since the index was
+        last saved, or None if the project has no meta folder yet.
+        """
+        if self.theProject.projMeta is None:
+            return None
+
+        jnlPath = os.path.join(self.theProject.projMeta, nwFiles.INDEX_JNL)
+        if self.indexJnl is None or self.indexJnl.journalPath != jnlPath:
+            self.indexJnl = NWIndexJournal(jnlPath)
+
+        return self.indexJnl
+
+    def _journalScan(self, tHandle, theRecord):
+        """Add the record of a scanned document to the journal, and
+        compact the journal if it has grown too long.
+        """
+        theJournal = self._getJournal()
+        if theJournal is None:
+            return
+        theJournal.appendScan(tHandle, self.fileStamps.get(tHandle, None), theRecord)
+        if theJournal.nEntries is not None and theJournal.nEntries > self.JOURNAL_MAX:
+            theJournal.compactJournal()
+        return
+
+    def _journalDelete(self, tHandle):
+        """Add the removal of a document to the journal.
+        """
+        theJournal = self._getJournal()
+        if theJournal is not None:
+            theJournal.appendDelete(tHandle)
+        return
+
+    def _clearJournal(self):
+        """Clear the journal after the index has been saved or
+        rebuilt.
+        """
+        theJournal = self._getJournal()
+        if theJournal is not None:
+            theJournal.clearJournal()
+        return
+
+    def _replayJournal(self):
+        """Apply the changes recorded in the journal on top of the index
+        that was just loaded. The journal is then rewritten, so that new
+        entries are not added after an entry that was only partly
+        written. Returns the number of entries applied.
+        """
+        theJournal = self._getJournal()
+        if theJournal is None or not theJournal.journalExists():
+            return 0
 
-        aLine = aLine.rstrip() # Remove all trailing white spaces
-        nChar = len(aLine)
-        if nChar < 2:
-            return False, theBits, thePos
-        if aLine[0] != "@":
-            return False, theBits, thePos
+        nApplied = 0
+        for theEntry in theJournal.readEntries():
+            tHandle = theEntry["handle"]
+            try:
+                if theEntry.get("op") == NWIndexJournal.OP_SCAN:
+                    theRecord = dict(theEntry["record"])
+                    theRecord["handle"] = tHandle
+                    theRecord["heads"] = NWHeadingMap.fromJson(theRecord["heads"])
+                    self.fileStamps[tHandle] = theEntry["stamp"]
+                    self._applyRecord(theRecord)
+                elif theEntry.get("op") == NWIndexJournal.OP_DELETE:
+                    self._removeHandle(tHandle)
+                else:
+                    logger.error("Unknown index journal entry")
+                    break
+            except Exception as e:
+                logger.error("Failed to apply index journal entry")
+                logger.error(str(e))
+                break
+            nApplied += 1
+
+        logger.debug("Applied %d index journal entries" % nApplied)
+        theJournal.compactJournal()
 
-        cKey, _, cVals = aLine.partition(":")
-        sKey = cKey.strip()
-        if sKey == "@":
-            return False, theBits, thePos
+        return nApplied
 
-        cPos = 0
-        theBits.append(sKey)
-        thePos.append(cPos)
-        cPos += len(cKey) + 1
+    ##
+    #  Novel Structure Tracking
+    ##
 
-        if not cVals:
-            # No values, so we're done
-            return True, theBits, thePos
+    def _resetNovel(self):
+        """Record a change to the novel structure that can only be
+        handled by a full rebuild.
+        """
+        self._novelVersion += 1
+        self._novelReset = self._novelVersion
+        self._novelChanges = {}
+        self._refVersion += 1
+        return
 
-        for cVal in cVals.split(","):
-            sVal = cVal.strip()
-            rLen = len(cVal.lstrip())
-            tLen = len(cVal)
-            theBits.append(sVal)
-            thePos.append(cPos + tLen - rLen)
-            cPos += tLen + 1
+    def _changedNovel(self, tHandle):
+        """Record a change to the novel headers of a single document.
+        """
+        self._novelVersion += 1
+        self._novelChanges[tHandle] = self._novelVersion
+        return
 
-        return True, theBits, thePos
+    def _checkTreeVersion(self):
+        """Check if the project tree has changed since the novel
+        structure was last checked.
+        """
+        treeVersion = self.theProject.projTree.treeVersion()
+        if treeVersion != self._treeVersion:
+            self._treeVersion = treeVersion
+            self._resetNovel()
+        return
+
+    ##
+    #  File Stamps
+    ##
+
+    def _getFileStamp(self, tHandle):
+        """Return the modification time and size of a document file as
+        a list, or None if the file doesn't exist.
+        """
+        if self.theProject.projContent is None:
+            return None
+
+        docPath = os.path.join(self.theProject.projContent, tHandle+".nwd")
+        try:
+            theStat = os.stat(docPath)
+        except OSError:
+            return None
+
+        return [theStat.st_mtime_ns, theStat.st_size]
+
+    def _getFileStamps(self):
+        """Return the file stamps of all documents in the project
+        content folder, using a single scan of the folder.
+        """
+        theStamps = {}
+        if self.theProject.projContent is None:
+            return theStamps
+
+        try:
+            with os.scandir(self.theProject.projContent) as theEntries:
+                for theEntry in theEntries:
+                    tHandle, fileExt = os.path.splitext(theEntry.name)
+                    if fileExt != ".nwd" or not theEntry.is_file():
+                        continue
+                    theStat = theEntry.stat()
+                    theStamps[tHandle] = [theStat.st_mtime_ns, theStat.st_size]
+        except OSError as e:
+            logger.error("Failed to scan project content folder")
+            logger.error(str(e))
+
+        return theStamps
+
+    ##
+    #  Check @ Lines
+    ##
+
+    # The scanner lives in docscan, so the build workers can use it
+    # without the index, and is kept here for the editor and highlighter
+    scanThis = staticmethod(scanThis)
 
     def checkThese(self, theBits, tItem):
         """Check the tags against the index to see if they are valid
@@ -530,6 +1580,47 @@ class NWIndex():
 
         return isGood
 
+    @staticmethod
+    def replaceTag(aLine, oldTag, newTag):
+        """Replace a tag where it is one of the values of a line that
+        starts with @, and return the new line.
+        """
+        isValid, theBits, thePos = scanThis(aLine)
+        if not isValid:
+            return aLine
+
+        for n in range(len(theBits) - 1, 0, -1):
+            if theBits[n] == oldTag:
+                aLine = aLine[:thePos[n]] + newTag + aLine[thePos[n] + len(oldTag):]
+
+        return aLine
+
+    @staticmethod
+    def replaceTagLines(theText, theLines, oldTag, newTag):
+        """Replace a tag on the given lines of a text. If the tag is not
+        found on one of the lines, the index is not up to date with the
+        text, and all lines starting with @ are checked instead. Returns
+        the new text.
+        """
+        docLines = theText.split("\n")
+        nLines = len(docLines)
+        for nLine in theLines:
+            aLine = docLines[nLine - 1] if 0 < nLine <= nLines else ""
+            newLine = NWIndex.replaceTag(aLine, oldTag, newTag)
+            if newLine == aLine:
+                break
+            docLines[nLine - 1] = newLine
+        else:
+            return "\n".join(docLines)
+
+        logger.debug("Tag '%s' not found on the indexed lines" % oldTag)
+        docLines = theText.split("\n")
+        for n, aLine in enumerate(docLines):
+            if aLine.startswith("@"):
+                docLines[n] = NWIndex.replaceTag(aLine, oldTag, newTag)
+
+        return "\n".join(docLines)
+
     ##
     #  Extract Data
     ##
@@ -537,8 +1628,14 @@ class NWIndex():
     def getNovelStructure(self, skipExcluded=True):
         """Builds a list of all titles in the novel, in the correct
         order as they appear in the tree view and in the respective
-        document files, but skipping all note files.
+        document files, but skipping all note files. The list is cached
+        until the novel structure changes.
         """
+        self._checkTreeVersion()
+        theCache = self._novelCache.get(skipExcluded, None)
+        if theCache is not None and theCache[0] == self._novelVersion:
+            return theCache[1].copy()
+
         theStructure = []
         for tItem in self.theProject.projTree:
             if tItem is not None:
@@ -547,10 +1644,86 @@ class NWIndex():
                 tHandle = tItem.itemHandle
                 if tHandle not in self.novelIndex:
                     continue
-                for sTitle in sorted(self.novelIndex[tHandle].keys()):
-                    theStructure.append("%s:%s" % (tHandle, sTitle))
+                tPrefix = tHandle + ":T"
+                for nLine in sorted(self.novelIndex[tHandle]):
+                    theStructure.append(tPrefix + str(nLine).zfill(6))
+
+        self._novelCache[skipExcluded] = (self._novelVersion, theStructure)
+
+        return theStructure.copy()
+
+    def queryNovel(self, theQuery, skipExcluded=True):
+        """Return the title keys of the novel sections whose references
+        match a query, in the same order as getNovelStructure. See
+        NWRefQuery for the query syntax. Returns None if the query is
+        not valid. The bitsets used to answer the query are kept until
+        the novel structure or the references change.
+        """
+        theKeys = self.getNovelStructure(skipExcluded=skipExcluded)
+        theVersion = (self._novelVersion, self._refVersion)
+        theCache = self._refQuery.get(skipExcluded, None)
+        if theCache is None or theCache[0] != theVersion:
+            theCache = (theVersion, NWRefQuery(theKeys, self.refIndex))
+            self._refQuery[skipExcluded] = theCache
+        return theCache[1].runQuery(theQuery)
+
+    def getRefStats(self, itemClass=nwItemClass.CHARACTER, skipExcluded=True):
+        """Return the statistics of how the tags of a class are
+        referenced together in the novel. See NWRefStats. The statistics
+        are kept until the novel structure or the references change.
+        """
+        theKeys = self.getNovelStructure(skipExcluded=skipExcluded)
+        theVersion = (self._novelVersion, self._refVersion)
+        theCache = self._refStats.get((itemClass, skipExcluded), None)
+        if theCache is not None and theCache[0] == theVersion:
+            return theCache[1]
+
+        theLevels = []
+        for titleKey in theKeys:
+            theHead = self.novelIndex[titleKey[:13]][titleKey[14:]]
+            theLevels.append(theHead["level"])
+
+        theKeywords = {
+            tKey for tKey, tClass in nwKeyWords.KEY_CLASS.items() if tClass == itemClass
+        }
+
+        bfTime = time()
+        theStats = NWRefStats(
+            theKeys, theLevels, self.refIndex, theKeywords, useNumPy=self.mainConf.hasNumPy
+        )
+        afTime = time()
+        logger.debug("Reference statistics built in %.3f ms" % (1000*(afTime - bfTime)))
 
-        return theStructure
+        self._refStats[(itemClass, skipExcluded)] = (theVersion, theStats)
+
+        return theStats
+
+    def getNovelVersion(self):
+        """Return the current version of the novel structure. The
+        version is incremented when a novel document is indexed or
+        removed, and when the project tree changes.
+        """
+        self._checkTreeVersion()
+        return self._novelVersion
+
+    def getNovelChanges(self, sinceVersion):
+        """Return the current version of the novel structure, and the
+        handles of the novel documents that have changed since a given
+        version. If the changes cannot be tracked per document, like
+        when the project tree has changed or the index was reloaded,
+        the handles are returned as None, and the structure must be
+        rebuilt in full.
+        """
+        self._checkTreeVersion()
+        if sinceVersion < self._novelReset:
+            return self._novelVersion, None
+
+        theHandles = set()
+        for tHandle, lastChange in self._novelChanges.items():
+            if lastChange > sinceVersion:
+                theHandles.add(tHandle)
+
+        return self._novelVersion, theHandles
 
     def getCounts(self, tHandle, sTitle=None):
         """Returns the counts for a file, or a section of a file
@@ -566,16 +1739,15 @@ class NWIndex():
                 wC = self.textCounts[tHandle][1]
                 pC = self.textCounts[tHandle][2]
         else:
+            theHead = None
             if tHandle in self.novelIndex:
-                if sTitle in self.novelIndex[tHandle]:
-                    cC = self.novelIndex[tHandle][sTitle]["cCount"]
-                    wC = self.novelIndex[tHandle][sTitle]["wCount"]
-                    pC = self.novelIndex[tHandle][sTitle]["pCount"]
+                theHead = self.novelIndex[tHandle].get(sTitle)
             elif tHandle in self.noteIndex:
-                if sTitle in self.noteIndex[tHandle]:
-                    cC = self.noteIndex[tHandle][sTitle]["cCount"]
-                    wC = self.noteIndex[tHandle][sTitle]["wCount"]
-                    pC = self.noteIndex[tHandle][sTitle]["pCount"]
+                theHead = self.noteIndex[tHandle].get(sTitle)
+            if theHead is not None:
+                cC = theHead.cCount
+                wC = theHead.wCount
+                pC = theHead.pCount
 
         return cC, wC, pC
 
@@ -605,20 +1777,67 @@ class NWIndex():
         if tHandle is None:
             return theRefs
 
-        theTags = set()
-        for tTag in self.tagIndex:
-            if tHandle == self.tagIndex[tTag][1]:
-                theTags.add(tTag)
-
-        if theTags:
-            for tHandle in self.refIndex:
-                for sTitle in self.refIndex[tHandle]:
-                    for _, _, tTag in self.refIndex[tHandle][sTitle]["tags"]:
-                        if tTag in theTags and tHandle not in theRefs:
-                            theRefs[tHandle] = sTitle
+        for tTag in self.tagHandles.get(tHandle, set()):
+            for rHandle, sTitle in self.tagRefs.get(tTag, {}).items():
+                if rHandle not in theRefs or sTitle < theRefs[rHandle]:
+                    theRefs[rHandle] = sTitle
 
         return theRefs
 
+    def searchProject(self, theQuery):
+        """Search the text of all documents in the index. See
+        NWTextIndex.search for the query syntax. Returns a list of hits
+        in project tree order, where each hit is a tuple of handle,
+        line, column and length.
+        """
+        self._completeTextIndex()
+        theResults = self.textIndex.search(theQuery)
+        theHits = []
+        for tHandle in self.theProject.projTree.handles():
+            for nLine, nCol, nLen in theResults.get(tHandle, []):
+                theHits.append((tHandle, nLine, nCol, nLen))
+        return theHits
+
+    def getTagCompletions(self, thePrefix, itemClass, maxCount=None):
+        """Return the tags of a given class that start with a prefix,
+        ignoring case, in alphabetical order. At most maxCount tags are
+        returned if it is set.
+        """
+        theNames = self.tagNames.get(itemClass.name, None)
+        if not theNames:
+            return []
+
+        thePrefix = thePrefix.lower()
+        theTags = []
+        nPos = bisect_left(theNames, (thePrefix,))
+        while nPos < len(theNames) and theNames[nPos][0].startswith(thePrefix):
+            if maxCount is not None and len(theTags) >= maxCount:
+                break
+            theTags.append(theNames[nPos][1])
+            nPos += 1
+
+        return theTags
+
+    def getTagLines(self, theTag):
+        """Return the lines where a tag is defined or referenced, as a
+        dictionary of handles and sorted line numbers. Only the records
+        of the documents that refer to the tag are looked up.
+        """
+        theLines = {}
+        tagEntry = self.tagIndex.get(theTag, None)
+        if tagEntry is not None:
+            theLines[tagEntry[1]] = {tagEntry[0]}
+
+        for tHandle in self.tagRefs.get(theTag, {}):
+            if tHandle not in self.refIndex:
+                continue
+            for theRefs in self.refIndex[tHandle].values():
+                for tEntry in theRefs.get("tags", []):
+                    if len(tEntry) == 3 and tEntry[2] == theTag:
+                        theLines.setdefault(tHandle, set()).add(tEntry[0])
+
+        return {tHandle: sorted(nLines) for tHandle, nLines in theLines.items()}
+
     def getTagSource(self, theTag):
         """Return the source location of a given tag.
         """
@@ -629,3 +1848,29 @@ class NWIndex():
         return None, 0, "T000000"
 
 # END Class NWIndex
+
+# =============================================================================================== #
+#  Index Worker
+# =============================================================================================== #
+
+def _scanDocFile(theJob):
+    """Read a document file from disk and scan it. This function is used
+    by NWIndex.rebuildIndex, and may run in a worker process, so it must
+    only depend on the job data. The job is a tuple of the handle, the
+    path to the file, the item class and layout, and whether the content
+    should be indexed. Returns the handle, the file stamp and the index
+    record. The record is None if the file could not be read.
+    """
+    tHandle, docPath, itemClass, itemLayout, isIndexed = theJob
+
+    theText, fileStamp = readDocFile(docPath)
+    if theText is None:
+        return tHandle, None, None
+
+    theRecord = NWIndex._scanDocument(tHandle, theText, itemClass, itemLayout, isIndexed)
+
+    # The section records are only kept for documents scanned by
+    # scanText, so they are not sent back to the main process
+    del theRecord["sections"]
+
+    return tHandle, fileStamp, theRecord
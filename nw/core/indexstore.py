@@ -0,0 +1,1493 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Project Index Storage
+
+ novelWriter – Project Index Storage
+=====================================
+ Classes for storing the project index on disk
+
+ File History:
+ Created: 2021-01-24 [1.1rc1]
+
+ This file is a part of novelWriter
+ Copyright 2018–2021, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import struct
+import json
+import zlib
+import os
+
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================================== #
+#  Lazy Index Map
+#  A dictionary of per-document index entries that are loaded from storage on first access.
+# =============================================================================================== #
+
+class NWIndexMap(MutableMapping):
+
+    def __init__(self, theHandles=(), theLoader=None):
+
+        self._theData   = {}
+        self._notLoaded = set(theHandles)
+        self._theLoader = theLoader
+        self._onFailure = None
+
+        return
+
+    ##
+    #  Methods
+    ##
+
+    def isLoaded(self, tHandle):
+        """Check if the entry of a handle has been loaded from storage.
+        """
+        return tHandle in self._theData
+
+    def loadedItems(self):
+        """Return the entries that have already been loaded, without
+        loading any more of them.
+        """
+        return self._theData.items()
+
+    def setFailureHandler(self, theHandler):
+        """Set a function to be called with the handle of an entry that
+        fails to load. The function may put a new entry in the map.
+        """
+        self._onFailure = theHandler
+        return
+
+    ##
+    #  Mapping Methods
+    ##
+
+    def __getitem__(self, tHandle):
+        if tHandle in self._notLoaded:
+            self._loadEntry(tHandle)
+        return self._theData[tHandle]
+
+    def __setitem__(self, tHandle, theEntry):
+        self._notLoaded.discard(tHandle)
+        self._theData[tHandle] = theEntry
+        return
+
+    def __delitem__(self, tHandle):
+        if tHandle in self._notLoaded:
+            self._notLoaded.discard(tHandle)
+        else:
+            del self._theData[tHandle]
+        return
+
+    def __contains__(self, tHandle):
+        return tHandle in self._theData or tHandle in self._notLoaded
+
+    def __iter__(self):
+        yield from list(self._theData)
+        yield from list(self._notLoaded)
+
+    def __len__(self):
+        return len(self._theData) + len(self._notLoaded)
+
+    def __repr__(self):
+        return "%s(%d loaded, %d not loaded)" % (
+            self.__class__.__name__, len(self._theData), len(self._notLoaded)
+        )
+
+    def items(self):
+        """Return all entries, loading the ones not yet loaded. Entries
+        that fail to load are left out.
+        """
+        self._loadAll()
+        return self._theData.items()
+
+    def values(self):
+        """Return all values, loading the ones not yet loaded.
+        """
+        self._loadAll()
+        return self._theData.values()
+
+    def pop(self, tHandle, *theDefault):
+        """Remove an entry without loading it first, unless its value
+        is needed.
+        """
+        if tHandle in self._notLoaded and theDefault:
+            self._notLoaded.discard(tHandle)
+            return theDefault[0]
+        return MutableMapping.pop(self, tHandle, *theDefault)
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _loadAll(self):
+        """Load all entries not yet loaded.
+        """
+        for tHandle in list(self._notLoaded):
+            self._loadEntry(tHandle)
+        return
+
+    def _loadEntry(self, tHandle):
+        """Load a single entry using the loader function. If the loader
+        fails, the entry is dropped.
+        """
+        self._notLoaded.discard(tHandle)
+        theEntry = None
+        if self._theLoader is not None:
+            theEntry = self._theLoader(tHandle)
+        if theEntry is None:
+            logger.error("Failed to load index entry for %s" % tHandle)
+            if self._onFailure is not None:
+                self._onFailure(tHandle)
+        else:
+            self._theData[tHandle] = theEntry
+        return
+
+# END Class NWIndexMap
+
+# =============================================================================================== #
+#  Heading Records
+#  The headings of the novel and notes index, stored as compact records keyed by line number.
+# =============================================================================================== #
+
+class NWHeading():
+    """A single heading of the novel or notes index. The fields can also
+    be read and set by name, like the dictionaries used for the other
+    index entries.
+    """
+
+    __slots__ = ("level", "title", "layout", "synopsis", "cCount", "wCount", "pCount", "updated")
+
+    def __init__(self, level, title, layout, synopsis="", cCount=0, wCount=0, pCount=0, updated=0):
+
+        self.level    = level
+        self.title    = title
+        self.layout   = layout
+        self.synopsis = synopsis
+        self.cCount   = cCount
+        self.wCount   = wCount
+        self.pCount   = pCount
+        self.updated  = updated
+
+        return
+
+    ##
+    #  Methods
+    ##
+
+    def keys(self):
+        """Return the field names, in the order they are saved.
+        """
+        return self.__slots__
+
+    def sameContent(self, theHead):
+        """Check if another record has the same content, ignoring the
+        time stamp of when it was last updated.
+        """
+        for theKey in self.__slots__:
+            if theKey != "updated" and getattr(self, theKey) != getattr(theHead, theKey):
+                return False
+        return True
+
+    def toDict(self):
+        """Return the record as a dictionary, as saved in the JSON index
+        file.
+        """
+        return {theKey: getattr(self, theKey) for theKey in self.__slots__}
+
+    @classmethod
+    def fromDict(cls, theData):
+        """Create a record from a dictionary. Raises ValueError if the
+        dictionary doesn't hold exactly the fields of the record.
+        """
+        if not isinstance(theData, dict) or set(theData) != set(cls.__slots__):
+            raise ValueError("Invalid heading record")
+        return cls(**theData)
+
+    ##
+    #  Mapping Methods
+    ##
+
+    def __getitem__(self, theKey):
+        if theKey not in self.__slots__:
+            raise KeyError(theKey)
+        return getattr(self, theKey)
+
+    def __setitem__(self, theKey, theValue):
+        if theKey not in self.__slots__:
+            raise KeyError(theKey)
+        setattr(self, theKey, theValue)
+        return
+
+    def __eq__(self, other):
+        if not isinstance(other, NWHeading):
+            return NotImplemented
+        return all(getattr(self, theKey) == getattr(other, theKey) for theKey in self.__slots__)
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join(
+            "%s=%r" % (theKey, getattr(self, theKey)) for theKey in self.__slots__
+        ))
+
+# END Class NWHeading
+
+class NWHeadingMap(dict):
+    """The headings of a single document, keyed by line number. Lookups
+    also accept section title keys like 'T000001', which are used by the
+    references index and the GUI.
+    """
+
+    ##
+    #  Methods
+    ##
+
+    @staticmethod
+    def lineKey(theKey):
+        """Convert a section title key to its line number. Other keys
+        are returned unchanged.
+        """
+        if isinstance(theKey, str) and len(theKey) == 7 and theKey[0] == "T":
+            if theKey[1:].isdigit():
+                return int(theKey[1:])
+        return theKey
+
+    def toJson(self):
+        """Return the headings as saved in the JSON index file.
+        """
+        return {"T%06d" % nLine: theHead.toDict() for nLine, theHead in self.items()}
+
+    @classmethod
+    def fromJson(cls, theData):
+        """Create the headings map from the JSON index file data.
+        Entries that are not valid are kept as they are, so that
+        NWIndexJson and NWIndex.checkIndex can detect them.
+        """
+        theHeads = cls()
+        for sTitle, theHead in theData.items():
+            try:
+                theHeads[sTitle] = NWHeading.fromDict(theHead)
+            except (TypeError, ValueError):
+                theHeads[sTitle] = theHead
+        return theHeads
+
+    ##
+    #  Mapping Methods
+    ##
+
+    def __getitem__(self, theKey):
+        return dict.__getitem__(self, self.lineKey(theKey))
+
+    def __setitem__(self, theKey, theHead):
+        dict.__setitem__(self, self.lineKey(theKey), theHead)
+        return
+
+    def __delitem__(self, theKey):
+        dict.__delitem__(self, self.lineKey(theKey))
+        return
+
+    def __contains__(self, theKey):
+        return dict.__contains__(self, self.lineKey(theKey))
+
+    def get(self, theKey, theDefault=None):
+        return dict.get(self, self.lineKey(theKey), theDefault)
+
+    def pop(self, theKey, *theDefault):
+        return dict.pop(self, self.lineKey(theKey), *theDefault)
+
+# END Class NWHeadingMap
+
+# =============================================================================================== #
+#  JSON Index Storage
+#  Stores the index in a JSON file, and checks each document's entries when they are first used.
+# =============================================================================================== #
+
+class NWIndexJson():
+    """The references and headers of each document are kept as they
+    were read from the file, and are only checked and converted when a
+    document's entries are first used. Each document has a checksum of
+    its references and headers, so that an entry that has been damaged
+    is found when it is used, and only that document needs to be scanned
+    again. Entries that were never used are written back as they were
+    read when the file is saved. Files from before the file version and
+    the checksums were added are read the same way, but without checking
+    the checksums.
+    """
+
+    FILE_VERSION = 2
+
+    def __init__(self, storePath):
+
+        self.storePath = storePath
+
+        # The content of the file when it was last read or written
+        self._rawRefs   = {}
+        self._rawHeads  = {}
+        self._checkSums = None # None if the file has no checksums
+        self._docValid  = {}
+        self._refMap    = None
+        self._novelMap  = None
+        self._noteMap   = None
+
+        return
+
+    ##
+    #  Methods
+    ##
+
+    def storeExists(self):
+        """Check if the index file exists.
+        """
+        return os.path.isfile(self.storePath)
+
+    def readIndex(self, theIndex):
+        """Read the index file into an NWIndex object. The tags, counts
+        and file stamps are read in full, while the references and
+        headers of a document are only checked and converted when first
+        used. Returns False if the file cannot be read, or has a newer
+        version than this one.
+        """
+        try:
+            with open(self.storePath, mode="r", encoding="utf8") as inFile:
+                theData = json.load(inFile)
+
+            fileVersion = theData.get("indexVersion", 1)
+            if fileVersion > self.FILE_VERSION:
+                logger.error("Unknown index file version %d" % fileVersion)
+                return False
+
+            tagIndex   = self._getDict(theData, "tagIndex")
+            rawRefs    = self._getDict(theData, "refIndex")
+            rawNovel   = self._getDict(theData, "novelIndex")
+            rawNote    = self._getDict(theData, "noteIndex")
+            textCounts = self._getDict(theData, "textCounts")
+            fileStamps = self._getDict(theData, "fileStamps")
+            checkSums  = self._getDict(theData, "checkSums") if fileVersion > 1 else None
+
+        except Exception as e:
+            logger.error("Failed to load index file")
+            logger.error(str(e))
+            return False
+
+        # The first title in each document referring to each tag. Any
+        # damaged entries are skipped here, and found when used.
+        tagRefs = {}
+        for tHandle, theRefs in rawRefs.items():
+            if not isinstance(theRefs, dict):
+                continue
+            for sTitle in sorted(theRefs):
+                theRef = theRefs[sTitle]
+                theTags = theRef.get("tags", None) if isinstance(theRef, dict) else None
+                for tEntry in theTags if isinstance(theTags, list) else []:
+                    if isinstance(tEntry, list) and len(tEntry) == 3:
+                        tagRefs.setdefault(tEntry[2], {}).setdefault(tHandle, sTitle)
+
+        self._rawRefs   = rawRefs
+        self._rawHeads  = dict(rawNovel, **rawNote)
+        self._checkSums = checkSums
+        self._docValid  = {}
+        self._refMap    = NWIndexMap(rawRefs, self.readRefs)
+        self._novelMap  = NWIndexMap(rawNovel, self.readHeaders)
+        self._noteMap   = NWIndexMap(rawNote, self.readHeaders)
+
+        theIndex.tagIndex   = tagIndex
+        theIndex.textCounts = textCounts
+        theIndex.fileStamps = fileStamps
+        theIndex.tagRefs    = tagRefs
+        theIndex.refIndex   = self._refMap
+        theIndex.novelIndex = self._novelMap
+        theIndex.noteIndex  = self._noteMap
+
+        return True
+
+    def readRefs(self, tHandle):
+        """Check and return the references index entry of a single
+        document, or None if the document's entries are damaged.
+        """
+        if not self._checkDocument(tHandle):
+            return None
+        return self._rawRefs[tHandle]
+
+    def readHeaders(self, tHandle):
+        """Check and convert the novel or notes index entry of a single
+        document, or return None if the document's entries are damaged.
+        """
+        if not self._checkDocument(tHandle):
+            return None
+        return NWHeadingMap.fromJson(self._rawHeads[tHandle])
+
+    def writeIndex(self, theIndex):
+        """Write the index to file, with a checksum for each document.
+        The entries of documents that were never used since the file was
+        read are written as they were read, with their old checksums.
+        """
+        refIndex = {}
+        novelIndex = {}
+        noteIndex = {}
+        checkSums = {}
+        for theMap, rawMap in (
+            (theIndex.refIndex, refIndex),
+            (theIndex.novelIndex, novelIndex),
+            (theIndex.noteIndex, noteIndex),
+        ):
+            for tHandle in theMap:
+                if self._isRaw(theMap, tHandle):
+                    rawMap[tHandle] = self._rawRefs[tHandle] if rawMap is refIndex \
+                        else self._rawHeads[tHandle]
+                elif rawMap is refIndex:
+                    rawMap[tHandle] = theMap[tHandle]
+                else:
+                    rawMap[tHandle] = theMap[tHandle].toJson()
+
+        for tHandle in dict.fromkeys(list(refIndex) + list(novelIndex) + list(noteIndex)):
+            theRefs = refIndex.get(tHandle, None)
+            theHeads = novelIndex.get(tHandle, noteIndex.get(tHandle, None))
+            isRaw = all(
+                self._isRaw(theMap, tHandle) for theMap in (
+                    theIndex.refIndex, theIndex.novelIndex, theIndex.noteIndex
+                ) if tHandle in theMap
+            )
+            if isRaw and self._checkSums is not None and tHandle in self._checkSums:
+                checkSums[tHandle] = self._checkSums[tHandle]
+            else:
+                checkSums[tHandle] = self.makeCheckSum(theRefs, theHeads)
+
+        try:
+            tempFile = self.storePath + "~"
+            with open(tempFile, mode="w+", encoding="utf8") as outFile:
+                json.dump({
+                    "indexVersion" : self.FILE_VERSION,
+                    "tagIndex"     : theIndex.tagIndex,
+                    "refIndex"     : refIndex,
+                    "novelIndex"   : novelIndex,
+                    "noteIndex"    : noteIndex,
+                    "textCounts"   : theIndex.textCounts,
+                    "fileStamps"   : theIndex.fileStamps,
+                    "checkSums"    : checkSums,
+                }, outFile, indent=2)
+            os.replace(tempFile, self.storePath)
+
+        except Exception as e:
+            logger.error("Failed to save index file")
+            logger.error(str(e))
+            return False
+
+        # The entries that were not used are still the same as in the
+        # file, and now have checksums
+        self._checkSums = checkSums
+
+        return True
+
+    @staticmethod
+    def makeCheckSum(theRefs, theHeads):
+        """Compute the checksum of the references and headers of a
+        document, as they are saved in the file.
+        """
+        theText = json.dumps([theRefs, theHeads], sort_keys=True, separators=(",", ":"))
+        return zlib.crc32(theText.encode("utf8"))
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _isRaw(self, theMap, tHandle):
+        """Check if a document's entry in one of the maps was read from
+        this file, and has not been used.
+        """
+        for ownMap in (self._refMap, self._novelMap, self._noteMap):
+            if theMap is ownMap:
+                return not theMap.isLoaded(tHandle)
+        return False
+
+    def _checkDocument(self, tHandle):
+        """Check the structure and the checksum of the references and
+        headers of a document, as read from the file. The result is kept
+        for when the other entries of the document are used.
+        """
+        if tHandle in self._docValid:
+            return self._docValid[tHandle]
+
+        theRefs = self._rawRefs.get(tHandle, None)
+        theHeads = self._rawHeads.get(tHandle, None)
+        isValid = self._validRefs(theRefs) and self._validHeads(theHeads)
+        if isValid and self._checkSums is not None:
+            isValid = self._checkSums.get(tHandle, None) == self.makeCheckSum(theRefs, theHeads)
+            if not isValid:
+                logger.error("Wrong checksum for the index entries of %s" % tHandle)
+        elif not isValid:
+            logger.error("Invalid index entries for %s" % tHandle)
+
+        self._docValid[tHandle] = isValid
+
+        return isValid
+
+    @staticmethod
+    def _validRefs(theRefs):
+        """Check the structure of a document's references entry.
+        """
+        if theRefs is None:
+            return True
+        if not isinstance(theRefs, dict):
+            return False
+        for theRef in theRefs.values():
+            if not isinstance(theRef, dict) or not isinstance(theRef.get("tags"), list):
+                return False
+            for tEntry in theRef["tags"]:
+                if not isinstance(tEntry, list) or len(tEntry) != 3:
+                    return False
+        return True
+
+    @staticmethod
+    def _validHeads(theHeads):
+        """Check the structure of a document's headers entry.
+        """
+        if theHeads is None:
+            return True
+        if not isinstance(theHeads, dict):
+            return False
+        for theHead in NWHeadingMap.fromJson(theHeads).values():
+            if not isinstance(theHead, NWHeading):
+                return False
+        return True
+
+    @staticmethod
+    def _getDict(theData, theKey):
+        """Return a dictionary from the file data, or raise an error if
+        it is something else.
+        """
+        theValue = theData.get(theKey, {})
+        if not isinstance(theValue, dict):
+            raise ValueError("The index file entry '%s' is not valid" % theKey)
+        return theValue
+
+# END Class NWIndexJson
+
+# =============================================================================================== #
+#  SQLite Index Storage
+#  Stores the index in a database file, and only rewrites the rows of the documents that changed.
+# =============================================================================================== #
+
+class NWIndexDB():
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, storePath):
+
+        self.storePath = storePath
+
+        return
+
+    ##
+    #  Methods
+    ##
+
+    def storeExists(self):
+        """Check if the database file exists.
+        """
+        return os.path.isfile(self.storePath)
+
+    def readIndex(self, theIndex):
+        """Read the index from the database into an NWIndex object. The
+        tags, counts and file stamps are read in full. The references
+        and headers are only read for a document when it is first used.
+        Returns False if the database cannot be read, or has the wrong
+        schema version.
+        """
+        try:
+            with self._openDB() as theDB:
+                dbVersion = theDB.execute("PRAGMA user_version").fetchone()[0]
+                if dbVersion != self.SCHEMA_VERSION:
+                    logger.error("Unknown index database version %d" % dbVersion)
+                    return False
+
+                tagIndex = {}
+                for theTag, nLine, tHandle, tClass, sTitle in theDB.execute(
+                    "SELECT tag, line, handle, class, title FROM tags ORDER BY rowid"
+                ):
+                    tagIndex[theTag] = [nLine, tHandle, tClass, sTitle]
+
+                textCounts = {}
+                fileStamps = {}
+                novelHandles = []
+                noteHandles = []
+                for tHandle, cC, wC, pC, mTime, fSize, docKind in theDB.execute(
+                    "SELECT handle, cCount, wCount, pCount, mTime, fSize, kind "
+                    "FROM documents ORDER BY rowid"
+                ):
+                    if cC is not None:
+                        textCounts[tHandle] = [cC, wC, pC]
+                    if mTime is not None:
+                        fileStamps[tHandle] = [mTime, fSize]
+                    if docKind == "novel":
+                        novelHandles.append(tHandle)
+                    elif docKind == "note":
+                        noteHandles.append(tHandle)
+
+                refHandles = []
+                for tHandle, in theDB.execute("SELECT DISTINCT handle FROM refs"):
+                    refHandles.append(tHandle)
+
+                tagRefs = {}
+                for tHandle, sTitle, theTag in theDB.execute(
+                    "SELECT handle, MIN(title), value FROM refs "
+                    "WHERE keyword IS NOT NULL GROUP BY handle, value"
+                ):
+                    tagRefs.setdefault(theTag, {})[tHandle] = sTitle
+
+        except Exception as e:
+            logger.error("Failed to read index database")
+            logger.error(str(e))
+            return False
+
+        theIndex.tagIndex   = tagIndex
+        theIndex.textCounts = textCounts
+        theIndex.fileStamps = fileStamps
+        theIndex.tagRefs    = tagRefs
+        theIndex.refIndex   = NWIndexMap(refHandles, self.readRefs)
+        theIndex.novelIndex = NWIndexMap(novelHandles, self.readHeaders)
+        theIndex.noteIndex  = NWIndexMap(noteHandles, self.readHeaders)
+
+        return True
+
+    def readRefs(self, tHandle):
+        """Read the references index entry of a single document.
+        """
+        theRefs = {}
+        try:
+            with self._openDB() as theDB:
+                for sTitle, nLine, theKey, theValue, tUpdated in theDB.execute(
+                    "SELECT title, line, keyword, value, updated FROM refs "
+                    "WHERE handle = ? ORDER BY rowid", (tHandle,)
+                ):
+                    if theKey is None:
+                        theRefs[sTitle] = {"tags": [], "updated": tUpdated}
+                    elif sTitle in theRefs:
+                        theRefs[sTitle]["tags"].append([nLine, theKey, theValue])
+
+        except Exception as e:
+            logger.error("Failed to read references for %s from index database" % tHandle)
+            logger.error(str(e))
+            return None
+
+        return theRefs
+
+    def readHeaders(self, tHandle):
+        """Read the novel or notes index entry of a single document.
+        """
+        theHeads = NWHeadingMap()
+        try:
+            with self._openDB() as theDB:
+                for theRow in theDB.execute(
+                    "SELECT title, level, text, layout, synopsis, cCount, wCount, pCount, "
+                    "updated FROM headers WHERE handle = ? ORDER BY rowid", (tHandle,)
+                ):
+                    theHeads[theRow[0]] = NWHeading(*theRow[1:])
+
+        except Exception as e:
+            logger.error("Failed to read headers for %s from index database" % tHandle)
+            logger.error(str(e))
+            return None
+
+        return theHeads
+
+    def writeIndex(self, theIndex, theHandles=None):
+        """Write the index entries of a set of document handles to the
+        database, replacing what was there before. Handles that are no
+        longer in the index are removed. If theHandles is None, the
+        whole database is rewritten.
+        """
+        clearAll = theHandles is None
+        if clearAll:
+            theHandles = set(theIndex.textCounts)
+            theHandles.update(theIndex.fileStamps)
+            theHandles.update(theIndex.refIndex)
+            theHandles.update(theIndex.novelIndex)
+            theHandles.update(theIndex.noteIndex)
+            theHandles.update(theIndex.tagHandles)
+
+        # Collect all the rows first, since reading from the index may
+        # trigger a read from the database
+        docRows = []
+        refRows = []
+        headRows = []
+        tagRows = []
+        for tHandle in theHandles:
+            docKind = None
+            theHeads = {}
+            if tHandle in theIndex.novelIndex:
+                docKind = "novel"
+                theHeads = theIndex.novelIndex[tHandle]
+            elif tHandle in theIndex.noteIndex:
+                docKind = "note"
+                theHeads = theIndex.noteIndex[tHandle]
+
+            cC, wC, pC = theIndex.textCounts.get(tHandle, [None, None, None])
+            mTime, fSize = theIndex.fileStamps.get(tHandle, None) or [None, None]
+            docRows.append((tHandle, cC, wC, pC, mTime, fSize, docKind))
+
+            for sTitle, theRef in theIndex.refIndex.get(tHandle, {}).items():
+                refRows.append((tHandle, sTitle, None, None, None, theRef["updated"]))
+                for nLine, theKey, theValue in theRef["tags"]:
+                    refRows.append((tHandle, sTitle, nLine, theKey, theValue, None))
+
+            for nLine, theHead in theHeads.items():
+                headRows.append((
+                    tHandle, "T%06d" % nLine, theHead.level, theHead.title, theHead.layout,
+                    theHead.synopsis, theHead.cCount, theHead.wCount, theHead.pCount,
+                    theHead.updated,
+                ))
+
+            for theTag in theIndex.tagHandles.get(tHandle, set()):
+                nLine, _, tClass, sTitle = theIndex.tagIndex[theTag]
+                tagRows.append((theTag, nLine, tHandle, tClass, sTitle))
+
+        try:
+            with self._openDB() as theDB:
+                self._createTables(theDB)
+                if clearAll:
+                    for theTable in ("documents", "refs", "headers", "tags"):
+                        theDB.execute("DELETE FROM %s" % theTable)
+                else:
+                    for theTable in ("documents", "refs", "headers", "tags"):
+                        theDB.executemany(
+                            "DELETE FROM %s WHERE handle = ?" % theTable,
+                            [(tHandle,) for tHandle in theHandles]
+                        )
+
+                theDB.executemany(
+                    "INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [theRow for theRow in docRows if theRow[1:] != (None,)*6]
+                )
+                theDB.executemany("INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?)", refRows)
+                theDB.executemany(
+                    "INSERT INTO headers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", headRows
+                )
+                theDB.executemany("INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?, ?)", tagRows)
+
+        except Exception as e:
+            logger.error("Failed to write index database")
+            logger.error(str(e))
+            return False
+
+        logger.debug("Wrote %d document(s) to the index database" % len(theHandles))
+
+        return True
+
+    ##
+    #  Internal Functions
+    ##
+
+    @contextmanager
+    def _openDB(self):
+        """Open a connection to the database for a single transaction.
+        The transaction is committed, or rolled back on errors, and the
+        connection is closed on exit.
+        """
+        import sqlite3
+        theDB = sqlite3.connect(self.storePath)
+        try:
+            with theDB:
+                yield theDB
+        finally:
+            theDB.close()
+
+    def _createTables(self, theDB):
+        """Create the database tables if they don't already exist.
+        """
+        theDB.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "handle TEXT PRIMARY KEY, cCount INTEGER, wCount INTEGER, pCount INTEGER, "
+            "mTime INTEGER, fSize INTEGER, kind TEXT)"
+        )
+        theDB.execute(
+            "CREATE TABLE IF NOT EXISTS refs ("
+            "handle TEXT, title TEXT, line INTEGER, keyword TEXT, value TEXT, "
+            "updated INTEGER)"
+        )
+        theDB.execute(
+            "CREATE TABLE IF NOT EXISTS headers ("
+            "handle TEXT, title TEXT, level TEXT, text TEXT, layout TEXT, synopsis TEXT, "
+            "cCount INTEGER, wCount INTEGER, pCount INTEGER, updated INTEGER, "
+            "PRIMARY KEY (handle, title))"
+        )
+        theDB.execute(
+            "CREATE TABLE IF NOT EXISTS tags ("
+            "tag TEXT PRIMARY KEY, line INTEGER, handle TEXT, class TEXT, title TEXT)"
+        )
+        theDB.execute("CREATE INDEX IF NOT EXISTS refs_handle ON refs (handle)")
+        theDB.execute("CREATE INDEX IF NOT EXISTS tags_handle ON tags (handle)")
+        theDB.execute("PRAGMA user_version = %d" % self.SCHEMA_VERSION)
+        return
+
+# END Class NWIndexDB
+
+# =============================================================================================== #
+#  Binary Index Storage
+#  Stores the index in a compact binary file with an offset table to each document's entries.
+# =============================================================================================== #
+
+class NWIndexFile():
+    """The file starts with a header and an offset table with one entry
+    per document, followed by the tags, the tag references and a data
+    section. The data section holds a block of references and a block
+    of headers for each document. The blocks are only decoded when a
+    document's entries are first used, and blocks that were never
+    decoded are copied as-is when the file is saved again. All section
+    titles are stored as line numbers.
+    """
+
+    FILE_MAGIC   = b"NWIX"
+    FILE_VERSION = 1
+
+    DOC_NONE  = 0
+    DOC_NOVEL = 1
+    DOC_NOTE  = 2
+
+    HAS_COUNTS = 0x01
+    HAS_STAMP  = 0x02
+
+    def __init__(self, storePath):
+
+        self.storePath = storePath
+
+        # The content of the file when it was last read or written
+        self._theData    = b""
+        self._refBlocks  = {}
+        self._headBlocks = {}
+        self._refMap     = None
+        self._novelMap   = None
+        self._noteMap    = None
+
+        return
+
+    ##
+    #  Methods
+    ##
+
+    def storeExists(self):
+        """Check if the index file exists.
+        """
+        return os.path.isfile(self.storePath)
+
+    def readIndex(self, theIndex):
+        """Read the index file into an NWIndex object. The tags, counts
+        and file stamps are decoded in full. The references and headers
+        of a document are only decoded when first used. Returns False
+        if the file cannot be read, or has the wrong version.
+        """
+        try:
+            with open(self.storePath, mode="rb") as inFile:
+                theData = inFile.read()
+
+            theReader = _IndexReader(theData)
+            if theReader.readBytes(4) != self.FILE_MAGIC:
+                logger.error("The index file is not a novelWriter index file")
+                return False
+
+            fileVersion = theReader.readValue("H")
+            if fileVersion != self.FILE_VERSION:
+                logger.error("Unknown index file version %d" % fileVersion)
+                return False
+
+            docTable = []
+            for _ in range(theReader.readValue("I")):
+                tHandle = theReader.readStr()
+                docKind, docFlags, cC, wC, pC, mTime, fSize = theReader.readValues("BBIIIqQ")
+                refPos, refLen, headPos, headLen = theReader.readValues("QIQI")
+                docTable.append((
+                    tHandle, docKind, docFlags, [cC, wC, pC], [mTime, fSize],
+                    (refPos, refLen), (headPos, headLen)
+                ))
+
+            tagIndex = {}
+            for _ in range(theReader.readValue("I")):
+                theTag = theReader.readStr()
+                nLine = theReader.readValue("I")
+                tHandle = theReader.readStr()
+                tClass = theReader.readStr()
+                nTitle = theReader.readValue("I")
+                tagIndex[theTag] = [nLine, tHandle, tClass, "T%06d" % nTitle]
+
+            tagRefs = {}
+            for _ in range(theReader.readValue("I")):
+                theTag = theReader.readStr()
+                tHandle = theReader.readStr()
+                nTitle = theReader.readValue("I")
+                tagRefs.setdefault(theTag, {})[tHandle] = "T%06d" % nTitle
+
+            dataPos = theReader.thePos
+
+        except Exception as e:
+            logger.error("Failed to read index file")
+            logger.error(str(e))
+            return False
+
+        textCounts = {}
+        fileStamps = {}
+        refHandles = []
+        novelHandles = []
+        noteHandles = []
+        self._refBlocks = {}
+        self._headBlocks = {}
+        for tHandle, docKind, docFlags, theCounts, theStamp, refBlock, headBlock in docTable:
+            if docFlags & self.HAS_COUNTS:
+                textCounts[tHandle] = theCounts
+            if docFlags & self.HAS_STAMP:
+                fileStamps[tHandle] = theStamp
+            if refBlock[1] > 0:
+                refHandles.append(tHandle)
+                self._refBlocks[tHandle] = (dataPos + refBlock[0], refBlock[1])
+            if docKind == self.DOC_NOVEL:
+                novelHandles.append(tHandle)
+            elif docKind == self.DOC_NOTE:
+                noteHandles.append(tHandle)
+            if docKind != self.DOC_NONE:
+                self._headBlocks[tHandle] = (dataPos + headBlock[0], headBlock[1])
+
+        self._theData  = theData
+        self._refMap   = NWIndexMap(refHandles, self.readRefs)
+        self._novelMap = NWIndexMap(novelHandles, self.readHeaders)
+        self._noteMap  = NWIndexMap(noteHandles, self.readHeaders)
+
+        theIndex.tagIndex   = tagIndex
+        theIndex.textCounts = textCounts
+        theIndex.fileStamps = fileStamps
+        theIndex.tagRefs    = tagRefs
+        theIndex.refIndex   = self._refMap
+        theIndex.novelIndex = self._novelMap
+        theIndex.noteIndex  = self._noteMap
+
+        return True
+
+    def readRefs(self, tHandle):
+        """Decode the references index entry of a single document.
+        """
+        try:
+            return self._decodeRefs(self._getBlock(self._refBlocks, tHandle))
+        except Exception as e:
+            logger.error("Failed to decode references for %s from index file" % tHandle)
+            logger.error(str(e))
+        return None
+
+    def readHeaders(self, tHandle):
+        """Decode the novel or notes index entry of a single document.
+        """
+        try:
+            return self._decodeHeaders(self._getBlock(self._headBlocks, tHandle))
+        except Exception as e:
+            logger.error("Failed to decode headers for %s from index file" % tHandle)
+            logger.error(str(e))
+        return None
+
+    def writeIndex(self, theIndex):
+        """Write the index to file. Document entries that were never
+        decoded since the file was read are copied from the old file.
+        """
+        try:
+            theData, refBlocks, headBlocks = self._encodeIndex(theIndex)
+            tempFile = self.storePath + "~"
+            with open(tempFile, mode="wb") as outFile:
+                outFile.write(theData)
+            os.replace(tempFile, self.storePath)
+
+        except Exception as e:
+            logger.error("Failed to write index file")
+            logger.error(str(e))
+            return False
+
+        # Only the entries that were copied are still not decoded, and
+        # they now point into the new file
+        self._theData    = theData
+        self._refBlocks  = refBlocks
+        self._headBlocks = headBlocks
+
+        return True
+
+    @staticmethod
+    def convertJsonFile(jsonFile, binFile):
+        """Convert an index saved in the JSON format to the binary
+        format. Returns True if successful.
+        """
+        logger.debug("Converting index file %s" % jsonFile)
+        try:
+            with open(jsonFile, mode="r", encoding="utf8") as inFile:
+                theData = json.load(inFile)
+        except Exception as e:
+            logger.error("Failed to load index file")
+            logger.error(str(e))
+            return False
+
+        theIndex = _IndexData()
+        theIndex.tagIndex   = theData.get("tagIndex", {})
+        theIndex.refIndex   = theData.get("refIndex", {})
+        theIndex.textCounts = theData.get("textCounts", {})
+        theIndex.fileStamps = theData.get("fileStamps", {})
+        for idxName in ("novelIndex", "noteIndex"):
+            for tHandle, theHeads in theData.get(idxName, {}).items():
+                getattr(theIndex, idxName)[tHandle] = NWHeadingMap.fromJson(theHeads)
+        for tHandle in theIndex.refIndex:
+            for sTitle in sorted(theIndex.refIndex[tHandle]):
+                for tEntry in theIndex.refIndex[tHandle][sTitle]["tags"]:
+                    theIndex.tagRefs.setdefault(tEntry[2], {}).setdefault(tHandle, sTitle)
+
+        return NWIndexFile(binFile).writeIndex(theIndex)
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _getBlock(self, theBlocks, tHandle):
+        """Return a view of a document's data block in the file.
+        """
+        blockPos, blockLen = theBlocks[tHandle]
+        return memoryview(self._theData)[blockPos:blockPos + blockLen]
+
+    def _encodeIndex(self, theIndex):
+        """Encode the full index file. Returns the file content, and the
+        positions of the blocks that were copied from the old file.
+        """
+        theHandles = {}
+        for theMap in (
+            theIndex.textCounts, theIndex.fileStamps, theIndex.refIndex,
+            theIndex.novelIndex, theIndex.noteIndex
+        ):
+            theHandles.update(dict.fromkeys(theMap))
+
+        docTable = _IndexWriter()
+        docTable.writeBytes(self.FILE_MAGIC)
+        docTable.writeValue("H", self.FILE_VERSION)
+        docTable.writeValue("I", len(theHandles))
+
+        theBlocks = _IndexWriter()
+        refBlocks = {}
+        headBlocks = {}
+        for tHandle in theHandles:
+            docKind = self.DOC_NONE
+            headMap = None
+            if tHandle in theIndex.novelIndex:
+                docKind = self.DOC_NOVEL
+                headMap = theIndex.novelIndex
+            elif tHandle in theIndex.noteIndex:
+                docKind = self.DOC_NOTE
+                headMap = theIndex.noteIndex
+
+            docFlags = 0
+            theCounts = theIndex.textCounts.get(tHandle, None)
+            if theCounts is None:
+                theCounts = [0, 0, 0]
+            else:
+                docFlags |= self.HAS_COUNTS
+            theStamp = theIndex.fileStamps.get(tHandle, None)
+            if theStamp is None:
+                theStamp = [0, 0]
+            else:
+                docFlags |= self.HAS_STAMP
+
+            refPos = theBlocks.thePos
+            if tHandle in theIndex.refIndex:
+                if self._isUnread(theIndex.refIndex, self._refMap, tHandle, self._refBlocks):
+                    theBlocks.writeBytes(self._getBlock(self._refBlocks, tHandle))
+                    refBlocks[tHandle] = (refPos, theBlocks.thePos - refPos)
+                else:
+                    self._encodeRefs(theBlocks, theIndex.refIndex[tHandle])
+            refLen = theBlocks.thePos - refPos
+
+            headPos = theBlocks.thePos
+            if headMap is not None:
+                headOld = self._novelMap if docKind == self.DOC_NOVEL else self._noteMap
+                if self._isUnread(headMap, headOld, tHandle, self._headBlocks):
+                    theBlocks.writeBytes(self._getBlock(self._headBlocks, tHandle))
+                    headBlocks[tHandle] = (headPos, theBlocks.thePos - headPos)
+                else:
+                    self._encodeHeaders(theBlocks, headMap[tHandle])
+            headLen = theBlocks.thePos - headPos
+
+            docTable.writeStr(tHandle)
+            docTable.writeValues("BBIIIqQ", docKind, docFlags, *theCounts, *theStamp)
+            docTable.writeValues("QIQI", refPos, refLen, headPos, headLen)
+
+        docTable.writeValue("I", len(theIndex.tagIndex))
+        for theTag, tagEntry in theIndex.tagIndex.items():
+            docTable.writeStr(theTag)
+            docTable.writeValue("I", tagEntry[0])
+            docTable.writeStr(tagEntry[1])
+            docTable.writeStr(tagEntry[2])
+            docTable.writeValue("I", self._titleLine(tagEntry[3]))
+
+        tagRefs = [
+            (theTag, tHandle, sTitle)
+            for theTag, theRefs in theIndex.tagRefs.items()
+            for tHandle, sTitle in theRefs.items()
+        ]
+        docTable.writeValue("I", len(tagRefs))
+        for theTag, tHandle, sTitle in tagRefs:
+            docTable.writeStr(theTag)
+            docTable.writeStr(tHandle)
+            docTable.writeValue("I", self._titleLine(sTitle))
+
+        # Block positions are stored relative to the data section
+        dataPos = docTable.thePos
+        for copiedBlocks in (refBlocks, headBlocks):
+            for tHandle, (blockPos, blockLen) in copiedBlocks.items():
+                copiedBlocks[tHandle] = (dataPos + blockPos, blockLen)
+
+        return docTable.getData() + theBlocks.getData(), refBlocks, headBlocks
+
+    def _isUnread(self, theMap, oldMap, tHandle, theBlocks):
+        """Check if a document's entry is still the one in the old file,
+        and has never been decoded.
+        """
+        if theMap is not oldMap or tHandle not in theBlocks:
+            return False
+        return not theMap.isLoaded(tHandle)
+
+    def _encodeRefs(self, theWriter, theRefs):
+        """Encode the references entry of a document.
+        """
+        theWriter.writeValue("I", len(theRefs))
+        for sTitle, theRef in theRefs.items():
+            theWriter.writeValues(
+                "IqI", self._titleLine(sTitle), theRef["updated"], len(theRef["tags"])
+            )
+            for nLine, theKey, theValue in theRef["tags"]:
+                theWriter.writeValue("I", nLine)
+                theWriter.writeStr(theKey)
+                theWriter.writeStr(theValue)
+        return
+
+    def _decodeRefs(self, theBlock):
+        """Decode the references entry of a document.
+        """
+        theReader = _IndexReader(theBlock)
+        theRefs = {}
+        for _ in range(theReader.readValue("I")):
+            nTitle, tUpdated, nTags = theReader.readValues("IqI")
+            theTags = []
+            for _ in range(nTags):
+                nLine = theReader.readValue("I")
+                theKey = theReader.readStr()
+                theValue = theReader.readStr()
+                theTags.append([nLine, theKey, theValue])
+            theRefs["T%06d" % nTitle] = {"tags": theTags, "updated": tUpdated}
+        return theRefs
+
+    def _encodeHeaders(self, theWriter, theHeads):
+        """Encode the novel or notes entry of a document.
+        """
+        theWriter.writeValue("I", len(theHeads))
+        for nLine, theHead in theHeads.items():
+            theWriter.writeValues("IB", nLine, int(theHead.level[1:]))
+            theWriter.writeStr(theHead.title)
+            theWriter.writeStr(theHead.layout)
+            theWriter.writeStr(theHead.synopsis)
+            theWriter.writeValues(
+                "IIIq", theHead.cCount, theHead.wCount, theHead.pCount, theHead.updated
+            )
+        return
+
+    def _decodeHeaders(self, theBlock):
+        """Decode the novel or notes entry of a document.
+        """
+        theReader = _IndexReader(theBlock)
+        theHeads = NWHeadingMap()
+        for _ in range(theReader.readValue("I")):
+            nTitle, hLevel = theReader.readValues("IB")
+            hTitle = theReader.readStr()
+            hLayout = theReader.readStr()
+            hSynopsis = theReader.readStr()
+            cC, wC, pC, tUpdated = theReader.readValues("IIIq")
+            theHeads[nTitle] = NWHeading(
+                "H%d" % hLevel, hTitle, hLayout, hSynopsis, cC, wC, pC, tUpdated
+            )
+        return theHeads
+
+    @staticmethod
+    def _titleLine(sTitle):
+        """Convert a section title key to its line number.
+        """
+        if len(sTitle) != 7 or sTitle[0] != "T":
+            raise ValueError("Invalid section title key '%s'" % sTitle)
+        return int(sTitle[1:])
+
+# END Class NWIndexFile
+
+# =============================================================================================== #
+#  Index Journal
+#  Records the changes made to the index since it was last saved, so they survive a crash.
+# =============================================================================================== #
+
+class NWIndexJournal():
+    """The journal is a text file with one JSON entry per line, appended
+    to each time a document is indexed or removed from the index. A scan
+    entry holds the document's index record, without its words, and the
+    file stamp of the document when it was scanned. A delete entry only
+    holds the handle. When the index is loaded, the entries are applied
+    in order on top of the last saved index, and the journal is cleared
+    each time the index is saved. A line that was only partly written
+    when the application stopped ends the journal. The entries are
+    flushed to the file as they are added, but are only synced to disk
+    by syncJournal, so that a burst of saves doesn't wait on the disk.
+    """
+
+    OP_SCAN   = "scan"
+    OP_DELETE = "delete"
+
+    def __init__(self, journalPath):
+
+        self.journalPath = journalPath
+        self.nEntries    = None # Unknown until the file is read or cleared
+        self.needSync    = False
+
+        if not self.journalExists():
+            self.nEntries = 0
+
+        return
+
+    ##
+    #  Methods
+    ##
+
+    def journalExists(self):
+        """Check if the journal file exists.
+        """
+        return os.path.isfile(self.journalPath)
+
+    def appendScan(self, tHandle, fileStamp, theRecord):
+        """Add the index record of a scanned document to the journal.
+        """
+        return self._appendEntries([{
+            "op"     : self.OP_SCAN,
+            "handle" : tHandle,
+            "stamp"  : fileStamp,
+            "record" : {
+                "counts"  : theRecord["counts"],
+                "indexed" : theRecord["indexed"],
+                "novel"   : theRecord["novel"],
+                "refs"    : theRecord["refs"],
+                "heads"   : theRecord["heads"].toJson(),
+                "tags"    : theRecord["tags"],
+            },
+        }])
+
+    def appendDelete(self, tHandle):
+        """Add the removal of a document from the index to the journal.
+        """
+        return self._appendEntries([{
+            "op"     : self.OP_DELETE,
+            "handle" : tHandle,
+        }])
+
+    def readEntries(self):
+        """Read the entries of the journal, in the order they were
+        added. Reading stops at the first line that cannot be decoded.
+        """
+        theEntries = []
+        if not self.journalExists():
+            self.nEntries = 0
+            return theEntries
+
+        try:
+            with open(self.journalPath, mode="r", encoding="utf8") as inFile:
+                for nLine, inLine in enumerate(inFile, 1):
+                    try:
+                        theEntry = json.loads(inLine)
+                    except ValueError:
+                        logger.warning("Index journal ends with a broken entry on line %d" % nLine)
+                        break
+                    if not isinstance(theEntry, dict) or "handle" not in theEntry:
+                        logger.warning("Index journal has an invalid entry on line %d" % nLine)
+                        break
+                    theEntries.append(theEntry)
+
+        except Exception as e:
+            logger.error("Failed to read index journal")
+            logger.error(str(e))
+
+        self.nEntries = len(theEntries)
+
+        return theEntries
+
+    def compactJournal(self):
+        """Rewrite the journal with only the last entry of each
+        document. The entries are kept in the order of their last
+        change. The new journal replaces the old one in a single step.
+        """
+        lastEntries = {}
+        for theEntry in self.readEntries():
+            lastEntries.pop(theEntry["handle"], None)
+            lastEntries[theEntry["handle"]] = theEntry
+
+        logger.debug("Compacting index journal from %d to %d entries" % (
+            self.nEntries, len(lastEntries)
+        ))
+        tempPath = self.journalPath + "~"
+        try:
+            with open(tempPath, mode="w", encoding="utf8") as outFile:
+                for theEntry in lastEntries.values():
+                    outFile.write(json.dumps(theEntry, separators=(",", ":")) + "\n")
+            os.replace(tempPath, self.journalPath)
+
+        except Exception as e:
+            logger.error("Failed to compact index journal")
+            logger.error(str(e))
+            return False
+
+        self.nEntries = len(lastEntries)
+
+        return True
+
+    def clearJournal(self):
+        """Delete the journal file. This is done when the index has been
+        saved, as the saved index then holds all the changes, and when
+        the index has been rebuilt, as the entries are then outdated.
+        """
+        try:
+            if self.journalExists():
+                os.unlink(self.journalPath)
+        except Exception as e:
+            logger.error("Failed to delete index journal")
+            logger.error(str(e))
+            return False
+
+        self.nEntries = 0
+        self.needSync = False
+
+        return True
+
+    def syncJournal(self):
+        """Sync the entries added since the last sync to disk.
+        """
+        if not self.needSync:
+            return True
+
+        try:
+            with open(self.journalPath, mode="a", encoding="utf8") as outFile:
+                os.fsync(outFile.fileno())
+        except Exception as e:
+            logger.error("Failed to sync index journal")
+            logger.error(str(e))
+            return False
+
+        self.needSync = False
+
+        return True
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _appendEntries(self, theEntries):
+        """Append entries to the journal file. They are written to the
+        file when it is closed, and synced to disk by syncJournal.
+        """
+        try:
+            with open(self.journalPath, mode="a", encoding="utf8") as outFile:
+                for theEntry in theEntries:
+                    outFile.write(json.dumps(theEntry, separators=(",", ":")) + "\n")
+            self.needSync = True
+
+        except Exception as e:
+            logger.error("Failed to write index journal")
+            logger.error(str(e))
+            return False
+
+        if self.nEntries is not None:
+            self.nEntries += len(theEntries)
+
+        return True
+
+# END Class NWIndexJournal
+
+class _IndexData():
+    """A plain holder of index dictionaries, used when converting index
+    files outside of a project.
+    """
+
+    def __init__(self):
+        self.tagIndex   = {}
+        self.tagRefs    = {}
+        self.refIndex   = {}
+        self.novelIndex = {}
+        self.noteIndex  = {}
+        self.textCounts = {}
+        self.fileStamps = {}
+        return
+
+# END Class _IndexData
+
+class _IndexWriter():
+
+    def __init__(self):
+        self._theData = bytearray()
+        return
+
+    @property
+    def thePos(self):
+        return len(self._theData)
+
+    def getData(self):
+        return bytes(self._theData)
+
+    def writeBytes(self, theBytes):
+        self._theData += theBytes
+        return
+
+    def writeValue(self, theFormat, theValue):
+        self._theData += struct.pack("<" + theFormat, theValue)
+        return
+
+    def writeValues(self, theFormat, *theValues):
+        self._theData += struct.pack("<" + theFormat, *theValues)
+        return
+
+    def writeStr(self, theText):
+        theBytes = theText.encode("utf8")
+        self._theData += struct.pack("<I", len(theBytes))
+        self._theData += theBytes
+        return
+
+# END Class _IndexWriter
+
+class _IndexReader():
+
+    def __init__(self, theData):
+        self._theData = theData
+        self.thePos = 0
+        return
+
+    def readBytes(self, nBytes):
+        theBytes = bytes(self._theData[self.thePos:self.thePos + nBytes])
+        if len(theBytes) != nBytes:
+            raise ValueError("Unexpected end of index data")
+        self.thePos += nBytes
+        return theBytes
+
+    def readValue(self, theFormat):
+        return self.readValues(theFormat)[0]
+
+    def readValues(self, theFormat):
+        theStruct = struct.Struct("<" + theFormat)
+        theValues = theStruct.unpack_from(self._theData, self.thePos)
+        self.thePos += theStruct.size
+        return theValues
+
+    def readStr(self):
+        nBytes = self.readValue("I")
+        return self.readBytes(nBytes).decode("utf8")
+
+# END Class _IndexReader
@@ -255,12 +255,16 @@ class NWItem():
         return
 
     def setExported(self, expState):
-        """Save the export flag.
+        """Save the export flag. Since the flag decides whether the item
+        is part of the novel, the project tree is notified of changes.
         """
+        wasExported = self.isExported
         if isinstance(expState, str):
             self.isExported = (expState == str(True))
         else:
             self.isExported = (expState == True) # noqa: E712
+        if self.isExported != wasExported:
+            self.theProject.projTree.updateVersion()
         return
 
     ##
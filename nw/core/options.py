@@ -56,6 +56,11 @@ class OptionState():
                 "groupByDay",
                 "histMax",
             },
+            "GuiRefStats": {
+                "winWidth",
+                "winHeight",
+                "itemClass",
+            },
             "GuiDocSplit": {
                 "spLevel",
             },
@@ -900,7 +900,6 @@ class NWProject():
         if isSuccess:
             self.clearProject()
             self.theParent.openProject(projPath)
-            self.theParent.rebuildIndex()
 
         return isSuccess
 
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Reference Query
+
+ novelWriter – Reference Query
+===============================
+ Class for filtering the novel sections by the tags they reference
+
+ File History:
+ Created: 2021-02-07 [1.1rc1]
+
+ This file is a part of novelWriter
+ Copyright 2018–2021, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import shlex
+
+from nw.constants import nwKeyWords
+
+logger = logging.getLogger(__name__)
+
+class NWRefQuery():
+    """A lookup of the references made in each heading section of the
+    novel, as bitsets. Each section is a bit, numbered in novel order,
+    and each tag has a bitset of the sections referring to it for each
+    keyword, and one for any keyword. A filter is then evaluated with
+    bitwise operations, and the matching sections are read back in
+    novel order.
+
+    A query is a list of terms separated by spaces, that all must
+    match. A term is either a tag, or a keyword and a comma separated
+    list of tags, like @char:Jane,John, which matches the sections
+    referring to any of the tags with that keyword. A term starting
+    with a minus excludes the sections it matches. Tags with spaces
+    must be quoted, like @pov:"Jane Smith".
+    """
+
+    def __init__(self, theKeys, refIndex):
+
+        self.theKeys = theKeys # The title keys of the sections, in novel order
+        self.allBits = (1 << len(theKeys)) - 1
+        self.keyBits = {}      # The bitsets of each tag, per keyword
+        self.tagBits = {}      # The bitsets of each tag for any keyword
+
+        # Collect the sections referring to each tag first, and then
+        # make each bitset in one go
+        keyPos = {}
+        tagPos = {}
+        for tKey in nwKeyWords.KEY_CLASS:
+            keyPos[tKey] = {}
+
+        for nBit, titleKey in enumerate(theKeys):
+            tHandle = titleKey[:13]
+            sTitle  = titleKey[14:]
+            if tHandle not in refIndex:
+                continue
+            for tEntry in refIndex[tHandle].get(sTitle, {}).get("tags", []):
+                if len(tEntry) != 3 or tEntry[1] not in keyPos:
+                    continue
+                keyPos[tEntry[1]].setdefault(tEntry[2], []).append(nBit)
+                tagPos.setdefault(tEntry[2], []).append(nBit)
+
+        nBytes = (len(theKeys) + 7) // 8
+        for tKey, thePos in keyPos.items():
+            self.keyBits[tKey] = {
+                theTag: self._makeBits(tagBits, nBytes) for theTag, tagBits in thePos.items()
+            }
+        self.tagBits = {
+            theTag: self._makeBits(tagBits, nBytes) for theTag, tagBits in tagPos.items()
+        }
+
+        return
+
+    ##
+    #  Methods
+    ##
+
+    def runQuery(self, theQuery):
+        """Return the title keys of the sections matching a query, in
+        novel order, or None if the query is not valid.
+        """
+        theTerms = self.parseQuery(theQuery)
+        if theTerms is None:
+            return None
+
+        theBits = self.allBits
+        for isExcluded, theKey, theTags in theTerms:
+            tagBits = self.tagBits if theKey is None else self.keyBits[theKey]
+            termBits = 0
+            for theTag in theTags:
+                termBits |= tagBits.get(theTag, 0)
+            if isExcluded:
+                theBits &= ~termBits
+            else:
+                theBits &= termBits
+
+        return self.bitsToKeys(theBits)
+
+    def bitsToKeys(self, theBits):
+        """Return the title keys of the sections set in a bitset, in
+        novel order.
+        """
+        theKeys = []
+        theBytes = theBits.to_bytes((len(self.theKeys) + 7) // 8, "little")
+        for nByte, theByte in enumerate(theBytes):
+            nBit = 8*nByte
+            while theByte:
+                if theByte & 1:
+                    theKeys.append(self.theKeys[nBit])
+                theByte >>= 1
+                nBit += 1
+        return theKeys
+
+    @staticmethod
+    def parseQuery(theQuery):
+        """Split a query into its terms. Each term is a tuple of whether
+        it excludes sections, the keyword, or None for any keyword, and
+        the list of tags. Returns None if a term has an unknown keyword
+        or no tags, or if the quotes are not balanced.
+        """
+        try:
+            theWords = shlex.split(theQuery)
+        except ValueError:
+            logger.debug("Unbalanced quotes in query")
+            return None
+
+        theTerms = []
+        theWords = iter(theWords)
+        for theTerm in theWords:
+            isExcluded = theTerm.startswith("-")
+            if isExcluded:
+                theTerm = theTerm[1:]
+
+            theKey = None
+            if theTerm.startswith("@"):
+                theKey, _, theTerm = theTerm.partition(":")
+                if theKey not in nwKeyWords.KEY_CLASS:
+                    logger.debug("Unknown keyword '%s' in query" % theKey)
+                    return None
+                if not theTerm:
+                    # Allow a space after the colon, like in the text
+                    theTerm = next(theWords, "")
+
+            theTags = [theTag.strip() for theTag in theTerm.split(",") if theTag.strip()]
+            if not theTags:
+                logger.debug("No tags in query term")
+                return None
+
+            theTerms.append((isExcluded, theKey, theTags))
+
+        return theTerms
+
+    ##
+    #  Internal Functions
+    ##
+
+    @staticmethod
+    def _makeBits(thePos, nBytes):
+        """Make a bitset from a list of bit positions.
+        """
+        theBytes = bytearray(nBytes)
+        for nBit in thePos:
+            theBytes[nBit >> 3] |= 1 << (nBit & 7)
+        return int.from_bytes(theBytes, "little")
+
+# END Class NWRefQuery
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Reference Statistics
+
+ novelWriter – Reference Statistics
+====================================
+ Class computing how the tags referenced in the novel occur together
+
+ File History:
+ Created: 2021-02-08 [1.1rc1]
+
+ This file is a part of novelWriter
+ Copyright 2018–2021, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+class NWRefStats():
+    """Statistics of the tags referenced by the heading sections of the
+    novel. The references are first collected into a sparse incidence
+    matrix of sections and tags, stored as two flat lists of row and
+    column numbers, grouped by section. From it, the number of sections
+    each tag occurs in, the number of sections each pair of tags occur
+    in together, and the number of sections per chapter each tag occurs
+    in, are all counted in one pass. The counting uses NumPy if it is
+    available and requested, and plain Python otherwise. Both give the
+    same result.
+
+    A new chapter starts at each H1 or H2 heading. Sections before the
+    first of them are grouped in a chapter of their own.
+    """
+
+    CHAPTER_LEVELS = ("H1", "H2")
+
+    def __init__(self, theKeys, theLevels, refIndex, theKeywords, useNumPy=False):
+
+        self.theKeys     = theKeys # The title keys of the sections, in novel order
+        self.theTags     = []      # The tags referenced, sorted
+        self.theChapters = []      # The section numbers of the chapter headings
+        self.tagCount    = []      # The number of sections of each tag
+        self.pairCount   = {}      # The number of sections shared by two tags
+        self.chapCount   = []      # The number of sections per chapter of each tag
+        self.usedNumPy   = False
+
+        secRows, secCols, secChaps = self._buildIncidence(theLevels, refIndex, theKeywords)
+
+        if useNumPy:
+            try:
+                self._countNumPy(secRows, secCols, secChaps)
+                self.usedNumPy = True
+            except ImportError:
+                logger.debug("NumPy not available, counting with Python")
+                self._countPython(secRows, secCols, secChaps)
+        else:
+            self._countPython(secRows, secCols, secChaps)
+
+        return
+
+    ##
+    #  Methods
+    ##
+
+    def getPairs(self, maxCount=None):
+        """Return the pairs of tags that occur together, as tuples of
+        the two tags and the number of sections they share, with the
+        most frequent pairs first.
+        """
+        thePairs = sorted(self.pairCount.items(), key=lambda x: (-x[1], x[0]))
+        if maxCount is not None:
+            thePairs = thePairs[:maxCount]
+        return [(self.theTags[nA], self.theTags[nB], nCount) for (nA, nB), nCount in thePairs]
+
+    def getPartners(self, theTag):
+        """Return the tags occuring together with a tag, as a dictionary
+        of tags and the number of sections they share.
+        """
+        if theTag not in self.theTags:
+            return {}
+        nTag = self.theTags.index(theTag)
+        thePartners = {}
+        for (nA, nB), nCount in self.pairCount.items():
+            if nA == nTag:
+                thePartners[self.theTags[nB]] = nCount
+            elif nB == nTag:
+                thePartners[self.theTags[nA]] = nCount
+        return thePartners
+
+    def getTimeline(self, theTag):
+        """Return the number of sections a tag occurs in for each
+        chapter, in novel order.
+        """
+        theCounts = [0]*len(self.theChapters)
+        if theTag in self.theTags:
+            for nChap, nCount in self.chapCount[self.theTags.index(theTag)].items():
+                theCounts[nChap] = nCount
+        return theCounts
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _buildIncidence(self, theLevels, refIndex, theKeywords):
+        """Collect the tags referenced by each section with one of the
+        keywords. Returns the row and column lists of the incidence
+        matrix, with the tags of each section sorted, and the chapter
+        number of each section.
+        """
+        secTags = []
+        secChaps = []
+        allTags = set()
+        for nSec, titleKey in enumerate(self.theKeys):
+            if theLevels[nSec] in self.CHAPTER_LEVELS or not self.theChapters:
+                self.theChapters.append(nSec)
+            secChaps.append(len(self.theChapters) - 1)
+
+            theTags = set()
+            tHandle = titleKey[:13]
+            sTitle  = titleKey[14:]
+            if tHandle in refIndex:
+                for tEntry in refIndex[tHandle].get(sTitle, {}).get("tags", []):
+                    if len(tEntry) == 3 and tEntry[1] in theKeywords:
+                        theTags.add(tEntry[2])
+            secTags.append(theTags)
+            allTags.update(theTags)
+
+        self.theTags = sorted(allTags)
+        tagNum = {theTag: nTag for nTag, theTag in enumerate(self.theTags)}
+
+        secRows = []
+        secCols = []
+        for nSec, theTags in enumerate(secTags):
+            if theTags:
+                secRows.extend([nSec]*len(theTags))
+                secCols.extend(sorted(tagNum[theTag] for theTag in theTags))
+
+        return secRows, secCols, secChaps
+
+    def _countPython(self, secRows, secCols, secChaps):
+        """Count the tags, pairs and chapters with plain Python.
+        """
+        nTags = len(self.theTags)
+        tagCount = [0]*nTags
+        chapCount = [{} for n in range(nTags)]
+        pairCount = {}
+
+        nEntries = len(secRows)
+        nFirst = 0
+        while nFirst < nEntries:
+            nSec = secRows[nFirst]
+            nLast = nFirst
+            while nLast < nEntries and secRows[nLast] == nSec:
+                nLast += 1
+
+            nChap = secChaps[nSec]
+            theCols = secCols[nFirst:nLast]
+            for i, nA in enumerate(theCols):
+                tagCount[nA] += 1
+                theChaps = chapCount[nA]
+                theChaps[nChap] = theChaps.get(nChap, 0) + 1
+                for nB in theCols[i+1:]:
+                    pairCount[(nA, nB)] = pairCount.get((nA, nB), 0) + 1
+
+            nFirst = nLast
+
+        self.tagCount = tagCount
+        self.chapCount = chapCount
+        self.pairCount = pairCount
+
+        return
+
+    def _countNumPy(self, secRows, secCols, secChaps):
+        """Count the tags, pairs and chapters with NumPy. Each entry of
+        the incidence matrix is paired with the entries after it in the
+        same section, and the pairs are counted by their combined tag
+        numbers.
+        """
+        import numpy as np
+
+        nTags = len(self.theTags)
+        nChaps = len(self.theChapters)
+        theRows = np.array(secRows, dtype=np.int64)
+        theCols = np.array(secCols, dtype=np.int64)
+        theChaps = np.array(secChaps, dtype=np.int64)
+
+        # Sections per tag
+        self.tagCount = np.bincount(theCols, minlength=nTags).tolist()
+
+        # Sections per tag and chapter
+        self.chapCount = [{} for n in range(nTags)]
+        uKeys, uCounts = np.unique(theCols*nChaps + theChaps[theRows], return_counts=True)
+        for nKey, nCount in zip(uKeys.tolist(), uCounts.tolist()):
+            self.chapCount[nKey // nChaps][nKey % nChaps] = nCount
+
+        # Pairs of tags in the same section
+        self.pairCount = {}
+        if len(theRows) == 0:
+            return
+
+        nEntries = len(theRows)
+        secLen = np.bincount(theRows)
+        secEnd = np.cumsum(secLen)
+        nAfter = secEnd[theRows] - np.arange(nEntries) - 1
+        idxA = np.repeat(np.arange(nEntries), nAfter)
+        if len(idxA) == 0:
+            return
+
+        nStart = np.cumsum(nAfter) - nAfter
+        idxB = idxA + np.arange(len(idxA)) - np.repeat(nStart, nAfter) + 1
+        uKeys, uCounts = np.unique(theCols[idxA]*nTags + theCols[idxB], return_counts=True)
+        self.pairCount = dict(zip(
+            zip((uKeys // nTags).tolist(), (uKeys % nTags).tolist()), uCounts.tolist()
+        ))
+
+        return
+
+# END Class NWRefStats
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Project Text Index
+
+ novelWriter – Project Text Index
+==================================
+ Class holding a full-text inverted index of the project documents
+
+ File History:
+ Created: 2021-02-06 [1.1rc1]
+
+ This file is a part of novelWriter
+ Copyright 2018–2021, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import json
+import os
+import re
+
+from array import array
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+class NWTextIndex():
+    """A word level inverted index of the text of the project documents.
+    The entry of each document maps its terms, the words of the text in
+    lower case, to a flat array of (line, word, column) triplets, one
+    per occurrence. Line numbers start at 1, like in the main index, and
+    the word number is the position of the word on its line, which is
+    used to match phrases. Each term also maps to the set of documents
+    it occurs in, and a sorted list of all terms is built when needed
+    for prefix queries. The index is saved as one file per document, so
+    only the documents that have changed are written when it is saved.
+    """
+
+    FILE_VERSION = 1
+
+    RX_WORD  = re.compile(r"\w+")
+    RX_PART  = re.compile(r"\"([^\"]*)\"?|(\S+)")
+    RX_QUERY = re.compile(r"(\w+)(\*?)")
+
+    def __init__(self):
+
+        self.isChanged = False
+
+        self._docWords = {} # The terms of each document and their positions
+        self._termDocs = {} # The documents each term occurs in
+        self._termList = [] # All terms, sorted
+        self._listDone = True
+
+        self._changedDocs = set() # Documents whose saved entries are outdated
+        self._changedAll  = False # All saved entries are outdated
+
+        return
+
+    ##
+    #  Methods
+    ##
+
+    def clear(self):
+        """Clear the index.
+        """
+        self._docWords = {}
+        self._termDocs = {}
+        self._termList = []
+        self._listDone = True
+        self._changedDocs = set()
+        self._changedAll = True
+        self.isChanged = True
+        return
+
+    def hasDocument(self, tHandle):
+        """Check if a document is in the index.
+        """
+        return tHandle in self._docWords
+
+    def setDocument(self, tHandle, theWords):
+        """Replace the entry of a document with the terms returned by
+        scanLines.
+        """
+        self._removeDocument(tHandle)
+        self._addDocument(tHandle, theWords)
+        self._changedDocs.add(tHandle)
+        self.isChanged = True
+        return
+
+    def deleteDocument(self, tHandle):
+        """Remove a document from the index. Its saved entry is
+        removed on the next save, also if it hasn't been loaded.
+        """
+        self._removeDocument(tHandle)
+        self._changedDocs.add(tHandle)
+        self.isChanged = True
+        return
+
+    def findTerms(self, thePrefix):
+        """Return all terms in the index that start with a prefix.
+        """
+        if not self._listDone:
+            self._termList = sorted(self._termDocs)
+            self._listDone = True
+
+        theTerms = []
+        nTerm = bisect_left(self._termList, thePrefix)
+        while nTerm < len(self._termList) and self._termList[nTerm].startswith(thePrefix):
+            theTerms.append(self._termList[nTerm])
+            nTerm += 1
+
+        return theTerms
+
+    def search(self, theQuery):
+        """Search the index. The query is split into parts, where text
+        in double quotes is a phrase and any other word is a part on its
+        own. A word ending with * matches all terms starting with it.
+        A line matches if it matches all the parts of the query. Returns
+        a dictionary of document handles and the sorted hits in each of
+        them, where each hit is a tuple of line, column and length.
+        """
+        # Each word of the query is mapped to the documents it occurs
+        # in, and the terms it matches in each of them
+        theParts = []
+        theHandles = None
+        for thePart in self.parseQuery(theQuery):
+            theTerms = []
+            for theWord, isPrefix in thePart:
+                wordTerms = self.findTerms(theWord) if isPrefix else [theWord]
+                wordDocs = {}
+                for theTerm in wordTerms:
+                    for tHandle in self._termDocs.get(theTerm, ()):
+                        if tHandle in wordDocs:
+                            wordDocs[tHandle].append(theTerm)
+                        else:
+                            wordDocs[tHandle] = [theTerm]
+                if theHandles is None:
+                    theHandles = set(wordDocs)
+                else:
+                    theHandles &= wordDocs.keys()
+                theTerms.append(wordDocs)
+            theParts.append(theTerms)
+
+        theResults = {}
+        for tHandle in theHandles or ():
+            theHits = self._searchDocument(tHandle, self._docWords[tHandle], theParts)
+            if theHits:
+                theResults[tHandle] = theHits
+
+        return theResults
+
+    @staticmethod
+    def parseQuery(theQuery):
+        """Split a query into its parts. Each part is a list of words in
+        lower case, and a flag for whether the word is a prefix.
+        """
+        theParts = []
+        for rxPart in NWTextIndex.RX_PART.finditer(theQuery.lower()):
+            thePart = [
+                (rxWord.group(1), rxWord.group(2) == "*")
+                for rxWord in NWTextIndex.RX_QUERY.finditer(rxPart.group(rxPart.lastindex))
+            ]
+            if thePart:
+                theParts.append(thePart)
+        return theParts
+
+    @staticmethod
+    def scanLines(theLines, firstLine=1):
+        """Find the terms of the lines of a document, and their
+        positions. The lines are numbered from firstLine. This function
+        does not touch the index, so it can also be used by worker
+        processes.
+        """
+        theWords = {}
+        nLine = firstLine - 1
+        for aLine in theLines:
+            nLine += 1
+            nWord = 0
+            lLine = aLine.lower()
+            if len(lLine) == len(aLine):
+                # The columns are the same in the lower case line
+                theMatches = NWTextIndex.RX_WORD.finditer(lLine)
+                doLower = False
+            else:
+                theMatches = NWTextIndex.RX_WORD.finditer(aLine)
+                doLower = True
+            for rxWord in theMatches:
+                theTerm = rxWord.group(0).lower() if doLower else rxWord.group(0)
+                thePos = theWords.get(theTerm)
+                if thePos is None:
+                    theWords[theTerm] = [nLine, nWord, rxWord.start()]
+                else:
+                    thePos += (nLine, nWord, rxWord.start())
+                nWord += 1
+
+        for theTerm, thePos in theWords.items():
+            theWords[theTerm] = array("I", thePos)
+
+        return theWords
+
+    ##
+    #  Load and Save
+    ##
+
+    def readFiles(self, dirPath, fileStamps):
+        """Read the saved entries of the documents in a text index
+        folder, and add them for the documents that are not already in
+        the index, and have not been changed or deleted since it was
+        loaded. Only entries whose file stamp matches the stamp in
+        fileStamps are added, so that entries of documents that have
+        since changed are skipped. Returns False if an entry cannot be
+        read.
+        """
+        if not os.path.isdir(dirPath):
+            return True
+
+        logger.debug("Loading text index files")
+        readOK = True
+        for fileName in os.listdir(dirPath):
+            tHandle, fileExt = os.path.splitext(fileName)
+            if fileExt != ".json":
+                continue
+            if tHandle in self._docWords or tHandle in self._changedDocs:
+                continue
+            fileStamp = fileStamps.get(tHandle, None)
+            if fileStamp is None:
+                continue
+
+            try:
+                with open(os.path.join(dirPath, fileName), mode="r", encoding="utf8") as inFile:
+                    theEntry = json.load(inFile)
+                if theEntry.get("version") != self.FILE_VERSION:
+                    logger.error("Unknown text index file version of document %s" % tHandle)
+                    readOK = False
+                    continue
+                if theEntry["stamp"] != fileStamp:
+                    continue
+                self._addDocument(tHandle, {
+                    theTerm: array("I", thePos) for theTerm, thePos in theEntry["words"].items()
+                })
+
+            except Exception as e:
+                logger.error("Failed to load text index file of document %s" % tHandle)
+                logger.error(str(e))
+                readOK = False
+
+        return readOK
+
+    def writeFiles(self, dirPath, fileStamps):
+        """Write the entries of the documents that have changed since
+        the index was last saved to a text index folder, with the file
+        stamp of each document taken from fileStamps, and remove the
+        entries of deleted documents. If the index has been cleared, all
+        entries are written, and all others removed.
+        """
+        logger.debug("Saving text index files")
+        try:
+            if not os.path.isdir(dirPath):
+                os.mkdir(dirPath)
+
+            theHandles = self._changedDocs
+            if self._changedAll:
+                theHandles = set(self._docWords)
+                for fileName in os.listdir(dirPath):
+                    tHandle, fileExt = os.path.splitext(fileName)
+                    if fileExt == ".json":
+                        theHandles.add(tHandle)
+
+            for tHandle in theHandles:
+                filePath = os.path.join(dirPath, tHandle+".json")
+                theWords = self._docWords.get(tHandle, None)
+                if theWords is None:
+                    if os.path.isfile(filePath):
+                        os.unlink(filePath)
+                    continue
+
+                tempFile = filePath + "~"
+                with open(tempFile, mode="w", encoding="utf8") as outFile:
+                    json.dump({
+                        "version" : self.FILE_VERSION,
+                        "stamp"   : fileStamps.get(tHandle, None),
+                        "words"   : {
+                            theTerm: thePos.tolist() for theTerm, thePos in theWords.items()
+                        },
+                    }, outFile, separators=(",", ":"))
+                os.replace(tempFile, filePath)
+
+        except Exception as e:
+            logger.error("Failed to save text index files")
+            logger.error(str(e))
+            return False
+
+        self._changedDocs = set()
+        self._changedAll = False
+        self.isChanged = False
+
+        return True
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _addDocument(self, tHandle, theWords):
+        """Add the terms of a document that is not in the index.
+        """
+        for theTerm in theWords:
+            if theTerm in self._termDocs:
+                self._termDocs[theTerm].add(tHandle)
+            else:
+                self._termDocs[theTerm] = {tHandle}
+                self._listDone = False
+        self._docWords[tHandle] = theWords
+        return
+
+    def _removeDocument(self, tHandle):
+        """Remove the terms of a document from the index.
+        """
+        theWords = self._docWords.pop(tHandle, None)
+        if theWords is None:
+            return
+        for theTerm in theWords:
+            theDocs = self._termDocs.get(theTerm)
+            if theDocs is None:
+                continue
+            theDocs.discard(tHandle)
+            if not theDocs:
+                del self._termDocs[theTerm]
+                self._listDone = False
+        return
+
+    @staticmethod
+    def _searchDocument(tHandle, theWords, theParts):
+        """Find the hits of all parts of a query in a single document,
+        on the lines where all of them match.
+        """
+        partHits = []
+        for theTerms in theParts:
+            # Map the (line, word) position of each occurrence of the
+            # remaining words of a phrase to its column and length
+            wordPos = []
+            for wordDocs in theTerms[1:]:
+                thePos = {}
+                for theTerm in wordDocs[tHandle]:
+                    termPos = theWords[theTerm]
+                    nLen = len(theTerm)
+                    for i in range(0, len(termPos), 3):
+                        thePos[(termPos[i], termPos[i+1])] = (termPos[i+2], nLen)
+                wordPos.append(thePos)
+
+            theHits = {}
+            for theTerm in theTerms[0][tHandle]:
+                termPos = theWords[theTerm]
+                nLen = len(theTerm)
+                for i in range(0, len(termPos), 3):
+                    nLine = termPos[i]
+                    nWord = termPos[i+1]
+                    nCol  = termPos[i+2]
+                    eCol  = nCol + nLen
+                    for k, thePos in enumerate(wordPos, 1):
+                        theEnd = thePos.get((nLine, nWord + k))
+                        if theEnd is None:
+                            break
+                        eCol = theEnd[0] + theEnd[1]
+                    else:
+                        if nLine in theHits:
+                            theHits[nLine].append((nLine, nCol, eCol - nCol))
+                        else:
+                            theHits[nLine] = [(nLine, nCol, eCol - nCol)]
+
+            if not theHits:
+                return []
+            partHits.append(theHits)
+
+        if len(partHits) == 1:
+            theResult = []
+            for nLine in sorted(partHits[0]):
+                theResult.extend(sorted(partHits[0][nLine]))
+            return theResult
+
+        theLines = set(partHits[0])
+        for theHits in partHits[1:]:
+            theLines &= theHits.keys()
+
+        theResult = set()
+        for theHits in partHits:
+            for nLine in theLines:
+                theResult.update(theHits[nLine])
+
+        return sorted(theResult)
+
+# END Class NWTextIndex
@@ -25,11 +25,17 @@
  along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
+import nw
 import logging
+import multiprocessing
+import hashlib
+import json
+import os
 import re
 
+from nw.core.docscan import readDocFile, scanThis
 from nw.core.tokenizer import Tokenizer
-from nw.constants import nwUnicode, nwLabels, nwKeyWords
+from nw.constants import nwConst, nwItemLayout, nwUnicode, nwLabels, nwKeyWords
 
 logger = logging.getLogger(__name__)
 
@@ -39,11 +45,28 @@ class ToHtml(Tokenizer):
     M_EXPORT  = 1 # Tweak output for saving to HTML or printing
     M_EBOOK   = 2 # Tweak output for converting to epub
 
+    # The settings passed on to the converters of convertDocFiles
+    JOB_SETTINGS = (
+        "doBodyText", "doSynopsis", "doComments", "doKeywords", "doJustify",
+        "fmtTitle", "fmtChapter", "fmtUnNum", "fmtScene", "fmtSection",
+        "hideScene", "hideSection", "linkHeaders", "genMode", "cssStyles",
+    )
+
+    # The version of the records kept by convertCached, which must be
+    # increased when the records or their conversion change
+    CACHE_VERSION = 1
+
+    # The headings numbered by doHeaders in novel documents
+    NOVEL_HEADS = (
+        Tokenizer.T_HEAD1, Tokenizer.T_HEAD2, Tokenizer.T_HEAD3, Tokenizer.T_HEAD4
+    )
+
     def __init__(self, theProject, theParent):
         Tokenizer.__init__(self, theProject, theParent)
 
         self.genMode = self.M_EXPORT
         self.cssStyles = True
+        self.numConverted = 0 # The number of documents convertCached had to convert
 
         self.repDict = {
             "<" : "&lt;",
@@ -106,6 +129,13 @@ class ToHtml(Tokenizer):
         Otherwise, all the &something; bits will also be in there.
         """
         Tokenizer.doPostProcessing(self)
+        self.doMarkdownPostProcessing()
+        return
+
+    def doMarkdownPostProcessing(self):
+        """The markdown part of doPostProcessing, for when the result is
+        not collected in theResult.
+        """
         if self.genMode == self.M_PREVIEW:
             # Doesn't matter for preview as we don't use the markdown
             return
@@ -118,6 +148,13 @@ class ToHtml(Tokenizer):
         """Convert the list of text tokens into a HTML document saved
         to theResult.
         """
+        self.theResult = "".join(self.iterConvert())
+        return
+
+    def iterConvert(self):
+        """Generator doing the work of doConvert, yielding the HTML one
+        block at a time instead of saving it to theResult.
+        """
         if self.genMode == self.M_PREVIEW:
             htmlTags = {     # HTML4 + CSS2
                 self.FMT_B_B : "<b>",
@@ -153,11 +190,8 @@ class ToHtml(Tokenizer):
             h3 = "h3"
             h4 = "h4"
 
-        self.theResult = ""
-
         thisPar = []
         parStyle = None
-        tmpResult = []
         hasHardBreak = False
         for tType, tLine, tText, tFormat, tStyle in self.theTokens:
 
@@ -205,43 +239,53 @@ class ToHtml(Tokenizer):
                     parClass = ""
                 if len(thisPar) > 0:
                     tTemp = "".join(thisPar)
-                    tmpResult.append("<p%s%s>%s</p>\n" % (parStyle, parClass, tTemp.rstrip()))
+                    yield "<p%s%s>%s</p>\n" % (parStyle, parClass, tTemp.rstrip())
                 thisPar = []
                 parStyle = None
                 hasHardBreak = False
 
             elif tType == self.T_TITLE:
                 tHead = tText.replace(r"\\", "<br/>")
-                tmpResult.append("<h1 class='title'%s>%s%s</h1>\n" % (hStyle, aNm, tHead))
+                yield "<h1 class='title'%s>%s%s</h1>\n" % (hStyle, aNm, tHead)
 
             elif tType == self.T_HEAD1:
                 tHead = tText.replace(r"\\", "<br/>")
-                tmpResult.append("<%s%s%s>%s%s</%s>\n" % (h1, h1Cl, hStyle, aNm, tHead, h1))
+                yield "<%s%s%s>%s%s</%s>\n" % (h1, h1Cl, hStyle, aNm, tHead, h1)
 
             elif tType == self.T_HEAD2:
                 tHead = tText.replace(r"\\", "<br/>")
-                tmpResult.append("<%s%s>%s%s</%s>\n" % (h2, hStyle, aNm, tHead, h2))
+                yield "<%s%s>%s%s</%s>\n" % (h2, hStyle, aNm, tHead, h2)
 
             elif tType == self.T_HEAD3:
                 tHead = tText.replace(r"\\", "<br/>")
-                tmpResult.append("<%s%s>%s%s</%s>\n" % (h3, hStyle, aNm, tHead, h3))
+                yield "<%s%s>%s%s</%s>\n" % (h3, hStyle, aNm, tHead, h3)
 
             elif tType == self.T_HEAD4:
                 tHead = tText.replace(r"\\", "<br/>")
-                tmpResult.append("<%s%s>%s%s</%s>\n" % (h4, hStyle, aNm, tHead, h4))
+                yield "<%s%s>%s%s</%s>\n" % (h4, hStyle, aNm, tHead, h4)
 
             elif tType == self.T_SEP:
-                tmpResult.append("<p class='sep'>%s</p>\n" % tText)
+                yield "<p class='sep'>%s</p>\n" % tText
 
             elif tType == self.T_SKIP:
-                tmpResult.append("<p class='skip'>&nbsp;</p>\n")
+                yield "<p class='skip'>&nbsp;</p>\n"
 
             elif tType == self.T_TEXT:
-                tTemp = tText
                 if parStyle is None:
                     parStyle = hStyle
-                for xPos, xLen, xFmt in reversed(tFormat):
-                    tTemp = tTemp[:xPos]+htmlTags[xFmt]+tTemp[xPos+xLen:]
+                if tFormat:
+                    # The format tags are sorted and do not overlap, so
+                    # the text between them is written in a single pass
+                    tTemp = []
+                    nPos = 0
+                    for xPos, xLen, xFmt in tFormat:
+                        tTemp.append(tText[nPos:xPos])
+                        tTemp.append(htmlTags[xFmt])
+                        nPos = xPos + xLen
+                    tTemp.append(tText[nPos:])
+                    tTemp = "".join(tTemp)
+                else:
+                    tTemp = tText
                 if tText.endswith("  "):
                     thisPar.append(tTemp.rstrip()+"<br/>")
                     hasHardBreak = True
@@ -249,16 +293,251 @@ class ToHtml(Tokenizer):
                     thisPar.append(tTemp.rstrip()+" ")
 
             elif tType == self.T_SYNOPSIS and self.doSynopsis:
-                tmpResult.append(self._formatSynopsis(tText))
+                yield self._formatSynopsis(tText)
 
             elif tType == self.T_COMMENT and self.doComments:
-                tmpResult.append(self._formatComments(tText))
+                yield self._formatComments(tText)
 
             elif tType == self.T_KEYWORD and self.doKeywords:
-                tmpResult.append(self._formatKeywords(tText))
+                yield self._formatKeywords(tText)
 
-        self.theResult = "".join(tmpResult)
-        tmpResult = []
+        return
+
+    def getJobSettings(self):
+        """Return the settings passed on to the converters of
+        convertDocFiles, including the auto-replace dictionary.
+        """
+        theSettings = {theKey: getattr(self, theKey) for theKey in self.JOB_SETTINGS}
+        theSettings["autoReplace"] = dict(self.theProject.autoReplace)
+        return theSettings
+
+    def makeConvertJobs(self, theItems):
+        """Make the list of jobs for convertDocFiles for a list of
+        project items, with the current settings. Each job is a tuple
+        that can be passed to a worker process.
+        """
+        theSettings = self.getJobSettings()
+
+        theJobs = []
+        for theItem in theItems:
+            tHandle = theItem.itemHandle
+            docPath = os.path.join(self.theProject.projContent, tHandle+".nwd")
+            theJobs.append((tHandle, docPath, theItem.itemName, theItem.itemLayout, theSettings))
+
+        return theJobs
+
+    @staticmethod
+    def convertDocFiles(theJobs, numWorkers=None):
+        """Read and convert the documents of a list of convert jobs, and
+        yield the results in the same order as the jobs. The headings of
+        novel documents are numbered afterwards by applyConverted, in
+        document order. Closing the generator early stops any worker
+        processes.
+        """
+        if numWorkers is None:
+            numWorkers = 1
+            if len(theJobs) >= nwConst.MIN_PARALLEL_BUILD:
+                numWorkers = os.cpu_count() or 1
+
+        thePool = None
+        if numWorkers > 1 and len(theJobs) > 1:
+            logger.debug("Converting %d documents using %d workers" % (len(theJobs), numWorkers))
+            try:
+                thePool = multiprocessing.get_context("spawn").Pool(numWorkers)
+            except Exception as e:
+                logger.error("Failed to start build worker processes")
+                logger.error(str(e))
+                thePool = None
+
+        if thePool is None:
+            yield from map(_convertDocFile, theJobs)
+        else:
+            nChunk = max(1, len(theJobs)//(4*numWorkers))
+            with thePool:
+                yield from thePool.imap(_convertDocFile, theJobs, nChunk)
+
+        return
+
+    def convertCached(self, theItems, docCache, cacheDir, numWorkers=None):
+        """Convert the documents of a list of project items like
+        convertDocFiles, but reuse the records saved in cacheDir of
+        documents that have not changed. Each record is saved to its own
+        file when it is converted, and read back when it is yielded, so
+        only one record is held in memory at a time. The keys of the
+        saved records are kept in docCache, which only keeps the
+        documents of theItems, and can be saved as JSON. A document is
+        converted again if its file stamp, name or layout has changed,
+        and all documents are if the settings, the cache version or the
+        novelWriter version have changed. Yields the handle and record
+        of each item, in order.
+        """
+        cacheId = self.getCacheId()
+        prevKeys = docCache.get("keys", {})
+        oldKeys = prevKeys if docCache.get("cache") == cacheId else {}
+
+        # Keys not reached if the generator is closed early are kept
+        newKeys = {}
+        theKeys = {}
+        allJobs = {}
+        theJobs = []
+        for theJob in self.makeConvertJobs(theItems):
+            tHandle, docPath, itemName, itemLayout, _ = theJob
+            try:
+                theStat = os.stat(docPath)
+                fileStamp = [theStat.st_mtime_ns, theStat.st_size]
+            except OSError:
+                fileStamp = None
+
+            theKeys[tHandle] = [fileStamp, itemName, itemLayout.name]
+            allJobs[tHandle] = theJob
+            if tHandle in oldKeys:
+                newKeys[tHandle] = oldKeys[tHandle]
+            if oldKeys.get(tHandle) != theKeys[tHandle]:
+                theJobs.append(theJob)
+
+        docCache.clear()
+        docCache["cache"] = cacheId
+        docCache["keys"] = newKeys
+
+        try:
+            os.makedirs(cacheDir, exist_ok=True)
+            for tHandle in prevKeys:
+                if tHandle not in theKeys:
+                    self._deleteCached(cacheDir, tHandle)
+        except Exception as e:
+            logger.error("Failed to update build document cache")
+            logger.error(str(e))
+
+        self.numConverted = len(theJobs)
+        logger.debug("Converting %d of %d documents" % (len(theJobs), len(theKeys)))
+        theResults = self.convertDocFiles(theJobs, numWorkers=numWorkers)
+        try:
+            for tHandle, theKey in theKeys.items():
+                isNew = oldKeys.get(tHandle) != theKey
+                if isNew:
+                    _, theRecord = next(theResults)
+                else:
+                    theRecord = self._readCached(cacheDir, tHandle, cacheId, theKey)
+                    if theRecord is None:
+                        # The saved record is missing or outdated
+                        _, theRecord = _convertDocFile(allJobs[tHandle])
+                        self.numConverted += 1
+                        isNew = True
+
+                if isNew:
+                    newKeys.pop(tHandle, None)
+                    if theRecord is None:
+                        self._deleteCached(cacheDir, tHandle)
+                    elif self._writeCached(cacheDir, tHandle, cacheId, theKey, theRecord):
+                        newKeys[tHandle] = theKey
+
+                yield tHandle, theRecord
+
+        finally:
+            theResults.close()
+
+        return
+
+    def getCacheId(self):
+        """Return the identifier of the records saved by convertCached
+        with the current settings. It changes with the settings, the
+        cache version and the novelWriter version.
+        """
+        theData = json.dumps([
+            self.CACHE_VERSION, nw.__version__, self.getJobSettings()
+        ], sort_keys=True)
+        return hashlib.sha1(theData.encode("utf8")).hexdigest()
+
+    def convertParts(self):
+        """Convert the tokens of a document, except for the headings of
+        novel documents, as they depend on the headings of the documents
+        before them. The result is split into the parts between these
+        headings. If a heading interrupts a paragraph, the parts cannot
+        be joined again without changing the result, so the tokens are
+        kept instead. Returns the record used by applyConverted.
+        """
+        self.doMarkdownPostProcessing()
+        theRecord = {
+            "layout"   : None,
+            "markdown" : self.theMarkdown,
+            "errors"   : self.errData,
+            "parts"    : None,
+            "heads"    : [],
+            "tokens"   : None,
+        }
+
+        if not self.isNovel:
+            self.doHeaders()
+            self.doConvert()
+            Tokenizer.doPostProcessing(self)
+            theRecord["parts"] = [self.theResult]
+            return theRecord
+
+        # The text tokens are kept between the headings as they reset
+        # the first scene flag of doHeaders
+        theParts = []
+        allTokens = self.theTokens
+        inPar = False
+        nStart = 0
+        for n, tToken in enumerate(allTokens):
+            if tToken[0] == self.T_TEXT:
+                inPar = True
+                if not theRecord["heads"] or theRecord["heads"][-1][0] != self.T_TEXT:
+                    theRecord["heads"].append((self.T_TEXT, tToken[1], "", None, self.A_NONE))
+            elif tToken[0] == self.T_EMPTY:
+                inPar = False
+            elif tToken[0] in self.NOVEL_HEADS:
+                if inPar:
+                    theRecord["heads"] = []
+                    theRecord["tokens"] = allTokens
+                    return theRecord
+                self.theTokens = allTokens[nStart:n]
+                theParts.append(self.unescapeText("".join(self.iterConvert())))
+                theRecord["heads"].append(tToken)
+                nStart = n + 1
+
+        self.theTokens = allTokens[nStart:]
+        theParts.append(self.unescapeText("".join(self.iterConvert())))
+        theRecord["parts"] = theParts
+
+        return theRecord
+
+    def applyConverted(self, theHandle, theRecord):
+        """Finish a document converted by convertDocFiles. The headings
+        of novel documents are numbered and converted, and added to the
+        parts of the result. The result and markdown are then the same
+        as after doConvert and doPostProcessing.
+        """
+        self.theHandle = theHandle
+        self.setLayout(nwItemLayout[theRecord["layout"]])
+        self.theMarkdown = theRecord["markdown"]
+        self.errData.extend(theRecord["errors"])
+
+        if theRecord["tokens"] is not None:
+            self.theTokens = list(theRecord["tokens"])
+            self.doHeaders()
+            self.doConvert()
+            Tokenizer.doPostProcessing(self)
+            return
+
+        theParts = theRecord["parts"]
+        theHeads = theRecord["heads"]
+        self.theTokens = list(theHeads)
+        self.doHeaders()
+        newHeads = self.theTokens
+
+        theResult = [theParts[0]]
+        nPart = 0
+        for n, tToken in enumerate(theHeads):
+            if tToken[0] == self.T_TEXT:
+                continue
+            self.theTokens = [newHeads[n]]
+            theResult.append(self.unescapeText("".join(self.iterConvert())))
+            nPart += 1
+            theResult.append(theParts[nPart])
+
+        self.theTokens = newHeads
+        self.theResult = "".join(theResult)
 
         return
 
@@ -311,7 +590,7 @@ class ToHtml(Tokenizer):
     def _formatKeywords(self, tText):
         """Apply HTML formatting to keywords.
         """
-        isValid, theBits, thePos = self.theParent.theIndex.scanThis("@"+tText)
+        isValid, theBits, thePos = scanThis("@"+tText)
         if not isValid or not theBits:
             return ""
 
@@ -340,6 +619,52 @@ class ToHtml(Tokenizer):
 
         return "<div>%s</div>" % retText
 
+    @staticmethod
+    def _readCached(cacheDir, tHandle, cacheId, theKey):
+        """Read the saved record of a document, if it was saved with
+        the same cache identifier and key.
+        """
+        cacheFile = os.path.join(cacheDir, tHandle+".json")
+        if not os.path.isfile(cacheFile):
+            return None
+        try:
+            with open(cacheFile, mode="r", encoding="utf8") as inFile:
+                theData = json.load(inFile)
+            if theData["cache"] == cacheId and theData["key"] == theKey:
+                return theData["record"]
+        except Exception as e:
+            logger.error("Failed to read cached build of document %s" % tHandle)
+            logger.error(str(e))
+        return None
+
+    @staticmethod
+    def _writeCached(cacheDir, tHandle, cacheId, theKey, theRecord):
+        """Save the record of a document, with its cache identifier and
+        key, so that it can be checked when it is read.
+        """
+        cacheFile = os.path.join(cacheDir, tHandle+".json")
+        try:
+            with open(cacheFile, mode="w", encoding="utf8") as outFile:
+                json.dump({
+                    "cache"  : cacheId,
+                    "key"    : theKey,
+                    "record" : theRecord,
+                }, outFile, separators=(",", ":"))
+        except Exception as e:
+            logger.error("Failed to save cached build of document %s" % tHandle)
+            logger.error(str(e))
+            return False
+        return True
+
+    @staticmethod
+    def _deleteCached(cacheDir, tHandle):
+        """Delete the saved record of a document.
+        """
+        cacheFile = os.path.join(cacheDir, tHandle+".json")
+        if os.path.isfile(cacheFile):
+            os.unlink(cacheFile)
+        return
+
     def _buildRegEx(self):
         """Build the regular expressions
         """
@@ -353,3 +678,38 @@ class ToHtml(Tokenizer):
         return
 
 # END Class ToHtml
+
+# =============================================================================================== #
+#  Build Worker
+# =============================================================================================== #
+
+def _convertDocFile(theJob):
+    """Read a document file from disk and convert it with convertParts.
+    This function is used by ToHtml.convertDocFiles, and may run in a
+    worker process, so it must only depend on the job data. The job is a
+    tuple of the handle, the path to the file, the item name and layout,
+    and the settings of the converter. Returns the handle and the record
+    of the document, which is None if it could not be converted.
+    """
+    tHandle, docPath, itemName, itemLayout, theSettings = theJob
+
+    theText, _ = readDocFile(docPath)
+    if theText is None:
+        return tHandle, None
+
+    try:
+        makeHtml = ToHtml(None, None)
+        for theKey, theValue in theSettings.items():
+            setattr(makeHtml, theKey, theValue)
+        makeHtml.setItemText(tHandle, itemName, itemLayout, theText)
+        makeHtml.doAutoReplace()
+        makeHtml.tokenizeText()
+        theRecord = makeHtml.convertParts()
+        theRecord["layout"] = itemLayout.name
+
+    except Exception as e:
+        logger.error("Failed to convert document %s" % tHandle)
+        logger.error(str(e))
+        return tHandle, None
+
+    return tHandle, theRecord
@@ -29,7 +29,6 @@ import logging
 import re
 
 from operator import itemgetter
-from PyQt5.QtCore import QRegularExpression
 
 from nw.core.document import NWDoc
 from nw.core.tools import numberToWord, numberToRoman
@@ -71,6 +70,23 @@ class Tokenizer():
     A_PBA_AV   = 256 # Page break after avoid
     A_PBA_NO   = 512 # Page break after avoid
 
+    # The emphasis formats, with the format keys of their delimiters
+    FMT_RULES = (
+        (nwRegEx.FMT_EI, FMT_I_B, FMT_I_E),
+        (nwRegEx.FMT_EB, FMT_B_B, FMT_B_E),
+        (nwRegEx.FMT_ST, FMT_D_B, FMT_D_E),
+    )
+
+    # The emphasis formats combined in a single pattern. Each format is
+    # a look-ahead, so that a format nested in another is also found,
+    # and its back reference is renumbered to its own delimiter group.
+    # The \w and \s classes are ASCII only, like QRegularExpression
+    # without Unicode properties, which the tokenizer used before.
+    RX_FORMAT = re.compile("(?=[_*~])(?=%s)" % "|".join(
+        "(%s)" % fmtRule[0].replace(r"\1", "\\%d" % (4*n + 2))
+        for n, fmtRule in enumerate(FMT_RULES)
+    ), re.ASCII)
+
     def __init__(self, theProject, theParent):
 
         self.theProject = theProject
@@ -101,6 +117,7 @@ class Tokenizer():
         self.hideSection = False # Do not include section headers
 
         self.linkHeaders = False # Add an anchor before headers
+        self.autoReplace = None  # Auto-replace dictionary to use instead of the project's
 
         # Instance Variables
         self.numChapter  = 0     # Counter for chapter numbers
@@ -123,6 +140,16 @@ class Tokenizer():
         # Error Handling
         self.errData = []
 
+        # Escaped characters replaced in post-processing
+        self.escDict = {
+            r"\*" : "*",
+            r"\~" : "~",
+            r"\_" : "_",
+        }
+        self.reEscape = re.compile(
+            "|".join([re.escape(k) for k in self.escDict.keys()]), flags=re.DOTALL
+        )
+
         return
 
     ##
@@ -207,35 +234,48 @@ class Tokenizer():
         if self.theItem is None:
             return False
 
-        if theText is not None:
-            # If the text is set, just use that
-            self.theText = theText
-        else:
-            # Otherwise, load it from file
-            theDocument  = NWDoc(self.theProject, self.theParent)
-            self.theText = theDocument.openDocument(theHandle)
+        if theText is None:
+            # Load the text from file
+            theDocument = NWDoc(self.theProject, self.theParent)
+            theText = theDocument.openDocument(theHandle)
+
+        return self.setItemText(theHandle, self.theItem.itemName, self.theItem.itemLayout, theText)
+
+    def setItemText(self, theHandle, itemName, itemLayout, theText):
+        """Set the text for the tokenizer, with the name and layout of
+        its project item. Unlike setText, this does not look up the item
+        in the project, so it can also be used in worker processes.
+        """
+        self.theHandle = theHandle
+        self.theText   = theText
 
         docSize = len(self.theText)
         if docSize > nwConst.MAX_DOCSIZE:
             errVal = "Document '%s' is too big (%.2f MB). Skipping." % (
-                self.theItem.itemName, docSize/1.0e6
+                itemName, docSize/1.0e6
             )
             self.theText = "# ERROR\n\n%s\n\n" % errVal
             self.errData.append(errVal)
 
-        self.isNone  = self.theItem.itemLayout == nwItemLayout.NO_LAYOUT
-        self.isTitle = self.theItem.itemLayout == nwItemLayout.TITLE
-        self.isBook  = self.theItem.itemLayout == nwItemLayout.BOOK
-        self.isPage  = self.theItem.itemLayout == nwItemLayout.PAGE
-        self.isPart  = self.theItem.itemLayout == nwItemLayout.PARTITION
-        self.isUnNum = self.theItem.itemLayout == nwItemLayout.UNNUMBERED
-        self.isChap  = self.theItem.itemLayout == nwItemLayout.CHAPTER
-        self.isScene = self.theItem.itemLayout == nwItemLayout.SCENE
-        self.isNote  = self.theItem.itemLayout == nwItemLayout.NOTE
-        self.isNovel = self.isBook or self.isUnNum or self.isChap or self.isScene
+        self.setLayout(itemLayout)
 
         return True
 
+    def setLayout(self, itemLayout):
+        """Set the layout flags of the document being processed.
+        """
+        self.isNone  = itemLayout == nwItemLayout.NO_LAYOUT
+        self.isTitle = itemLayout == nwItemLayout.TITLE
+        self.isBook  = itemLayout == nwItemLayout.BOOK
+        self.isPage  = itemLayout == nwItemLayout.PAGE
+        self.isPart  = itemLayout == nwItemLayout.PARTITION
+        self.isUnNum = itemLayout == nwItemLayout.UNNUMBERED
+        self.isChap  = itemLayout == nwItemLayout.CHAPTER
+        self.isScene = itemLayout == nwItemLayout.SCENE
+        self.isNote  = itemLayout == nwItemLayout.NOTE
+        self.isNovel = self.isBook or self.isUnNum or self.isChap or self.isScene
+        return
+
     def getResult(self):
         """Return the result from the conversion.
         """
@@ -256,9 +296,13 @@ class Tokenizer():
     def doAutoReplace(self):
         """Run through the user's auto-replace dictionary.
         """
-        if len(self.theProject.autoReplace) > 0:
+        autoReplace = self.autoReplace
+        if autoReplace is None:
+            autoReplace = self.theProject.autoReplace
+
+        if len(autoReplace) > 0:
             repDict = {}
-            for aKey, aVal in self.theProject.autoReplace.items():
+            for aKey, aVal in autoReplace.items():
                 repDict["<%s>" % aKey] = aVal
             xRep = re.compile("|".join([re.escape(k) for k in repDict.keys()]), flags=re.DOTALL)
             self.theText = xRep.sub(lambda x: repDict[x.group(0)], self.theText)
@@ -269,19 +313,16 @@ class Tokenizer():
         """Do some postprocessing. Overloaded by subclasses. This just
         does the standard escaped characters.
         """
-        escapeDict = {
-            r"\*" : "*",
-            r"\~" : "~",
-            r"\_" : "_",
-        }
-        escReplace = re.compile(
-            "|".join([re.escape(k) for k in escapeDict.keys()]), flags=re.DOTALL
-        )
-        self.theResult = escReplace.sub(
-            lambda x: escapeDict[x.group(0)], self.theResult
-        )
+        self.theResult = self.unescapeText(self.theResult)
         return
 
+    def unescapeText(self, theText):
+        """Replace the standard escaped characters in a piece of the
+        result. This is the post-processing of the result, and can also
+        be applied to each part of it in turn.
+        """
+        return self.reEscape.sub(lambda x: self.escDict[x.group(0)], theText)
+
     def tokenizeText(self):
         """Scan the text for either lines starting with specific
         characters that indicate headers, comments, commands etc, or
@@ -297,14 +338,14 @@ class Tokenizer():
           4: The internal formatting map of the text, self.FMT_*
           5: The style of the block, self.A_*
         """
-        # RegExes for adding formatting tags within text lines
-        rxFormats = [
-            (QRegularExpression(nwRegEx.FMT_EI), [None, self.FMT_I_B, None, self.FMT_I_E]),
-            (QRegularExpression(nwRegEx.FMT_EB), [None, self.FMT_B_B, None, self.FMT_B_E]),
-            (QRegularExpression(nwRegEx.FMT_ST), [None, self.FMT_D_B, None, self.FMT_D_E]),
-        ]
+        self.theTokens = list(self.iterTokens())
+        return
 
-        self.theTokens = []
+    def iterTokens(self):
+        """Generator doing the work of tokenizeText, yielding the tokens
+        one line at a time instead of saving them to theTokens. The
+        filtered markdown is set when the last token has been yielded.
+        """
         self.theMarkdown = ""
         tmpMarkdown = []
         nLine = 0
@@ -313,88 +354,88 @@ class Tokenizer():
 
             # Tag lines starting with specific characters
             if len(aLine.strip()) == 0:
-                self.theTokens.append((
+                yield (
                     self.T_EMPTY,
                     nLine,
                     "",
                     None,
                     self.A_NONE
-                ))
+                )
                 tmpMarkdown.append("\n")
 
             elif aLine[0] == "%":
                 cLine = aLine[1:].lstrip()
                 synTag = cLine[:9].lower()
                 if synTag == "synopsis:":
-                    self.theTokens.append((
+                    yield (
                         self.T_SYNOPSIS,
                         nLine,
                         cLine[9:].strip(),
                         None,
                         self.A_NONE
-                    ))
+                    )
                     if self.doSynopsis:
                         tmpMarkdown.append("%s\n" % aLine)
                 else:
-                    self.theTokens.append((
+                    yield (
                         self.T_COMMENT,
                         nLine,
                         aLine[1:].strip(),
                         None,
                         self.A_NONE
-                    ))
+                    )
                     if self.doComments:
                         tmpMarkdown.append("%s\n" % aLine)
 
             elif aLine[0] == "@":
-                self.theTokens.append((
+                yield (
                     self.T_KEYWORD,
                     nLine,
                     aLine[1:].strip(),
                     None,
                     self.A_NONE
-                ))
+                )
                 if self.doKeywords:
                     tmpMarkdown.append("%s\n" % aLine)
 
             elif aLine[:2] == "# ":
-                self.theTokens.append((
+                yield (
                     self.T_HEAD1,
                     nLine,
                     aLine[2:].strip(),
                     None,
                     self.A_NONE
-                ))
+                )
                 tmpMarkdown.append("%s\n" % aLine)
 
             elif aLine[:3] == "## ":
-                self.theTokens.append((
+                yield (
                     self.T_HEAD2,
                     nLine,
                     aLine[3:].strip(),
                     None,
                     self.A_NONE
-                ))
+                )
                 tmpMarkdown.append("%s\n" % aLine)
 
             elif aLine[:4] == "### ":
-                self.theTokens.append((
+                yield (
                     self.T_HEAD3,
                     nLine,
                     aLine[4:].strip(),
                     None,
                     self.A_NONE
-                ))
+                )
                 tmpMarkdown.append("%s\n" % aLine)
 
             elif aLine[:5] == "#### ":
-                self.theTokens.append((
+                yield (
                     self.T_HEAD4,
                     nLine,
                     aLine[5:].strip(),
                     None,
                     self.A_NONE
-                ))
+                )
                 tmpMarkdown.append("%s\n" % aLine)
 
             else:
@@ -403,37 +444,42 @@ class Tokenizer():
                     continue
 
                 # Otherwise we use RegEx to find formatting tags within a line of text
+                # Each format continues the search after its previous
+                # match, so matches overlapping it are skipped
                 fmtPos = []
-                for theRX, theKeys in rxFormats:
-                    rxThis = theRX.globalMatch(aLine, 0)
-                    while rxThis.hasNext():
-                        rxMatch = rxThis.next()
-                        for n in range(1, len(theKeys)):
-                            if theKeys[n] is not None:
-                                xPos = rxMatch.capturedStart(n)
-                                xLen = rxMatch.capturedLength(n)
-                                fmtPos.append([xPos, xLen, theKeys[n]])
+                fmtEnd = [0, 0, 0]
+                for rxMatch in self.RX_FORMAT.finditer(aLine):
+                    n = (rxMatch.lastindex - 1) // 4
+                    if rxMatch.start() < fmtEnd[n]:
+                        continue
+                    nGrp = 4*n + 1
+                    fmtEnd[n] = rxMatch.end(nGrp)
+                    _, fmtBeg, fmtFin = self.FMT_RULES[n]
+                    xPos = rxMatch.start(nGrp + 1)
+                    fmtPos.append([xPos, rxMatch.end(nGrp + 1) - xPos, fmtBeg])
+                    xPos = rxMatch.start(nGrp + 3)
+                    fmtPos.append([xPos, rxMatch.end(nGrp + 3) - xPos, fmtFin])
 
                 # Save the line as is, but append the array of formatting locations
                 # sorted by position
                 fmtPos = sorted(fmtPos, key=itemgetter(0))
-                self.theTokens.append((
+                yield (
                     self.T_TEXT,
                     nLine,
                     aLine,
                     fmtPos,
                     self.A_NONE
-                ))
+                )
                 tmpMarkdown.append("%s\n" % aLine)
 
         # Always add an empty line at the end
-        self.theTokens.append((
+        yield (
             self.T_EMPTY,
             nLine,
             "",
             None,
             self.A_NONE
-        ))
+        )
         tmpMarkdown.append("\n")
 
         self.theMarkdown = "".join(tmpMarkdown)
@@ -42,11 +42,6 @@ def countWords(theText):
     """Count words in a piece of text, skipping special syntax and
     comments.
     """
-    charCount = 0
-    wordCount = 0
-    paraCount = 0
-    prevEmpty = True
-
     # We need to treat dashes as word separators for counting words.
     # The check+replace apprach is much faster that direct replace for
     # large texts, and a bit slower for small texts, but in the latter
@@ -56,8 +51,36 @@ def countWords(theText):
     if nwUnicode.U_EMDASH in theText:
         theText = theText.replace(nwUnicode.U_EMDASH, " ")
 
-    for aLine in theText.splitlines():
+    theCounts, _ = countSections(theText.splitlines(), False)
 
+    return theCounts
+
+def countSections(theLines, checkDashes=True):
+    """Count words in a text split into lines, in the same way as
+    countWords, in a single pass. Returns the counts of the whole text,
+    and a dictionary of the counts of each section starting at a
+    heading, keyed by the line number of the heading, counting from 1.
+    If the dashes have already been replaced, checkDashes can be set to
+    False to skip the check on each line.
+    """
+    charCount = 0
+    wordCount = 0
+    paraCount = 0
+    prevEmpty = True
+
+    # Counts of the whole text, and of the text before the current
+    # section
+    totChars = 0
+    totWords = 0
+    totParas = 0
+
+    nLine  = 0
+    nTitle = 0
+    theSections = {}
+
+    for aLine in theLines:
+
+        nLine    += 1
         countPara = True
         theLen    = len(aLine)
 
@@ -67,31 +90,49 @@ def countWords(theText):
         if aLine[0] == "@" or aLine[0] == "%":
             continue
 
-        if aLine[0:5] == "#### ":
-            wordCount -= 1
-            charCount -= 5
-            countPara = False
-        elif aLine[0:4] == "### ":
-            wordCount -= 1
-            charCount -= 4
-            countPara = False
-        elif aLine[0:3] == "## ":
-            wordCount -= 1
-            charCount -= 3
-            countPara = False
-        elif aLine[0:2] == "# ":
-            wordCount -= 1
-            charCount -= 2
-            countPara = False
-
-        wordCount += len(aLine.split())
+        if aLine[0] == "#":
+            if aLine[0:5] == "#### ":
+                hLen = 5
+            elif aLine[0:4] == "### ":
+                hLen = 4
+            elif aLine[0:3] == "## ":
+                hLen = 3
+            elif aLine[0:2] == "# ":
+                hLen = 2
+            else:
+                hLen = 0
+
+            if hLen > 0:
+                # A heading starts a new section
+                if nTitle > 0:
+                    theSections[nTitle] = (charCount, wordCount, paraCount)
+                totChars += charCount
+                totWords += wordCount
+                totParas += paraCount
+                charCount = -hLen
+                wordCount = -1
+                paraCount = 0
+                nTitle    = nLine
+                countPara = False
+
+        if checkDashes and (nwUnicode.U_ENDASH in aLine or nwUnicode.U_EMDASH in aLine):
+            wordCount += len(
+                aLine.replace(nwUnicode.U_ENDASH, " ").replace(nwUnicode.U_EMDASH, " ").split()
+            )
+        else:
+            wordCount += len(aLine.split())
         charCount += theLen
         if countPara and prevEmpty:
             paraCount += 1
 
         prevEmpty = not countPara
 
-    return charCount, wordCount, paraCount
+    if nTitle > 0:
+        theSections[nTitle] = (charCount, wordCount, paraCount)
+
+    theCounts = (totChars + charCount, totWords + wordCount, totParas + paraCount)
+
+    return theCounts, theSections
 
 # =============================================================================================== #
 #  Convert an Integer to a Roman Number
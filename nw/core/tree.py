@@ -51,6 +51,7 @@ class NWTree():
         self._archRoot    = None  # The handle of the archive root folder
         self._theIndex    = 0     # The current iterator index
         self._treeChanged = False # True if tree structure has changed
+        self._treeVersion = 0     # Incremented when the tree structure changes
 
         self._handleSeed  = None  # Used for generating handles for testing
 
@@ -70,6 +71,7 @@ class NWTree():
         self._archRoot  = None
         self._theIndex  = 0
         self._treeChanged = False
+        self._treeVersion += 1
         return
 
     def handles(self):
@@ -299,6 +301,14 @@ class NWTree():
         """
         return tHandle in self._treeOrder
 
+    def treeVersion(self):
+        """Returns a counter that is incremented every time the items
+        of the tree, their order, or which of them are included in the
+        novel, changes. Used by the index to tell when its cached novel
+        structure is outdated.
+        """
+        return self._treeVersion
+
     ##
     #  Setters
     ##
@@ -328,6 +338,13 @@ class NWTree():
 
         return
 
+    def updateVersion(self):
+        """Increment the tree version counter. This is called by items
+        when a change that affects the novel structure is made to them.
+        """
+        self._treeVersion += 1
+        return
+
     def setSeed(self, theSeed):
         """Used for debugging!
         Sets a seed for generating handles so that they always come out
@@ -459,6 +476,7 @@ class NWTree():
         """
         self._treeChanged = theState
         if theState:
+            self._treeVersion += 1
             self.theProject.setProjectChanged(True)
         return
 
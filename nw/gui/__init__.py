@@ -9,13 +9,15 @@ from nw.gui.docviewer import GuiDocViewer, GuiDocViewDetails
 from nw.gui.itemdetails import GuiItemDetails
 from nw.gui.itemeditor import GuiItemEditor
 from nw.gui.mainmenu import GuiMainMenu
-from nw.gui.outline import GuiOutline
+from nw.gui.outline import GuiOutline, GuiOutlineFilter
 from nw.gui.outlinedetails import GuiOutlineDetails
 from nw.gui.preferences import GuiPreferences
 from nw.gui.projload import GuiProjectLoad
+from nw.gui.projsearch import GuiProjectSearch
 from nw.gui.projsettings import GuiProjectSettings
 from nw.gui.projtree import GuiProjectTree
 from nw.gui.projwizard import GuiProjectWizard
+from nw.gui.refstats import GuiRefStats
 from nw.gui.statusbar import GuiMainStatus
 from nw.gui.theme import GuiTheme
 from nw.gui.writingstats import GuiWritingStats
@@ -34,11 +36,14 @@ __all__ = [
     "GuiMainStatus",
     "GuiOutline",
     "GuiOutlineDetails",
+    "GuiOutlineFilter",
     "GuiPreferences",
     "GuiProjectLoad",
+    "GuiProjectSearch",
     "GuiProjectSettings",
     "GuiProjectTree",
     "GuiProjectWizard",
+    "GuiRefStats",
     "GuiTheme",
     "GuiWritingStats",
 ]
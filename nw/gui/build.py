@@ -81,6 +81,7 @@ class GuiBuildNovel(QDialog):
         self.htmlStyle = [] # List of html styles
         self.nwdText   = [] # List of markdown documents
         self.buildTime = 0  # The timestamp of the last build
+        self.docCache  = None # The converted documents of the last build
 
         self.setWindowTitle("Build Novel Project")
         self.setMinimumWidth(self.mainConf.pxInt(700))
@@ -381,8 +382,13 @@ class GuiBuildNovel(QDialog):
 
         self.btnSave = QPushButton("Save As")
         self.saveMenu = QMenu(self)
+        self.saveMenu.setToolTipsVisible(True)
         self.btnSave.setMenu(self.saveMenu)
 
+        # The formats written by novelWriter itself are built again when
+        # saved, so they are not limited by the size of the preview
+        reBuildTip = "Builds the project again with the current settings when saved."
+
         self.saveODT = QAction("Open Document (.odt)", self)
         self.saveODT.triggered.connect(lambda: self._saveDocument(self.FMT_ODT))
         self.saveMenu.addAction(self.saveODT)
@@ -393,10 +399,12 @@ class GuiBuildNovel(QDialog):
 
         self.saveHTM = QAction("novelWriter HTML (.htm)", self)
         self.saveHTM.triggered.connect(lambda: self._saveDocument(self.FMT_HTM))
+        self.saveHTM.setToolTip(reBuildTip)
         self.saveMenu.addAction(self.saveHTM)
 
         self.saveNWD = QAction("novelWriter Markdown (.nwd)", self)
         self.saveNWD.triggered.connect(lambda: self._saveDocument(self.FMT_NWD))
+        self.saveNWD.setToolTip(reBuildTip)
         self.saveMenu.addAction(self.saveNWD)
 
         if self.mainConf.verQtValue >= 51400:
@@ -410,10 +418,12 @@ class GuiBuildNovel(QDialog):
 
         self.saveJsonH = QAction("JSON + novelWriter HTML (.json)", self)
         self.saveJsonH.triggered.connect(lambda: self._saveDocument(self.FMT_JSON_H))
+        self.saveJsonH.setToolTip(reBuildTip)
         self.saveMenu.addAction(self.saveJsonH)
 
         self.saveJsonM = QAction("JSON + novelWriters Markdown (.json)", self)
         self.saveJsonM.triggered.connect(lambda: self._saveDocument(self.FMT_JSON_M))
+        self.saveJsonM.setToolTip(reBuildTip)
         self.saveMenu.addAction(self.saveJsonM)
 
         self.btnClose = QPushButton("Close")
@@ -538,45 +548,19 @@ class GuiBuildNovel(QDialog):
     ##
 
     def _buildPreview(self):
-        """Build a preview of the project in the document viewer.
+        """Build a preview of the project in the document viewer. The
+        build stops collecting the result when it grows too big for the
+        preview, as the formats written by novelWriter itself are built
+        again, one document at a time, when saved.
         """
         # Get Settings
-        fmtTitle      = self.fmtTitle.text().strip()
-        fmtChapter    = self.fmtChapter.text().strip()
-        fmtUnnumbered = self.fmtUnnumbered.text().strip()
-        fmtScene      = self.fmtScene.text().strip()
-        fmtSection    = self.fmtSection.text().strip()
-        justifyText   = self.justifyText.isChecked()
-        noStyling     = self.noStyling.isChecked()
-        textFont      = self.textFont.text()
-        textSize      = self.textSize.value()
-        incSynopsis   = self.includeSynopsis.isChecked()
-        incComments   = self.includeComments.isChecked()
-        incKeywords   = self.includeKeywords.isChecked()
-        novelFiles    = self.novelFiles.isChecked()
-        noteFiles     = self.noteFiles.isChecked()
-        ignoreFlag    = self.ignoreFlag.isChecked()
-        includeBody   = self.includeBody.isChecked()
-        replaceTabs   = self.replaceTabs.isChecked()
-
-        makeHtml = ToHtml(self.theProject, self.theParent)
-        makeHtml.setTitleFormat(fmtTitle)
-        makeHtml.setChapterFormat(fmtChapter)
-        makeHtml.setUnNumberedFormat(fmtUnnumbered)
-        makeHtml.setSceneFormat(fmtScene, fmtScene == "")
-        makeHtml.setSectionFormat(fmtSection, fmtSection == "")
-        makeHtml.setBodyText(includeBody)
-        makeHtml.setSynopsis(incSynopsis)
-        makeHtml.setComments(incComments)
-        makeHtml.setKeywords(incKeywords)
-        makeHtml.setJustify(justifyText)
-        makeHtml.setStyles(not noStyling)
-
-        # Make sure the tree order is correct
-        self.theParent.treeView.flushTreeOrder()
+        justifyText = self.justifyText.isChecked()
+        noStyling   = self.noStyling.isChecked()
+        textFont    = self.textFont.text()
+        textSize    = self.textSize.value()
+        replaceTabs = self.replaceTabs.isChecked()
 
-        self.buildProgress.setMaximum(len(self.theProject.projTree))
-        self.buildProgress.setValue(0)
+        makeHtml = self._makeHtml()
 
         tStart = int(time())
 
@@ -585,45 +569,31 @@ class GuiBuildNovel(QDialog):
         self.nwdText = []
 
         htmlSize = 0
+        eightSpace = "&nbsp;"*8
 
-        for nItt, tItem in enumerate(self.theProject.projTree):
-
-            noteRoot  = noteFiles
-            noteRoot &= tItem.itemType == nwItemType.ROOT
-            noteRoot &= tItem.itemClass != nwItemClass.NOVEL
-            noteRoot &= tItem.itemClass != nwItemClass.ARCHIVE
-
-            try:
-                if noteRoot:
-                    # Add headers for root folders of notes
-                    makeHtml.addRootHeading(tItem.itemHandle)
-                    makeHtml.doConvert()
-                    self.htmlText.append(makeHtml.getResult())
-                    self.nwdText.append(makeHtml.getFilteredMarkdown())
-                    htmlSize += makeHtml.getResultSize()
-
-                elif self._checkInclude(tItem, noteFiles, novelFiles, ignoreFlag):
-                    makeHtml.setText(tItem.itemHandle)
-                    makeHtml.doAutoReplace()
-                    makeHtml.tokenizeText()
-                    makeHtml.doHeaders()
-                    makeHtml.doConvert()
-                    makeHtml.doPostProcessing()
-                    self.htmlText.append(makeHtml.getResult())
-                    self.nwdText.append(makeHtml.getFilteredMarkdown())
-                    htmlSize += makeHtml.getResultSize()
-
-            except Exception as e:
+        for tItem, isBuilt in self._iterBuildDocs(makeHtml):
+            if not isBuilt:
                 logger.error("Failed to generate html of document '%s'" % tItem.itemHandle)
-                logger.error(str(e))
                 self.docView.setText((
                     "Failed to generate preview. "
                     "Document with title '%s' could not be parsed."
                 ) % tItem.itemName)
                 return False
 
-            # Update progress bar, also for skipped items
-            self.buildProgress.setValue(nItt+1)
+            htmlText = makeHtml.getResult()
+            nwdText = makeHtml.getFilteredMarkdown()
+            if replaceTabs:
+                htmlText = htmlText.replace("\t", eightSpace)
+                nwdText = nwdText.replace("\t", "        ")
+
+            htmlSize += len(htmlText)
+            if htmlSize >= nwConst.MAX_BUILDSIZE:
+                self.htmlText = []
+                self.nwdText = []
+                break
+
+            self.htmlText.append(htmlText)
+            self.nwdText.append(nwdText)
 
         if makeHtml.errData:
             self.theParent.makeAlert((
@@ -631,18 +601,6 @@ class GuiBuildNovel(QDialog):
                 "<br>-&nbsp;%s"
             ) % "<br>-&nbsp;".join(makeHtml.errData), nwAlert.ERROR)
 
-        if replaceTabs:
-            htmlText = []
-            eightSpace = "&nbsp;"*8
-            for aLine in self.htmlText:
-                htmlText.append(aLine.replace("\t", eightSpace))
-            self.htmlText = htmlText
-
-            nwdText = []
-            for aLine in self.nwdText:
-                nwdText.append(aLine.replace("\t", "        "))
-            self.nwdText = nwdText
-
         tEnd = int(time())
         logger.debug("Built project in %.3f ms" % (1000*(tEnd-tStart)))
         self.htmlStyle = makeHtml.getStyleSheet()
@@ -661,7 +619,8 @@ class GuiBuildNovel(QDialog):
             self._enableQtSave(True)
         else:
             self.docView.setText(
-                "Failed to generate preview. The result is too big."
+                "Failed to generate preview. The result is too big. "
+                "It can still be saved as HTML, novelWriter Markdown or JSON."
             )
             self._enableQtSave(False)
 
@@ -797,75 +756,19 @@ class GuiBuildNovel(QDialog):
             wSuccess = docWriter.write(self.docView.qDocument)
 
         elif outTool == "NW":
+            # The document is written to a temp file first, so a build
+            # that fails half way does not leave a truncated file behind
+            tempPath = savePath + "~"
             try:
-                with open(savePath, mode="w", encoding="utf8") as outFile:
-                    if theFormat == self.FMT_HTM:
-                        # Write novelWriter HTML data
-                        theStyle = self.htmlStyle.copy()
-                        theStyle.append(r"article {width: 800px; margin: 40px auto;}")
-                        bodyText = "".join(self.htmlText)
-                        bodyText = bodyText.replace("\t", "&#09;")
-
-                        theHtml = (
-                            "<!DOCTYPE html>\n"
-                            "<html>\n"
-                            "<head>\n"
-                            "<meta charset='utf-8'>\n"
-                            "<title>{projTitle:s}</title>\n"
-                            "</head>\n"
-                            "<style>\n"
-                            "{htmlStyle:s}\n"
-                            "</style>\n"
-                            "<body>\n"
-                            "<article>\n"
-                            "{bodyText:s}\n"
-                            "</article>\n"
-                            "</body>\n"
-                            "</html>\n"
-                        ).format(
-                            projTitle = self.theProject.projName,
-                            htmlStyle = "\n".join(theStyle),
-                            bodyText = bodyText,
-                        )
-                        outFile.write(theHtml)
-
-                    elif theFormat == self.FMT_NWD:
-                        # Write novelWriter markdown data
-                        for aLine in self.nwdText:
-                            outFile.write(aLine)
-
-                    elif theFormat == self.FMT_JSON_H or theFormat == self.FMT_JSON_M:
-                        jsonData = {
-                            "meta" : {
-                                "workingTitle" : self.theProject.projName,
-                                "novelTitle"   : self.theProject.bookTitle,
-                                "authors"      : self.theProject.bookAuthors,
-                                "buildTime"    : self.buildTime,
-                            }
-                        }
-
-                        if theFormat == self.FMT_JSON_H:
-                            theBody = []
-                            for htmlPage in self.htmlText:
-                                theBody.append(htmlPage.rstrip("\n").split("\n"))
-                            jsonData["text"] = {
-                                "css"  : self.htmlStyle,
-                                "html" : theBody,
-                            }
-                        elif theFormat == self.FMT_JSON_M:
-                            theBody = []
-                            for nwdPage in self.nwdText:
-                                theBody.append(nwdPage.split("\n"))
-                            jsonData["text"] = {
-                                "nwd" : theBody,
-                            }
-
-                        outFile.write(json.dumps(jsonData, indent=2))
-
+                with open(tempPath, mode="w", encoding="utf8") as outFile:
+                    self._writeDocument(outFile, theFormat)
+                os.replace(tempPath, savePath)
                 wSuccess = True
 
             except Exception as e:
                 errMsg = str(e)
+                if os.path.isfile(tempPath):
+                    os.unlink(tempPath)
 
         elif outTool == "QtPrint" and theFormat == self.FMT_PDF:
             try:
@@ -990,6 +893,46 @@ class GuiBuildNovel(QDialog):
 
         return True
 
+    def _loadDocCache(self):
+        """Load the keys of the documents converted by the previous
+        build, which are used to only convert the documents that have
+        changed since. The converted documents are saved one file per
+        document by convertCached.
+        """
+        self.docCache = {}
+        docCache = os.path.join(self.theProject.projCache, nwFiles.BUILD_DOCS)
+        if not os.path.isfile(docCache):
+            return True
+
+        logger.debug("Loading build document cache")
+        try:
+            with open(docCache, mode="r", encoding="utf8") as inFile:
+                theData = json.load(inFile)
+            if isinstance(theData, dict):
+                self.docCache = theData
+        except Exception as e:
+            logger.error("Failed to load build document cache")
+            logger.error(str(e))
+            return False
+
+        return True
+
+    def _saveDocCache(self):
+        """Save the keys of the documents converted by the build.
+        """
+        docCache = os.path.join(self.theProject.projCache, nwFiles.BUILD_DOCS)
+
+        logger.debug("Saving build document cache")
+        try:
+            with open(docCache, mode="w", encoding="utf8") as outFile:
+                json.dump(self.docCache, outFile, separators=(",", ":"))
+        except Exception as e:
+            logger.error("Failed to save build document cache")
+            logger.error(str(e))
+            return False
+
+        return True
+
     def _doClose(self):
         """Close button was clicked.
         """
@@ -1012,6 +955,186 @@ class GuiBuildNovel(QDialog):
     #  Internal Functions
     ##
 
+    def _makeHtml(self):
+        """Create the HTML converter with the current build settings.
+        """
+        fmtScene   = self.fmtScene.text().strip()
+        fmtSection = self.fmtSection.text().strip()
+
+        makeHtml = ToHtml(self.theProject, self.theParent)
+        makeHtml.setTitleFormat(self.fmtTitle.text().strip())
+        makeHtml.setChapterFormat(self.fmtChapter.text().strip())
+        makeHtml.setUnNumberedFormat(self.fmtUnnumbered.text().strip())
+        makeHtml.setSceneFormat(fmtScene, fmtScene == "")
+        makeHtml.setSectionFormat(fmtSection, fmtSection == "")
+        makeHtml.setBodyText(self.includeBody.isChecked())
+        makeHtml.setSynopsis(self.includeSynopsis.isChecked())
+        makeHtml.setComments(self.includeComments.isChecked())
+        makeHtml.setKeywords(self.includeKeywords.isChecked())
+        makeHtml.setJustify(self.justifyText.isChecked())
+        makeHtml.setStyles(not self.noStyling.isChecked())
+
+        return makeHtml
+
+    def _iterBuildDocs(self, makeHtml):
+        """Generator building the project items to include, in order,
+        and yielding each item and whether it was built. The result and
+        markdown of the item are in the converter when it is yielded.
+        The documents are converted in parallel for large projects, and
+        the headings of novel documents numbered in order as they are
+        yielded. The progress bar is updated as it goes.
+        """
+        noteFiles  = self.noteFiles.isChecked()
+        novelFiles = self.novelFiles.isChecked()
+        ignoreFlag = self.ignoreFlag.isChecked()
+
+        # Make sure the tree order is correct
+        self.theParent.treeView.flushTreeOrder()
+
+        theItems = []
+        for tItem in self.theProject.projTree:
+
+            noteRoot  = noteFiles
+            noteRoot &= tItem.itemType == nwItemType.ROOT
+            noteRoot &= tItem.itemClass != nwItemClass.NOVEL
+            noteRoot &= tItem.itemClass != nwItemClass.ARCHIVE
+
+            if noteRoot:
+                theItems.append((tItem, True))
+            elif self._checkInclude(tItem, noteFiles, novelFiles, ignoreFlag):
+                theItems.append((tItem, False))
+
+        self.buildProgress.setMaximum(len(theItems))
+        self.buildProgress.setValue(0)
+
+        if self.docCache is None:
+            self._loadDocCache()
+
+        theResults = makeHtml.convertCached(
+            [tItem for tItem, isRoot in theItems if not isRoot], self.docCache,
+            os.path.join(self.theProject.projCache, nwFiles.BUILD_DIR)
+        )
+        try:
+            for nItt, (tItem, isRoot) in enumerate(theItems):
+                if isRoot:
+                    # Add headers for root folders of notes
+                    makeHtml.addRootHeading(tItem.itemHandle)
+                    makeHtml.doConvert()
+                    yield tItem, True
+                else:
+                    tHandle, theRecord = next(theResults)
+                    if theRecord is not None:
+                        makeHtml.applyConverted(tHandle, theRecord)
+                    yield tItem, theRecord is not None
+
+                self.buildProgress.setValue(nItt+1)
+
+        finally:
+            theResults.close()
+
+        if makeHtml.numConverted > 0:
+            self._saveDocCache()
+
+        return
+
+    def _writeDocument(self, outFile, theFormat):
+        """Build the project again with the current settings, and write
+        it to an open file in one of the formats novelWriter writes
+        itself. Each document is written as soon as it is converted, so
+        only one document is held in memory at a time. What is written
+        is therefore this new build, and not the text of the preview,
+        and the build time of the JSON formats is the time of this build.
+        """
+        buildTime = int(time())
+        makeHtml = self._makeHtml()
+        htmlStyle = makeHtml.getStyleSheet()
+        replaceTabs = self.replaceTabs.isChecked()
+        eightSpace = "&nbsp;"*8
+
+        if theFormat == self.FMT_HTM:
+            # Write novelWriter HTML data
+            theStyle = htmlStyle.copy()
+            theStyle.append(r"article {width: 800px; margin: 40px auto;}")
+            outFile.write((
+                "<!DOCTYPE html>\n"
+                "<html>\n"
+                "<head>\n"
+                "<meta charset='utf-8'>\n"
+                "<title>{projTitle:s}</title>\n"
+                "</head>\n"
+                "<style>\n"
+                "{htmlStyle:s}\n"
+                "</style>\n"
+                "<body>\n"
+                "<article>\n"
+            ).format(
+                projTitle = self.theProject.projName,
+                htmlStyle = "\n".join(theStyle),
+            ))
+            theTail = "\n</article>\n</body>\n</html>\n"
+
+        elif theFormat == self.FMT_JSON_H or theFormat == self.FMT_JSON_M:
+            # The pages are written into the empty list at the end of
+            # the data, indented as if it was all written at once
+            jsonData = {
+                "meta" : {
+                    "workingTitle" : self.theProject.projName,
+                    "novelTitle"   : self.theProject.bookTitle,
+                    "authors"      : self.theProject.bookAuthors,
+                    "buildTime"    : buildTime,
+                }
+            }
+            if theFormat == self.FMT_JSON_H:
+                jsonData["text"] = {
+                    "css"  : htmlStyle,
+                    "html" : [],
+                }
+            else:
+                jsonData["text"] = {
+                    "nwd" : [],
+                }
+            theHead, theTail = json.dumps(jsonData, indent=2).rsplit("[]", 1)
+            outFile.write(theHead + "[")
+
+        else:
+            theTail = ""
+
+        isJson = theFormat == self.FMT_JSON_H or theFormat == self.FMT_JSON_M
+        isHtml = theFormat == self.FMT_HTM or theFormat == self.FMT_JSON_H
+
+        nPages = 0
+        for tItem, isBuilt in self._iterBuildDocs(makeHtml):
+            if not isBuilt:
+                raise ValueError("Document with title '%s' could not be parsed." % tItem.itemName)
+
+            if isHtml:
+                htmlText = makeHtml.getResult()
+                theText = [htmlText.replace("\t", eightSpace) if replaceTabs else htmlText]
+            else:
+                nwdText = makeHtml.getFilteredMarkdown()
+                theText = [nwdText.replace("\t", "        ") if replaceTabs else nwdText]
+
+            if theFormat == self.FMT_HTM:
+                for htmlText in theText:
+                    outFile.write(htmlText.replace("\t", "&#09;"))
+            elif theFormat == self.FMT_NWD:
+                outFile.writelines(theText)
+            else:
+                thePage = "".join(theText)
+                if isHtml:
+                    thePage = thePage.rstrip("\n")
+                pageJson = json.dumps(thePage.split("\n"), indent=2)
+                outFile.write("%s\n      %s" % (
+                    "," if nPages > 0 else "", pageJson.replace("\n", "\n      ")
+                ))
+                nPages += 1
+
+        if isJson:
+            outFile.write("\n    ]" if nPages > 0 else "]")
+        outFile.write(theTail)
+
+        return
+
     def _enableQtSave(self, theState):
         """Set the enabled status of Save menu entries that depend on
         the QTextDocument.
@@ -38,7 +38,7 @@ from time import time
 
 from PyQt5.QtCore import (
     Qt, QSize, QTimer, pyqtSlot, pyqtSignal, QRegExp, QRegularExpression,
-    QPointF, QObject, QRunnable, QPropertyAnimation
+    QPointF, QObject, QRunnable, QPropertyAnimation, QStringListModel
 )
 from PyQt5.QtGui import (
     QTextCursor, QTextOption, QKeySequence, QFont, QColor, QPalette,
@@ -47,15 +47,15 @@ from PyQt5.QtGui import (
 from PyQt5.QtWidgets import (
     qApp, QTextEdit, QAction, QMenu, QShortcut, QMessageBox, QWidget, QLabel,
     QToolBar, QToolButton, QHBoxLayout, QGridLayout, QLineEdit, QPushButton,
-    QFrame
+    QFrame, QCompleter, QInputDialog
 )
 
-from nw.core import NWDoc, NWSpellSimple, countWords
+from nw.core import NWDoc, NWIndex, NWSpellSimple, countWords
 from nw.gui.dochighlight import GuiDocHighlighter
 from nw.common import transferCase
 from nw.constants import (
     nwConst, nwAlert, nwUnicode, nwDocAction, nwDocInsert, nwItemClass,
-    nwKeyWords
+    nwKeyWords, nwIndexEvent
 )
 
 logger = logging.getLogger(__name__)
@@ -66,6 +66,13 @@ class GuiDocEditor(QTextEdit):
         Qt.Key_Left, Qt.Key_Right, Qt.Key_Up, Qt.Key_Down,
         Qt.Key_PageUp, Qt.Key_PageDown
     )
+    TAG_EVENTS = (
+        nwIndexEvent.TAG_ADDED, nwIndexEvent.TAG_MOVED, nwIndexEvent.TAG_REMOVED
+    )
+    COMPLETE_KEYS = (
+        Qt.Key_Return, Qt.Key_Enter, Qt.Key_Escape, Qt.Key_Tab, Qt.Key_Backtab
+    )
+    MAX_COMPLETE = 50
 
     def __init__(self, theParent):
         QTextEdit.__init__(self, theParent)
@@ -94,6 +101,10 @@ class GuiDocEditor(QTextEdit):
         self.bigDoc     = False # Flag for very large document size
         self.doReplace  = False # Switch to temporarily disable auto-replace
         self.queuePos   = None  # Used for delayed change of cursor position
+        self.metaRange  = None  # The changed lines not yet sent to the index
+        self.metaSynced = False # Whether all lines have been sent to the index
+        self.metaBlocks = 0     # The block count at the last meta data check
+        self.tagStart   = 0     # The position of the tag being completed
 
         # Typography
         self.typDQOpen  = self.mainConf.fmtDoubleQuotes[0]
@@ -114,6 +125,14 @@ class GuiDocEditor(QTextEdit):
         # Syntax
         self.hLight = GuiDocHighlighter(self.qDocument, self.theParent)
 
+        # Tag Completion
+        self.tagCompleter = QCompleter(self)
+        self.tagCompleter.setWidget(self)
+        self.tagCompleter.setModel(QStringListModel(self.tagCompleter))
+        self.tagCompleter.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.tagCompleter.setCaseSensitivity(Qt.CaseInsensitive)
+        self.tagCompleter.activated[str].connect(self._insertTagCompletion)
+
         # Context Menu
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self._openContextMenu)
@@ -153,6 +172,16 @@ class GuiDocEditor(QTextEdit):
         self.wCounter.setAutoDelete(False)
         self.wCounter.signals.countsReady.connect(self._updateCounts)
 
+        # Send edited meta data lines to the index once the current
+        # edit has been processed
+        self.metaTimer = QTimer()
+        self.metaTimer.setSingleShot(True)
+        self.metaTimer.setInterval(0)
+        self.metaTimer.timeout.connect(self._updateMetaLines)
+
+        # Keep the tag highlighting in sync with the index
+        self.theParent.theIndex.addListener(self._indexChanged)
+
         self.initEditor()
 
         logger.debug("GuiDocEditor initialisation complete")
@@ -167,6 +196,8 @@ class GuiDocEditor(QTextEdit):
         self.setReadOnly(True)
         self.clear()
         self.wcTimer.stop()
+        self.metaTimer.stop()
+        self.closeTagCompletion()
 
         self.theHandle = None
         self.charCount = 0
@@ -177,6 +208,8 @@ class GuiDocEditor(QTextEdit):
         self.bigDoc    = False
         self.doReplace = False
         self.queuePos  = None
+        self.metaRange = None
+        self.metaSynced = False
 
         self.setDocumentChanged(False)
         self.docHeader.setTitleFromHandle(self.theHandle)
@@ -342,6 +375,10 @@ class GuiDocEditor(QTextEdit):
 
         qApp.processEvents()
         self.setDocumentChanged(False)
+        self.metaTimer.stop()
+        self.metaRange = None
+        self.metaSynced = False
+        self.metaBlocks = self.qDocument.blockCount()
 
         qApp.restoreOverrideCursor()
 
@@ -381,9 +418,10 @@ class GuiDocEditor(QTextEdit):
 
         return True
 
-    def saveText(self):
+    def saveText(self, updateIndex=True):
         """Save the text currently in the editor to the NWDoc object,
-        and update the NWItem meta data.
+        and update the NWItem meta data. The index is also updated,
+        unless the caller does so itself.
         """
         theItem = self.nwDocument.getCurrentItem()
         if theItem is None:
@@ -402,10 +440,53 @@ class GuiDocEditor(QTextEdit):
         self.nwDocument.saveDocument(docText)
         self.setDocumentChanged(False)
 
-        self.theParent.theIndex.scanText(theItem.itemHandle, docText)
+        # The full text is scanned by the index, so the changed lines
+        # no longer need to be sent
+        self.metaTimer.stop()
+        self.metaRange = None
+        self.metaSynced = True
+
+        if updateIndex:
+            self.theParent.theIndex.scanText(theItem.itemHandle, docText)
 
         return True
 
+    def replaceTag(self, theLines, oldTag, newTag):
+        """Replace a tag on the given lines of the document as a single
+        edit that can be undone. If the tag is not found on one of the
+        lines, all lines starting with @ are checked instead. Returns
+        True if the text was changed.
+        """
+        theBlocks = []
+        for nLine in theLines:
+            theBlock = self.qDocument.findBlockByNumber(nLine - 1)
+            theText = theBlock.text()
+            if not theBlock.isValid() or NWIndex.replaceTag(theText, oldTag, newTag) == theText:
+                logger.debug("Tag '%s' not found on the indexed lines" % oldTag)
+                theBlocks = []
+                theBlock = self.qDocument.begin()
+                while theBlock.isValid():
+                    if theBlock.text().startswith("@"):
+                        theBlocks.append(theBlock)
+                    theBlock = theBlock.next()
+                break
+            theBlocks.append(theBlock)
+
+        theCursor = self.textCursor()
+        theCursor.beginEditBlock()
+        isChanged = False
+        for theBlock in theBlocks:
+            theText = theBlock.text()
+            newText = NWIndex.replaceTag(theText, oldTag, newTag)
+            if newText != theText:
+                theCursor.setPosition(theBlock.position())
+                theCursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+                theCursor.insertText(newText)
+                isChanged = True
+        theCursor.endEditBlock()
+
+        return isChanged
+
     def updateDocMargins(self):
         """Automatically adjust the margins so the text is centred if
         Config.textFixedW is enabled or we're in Focus Mode. Otherwise,
@@ -546,6 +627,21 @@ class GuiDocEditor(QTextEdit):
                 logger.verbose("Cursor moved to line %d" % theLine)
         return True
 
+    def setCursorSelection(self, theLine, theCol, theLen):
+        """Select a piece of text on a given line of the document. The
+        line number starts at 1, like in the project index.
+        """
+        theBlock = self.qDocument.findBlockByNumber(theLine - 1)
+        if not theBlock.isValid():
+            return False
+        thePos = theBlock.position() + theCol
+        theCursor = self.textCursor()
+        theCursor.setPosition(thePos)
+        theCursor.setPosition(thePos + theLen, QTextCursor.KeepAnchor)
+        self.setTextCursor(theCursor)
+        self.docFooter.updateLineCount()
+        return True
+
     ##
     #  Spell Checking
     ##
@@ -800,6 +896,15 @@ class GuiDocEditor(QTextEdit):
         self.docSearch.closeSearch()
         return self.docSearch.isVisible()
 
+    def closeTagCompletion(self):
+        """Close the tag completion popup. Returns True if it was open.
+        """
+        thePopup = self.tagCompleter.popup()
+        if thePopup.isVisible():
+            thePopup.hide()
+            return True
+        return False
+
     def toggleSearch(self):
         """Toggle the visibility of the search box.
         """
@@ -821,7 +926,13 @@ class GuiDocEditor(QTextEdit):
             we block any further interaction here while it's in focus.
           * The undo/redo/select all sequences bypasses the docAction
             pathway from the menu, so we redirect them back from here.
+          * The keys that select or cancel a tag completion are left to
+            the completion popup while it is open.
         """
+        if self.tagCompleter.popup().isVisible() and keyEvent.key() in self.COMPLETE_KEYS:
+            keyEvent.ignore()
+            return
+
         isReturn  = keyEvent.key() == Qt.Key_Return
         isReturn |= keyEvent.key() == Qt.Key_Enter
         if isReturn and self.docSearch.anyFocus():
@@ -861,6 +972,7 @@ class GuiDocEditor(QTextEdit):
             QTextEdit.keyPressEvent(self, keyEvent)
 
         self.docFooter.updateLineCount()
+        self._updateTagCompletion()
 
         return
 
@@ -927,6 +1039,91 @@ class GuiDocEditor(QTextEdit):
         if self.doReplace and chrAdd == 1:
             self._docAutoReplace(self.qDocument.findBlock(thePos))
 
+        if self.theHandle is not None and self._checkMetaChange(thePos, chrAdd):
+            self.metaTimer.start()
+
+        return
+
+    @pyqtSlot()
+    def _updateMetaLines(self):
+        """Send the lines that start with @ or # in the range of lines
+        that have changed to the index, so that the tags, references
+        and headers of the document are updated as they are edited. The
+        first time after the document is loaded, the lines of the whole
+        document are sent. The highlighter's handle differs from the
+        editor's while a new document is being loaded, and then nothing
+        is sent.
+        """
+        if self.theHandle is None or self.theHandle != self.hLight.theHandle:
+            return
+        if self.metaRange is None:
+            return
+
+        if self.metaSynced:
+            nFirst, nOldEnd, nNewEnd = self.metaRange
+            theBlock = self.qDocument.findBlockByNumber(nFirst)
+        else:
+            nFirst, nOldEnd, nNewEnd = 0, None, self.qDocument.blockCount()
+            theBlock = self.qDocument.begin()
+
+        theLines = []
+        nLine = nFirst
+        while theBlock.isValid() and nLine < nNewEnd:
+            nLine += 1
+            theText = theBlock.text()
+            if theText.startswith(("@", "#")):
+                theLines.append((nLine, theText))
+            theBlock = theBlock.next()
+
+        theIndex = self.theParent.theIndex
+        if self.metaSynced:
+            theIndex.scanMetaLines(
+                self.theHandle, theLines, nFirst + 1, nOldEnd - nFirst, nNewEnd - nFirst
+            )
+        else:
+            theIndex.scanMetaLines(self.theHandle, theLines)
+
+        self.metaRange = None
+        self.metaSynced = True
+
+        return
+
+    @pyqtSlot(str)
+    def _insertTagCompletion(self, theTag):
+        """Replace the part of the tag typed so far with the tag
+        selected in the completion popup.
+        """
+        theCursor = self.textCursor()
+        theCursor.setPosition(self.tagStart, QTextCursor.KeepAnchor)
+        theCursor.insertText(theTag)
+        self.setTextCursor(theCursor)
+        return
+
+    def _indexChanged(self, theEvents):
+        """Called by the index after each change. Only the meta data
+        lines that use tags that changed are rehighlighted, unless the
+        whole index was reset. A reset index holds the document as it
+        was saved, so unsaved changes are sent to it again in full.
+        """
+        if self.theHandle is None:
+            return
+
+        theTags = set()
+        for theEvent, _, theKey in theEvents:
+            if theEvent == nwIndexEvent.INDEX_RESET:
+                self.metaSynced = False
+                if self.docChanged:
+                    # The range is not used for a full update
+                    self.metaRange = [0, 0, 0]
+                    self.metaTimer.start()
+                self.updateTagHighLighting()
+                return
+            if theEvent in self.TAG_EVENTS:
+                theTags.add(theKey)
+
+        if theTags:
+            self.hLight.rehighlightByTags(theTags)
+
         return
 
     @pyqtSlot("QPoint")
@@ -947,6 +1144,13 @@ class GuiDocEditor(QTextEdit):
             mnuTag = QAction("Follow Tag", mnuContext)
             mnuTag.triggered.connect(lambda: self._followTag(theCursor=posCursor))
             mnuContext.addAction(mnuTag)
+
+            theTag = self._tagUnderCursor(posCursor)
+            if theTag in self.theParent.theIndex.tagIndex:
+                mnuRename = QAction("Rename Tag", mnuContext)
+                mnuRename.triggered.connect(lambda: self._renameTag(theTag))
+                mnuContext.addAction(mnuRename)
+
             mnuContext.addSeparator()
 
         if userSelection:
@@ -1159,6 +1363,32 @@ class GuiDocEditor(QTextEdit):
 
         return False
 
+    def _tagUnderCursor(self, theCursor):
+        """Return the tag or reference value under a cursor on a line
+        starting with @, or None if there is none.
+        """
+        theBlock = theCursor.block()
+        isValid, theBits, thePos = NWIndex.scanThis(theBlock.text())
+        if not isValid:
+            return None
+
+        nCol = theCursor.positionInBlock()
+        for n in range(1, len(theBits)):
+            if thePos[n] <= nCol <= thePos[n] + len(theBits[n]):
+                return theBits[n]
+
+        return None
+
+    def _renameTag(self, theTag):
+        """Ask the user for a new name for a tag, and rename it.
+        """
+        newTag, isOk = QInputDialog.getText(
+            self, "Rename Tag", "New name for the tag '%s':" % theTag, text=theTag
+        )
+        if isOk:
+            return self.theParent.renameTag(theTag, newTag)
+        return False
+
     def _openSpellContext(self):
         """Opens the spell check context menu at the current point of
         the cursor.
@@ -1276,6 +1506,93 @@ class GuiDocEditor(QTextEdit):
 
         return
 
+    def _updateTagCompletion(self):
+        """Show the tags that complete the value being typed after a
+        reference keyword, or hide the completion popup if the cursor
+        is not on such a value.
+        """
+        thePopup = self.tagCompleter.popup()
+        theCursor = self.textCursor()
+        theText = theCursor.block().text()
+        if theCursor.hasSelection() or not theText.startswith("@"):
+            thePopup.hide()
+            return False
+
+        nCol = theCursor.positionInBlock()
+        nKey = theText.find(":")
+        itemClass = nwKeyWords.KEY_CLASS.get(theText[:nKey].strip(), None)
+        if nKey < 0 or nCol <= nKey or itemClass is None:
+            thePopup.hide()
+            return False
+
+        # The value being typed starts after the colon or the last comma
+        sCol = max(nKey, theText.rfind(",", 0, nCol)) + 1
+        thePrefix = theText[sCol:nCol].lstrip()
+        theTags = []
+        if thePrefix:
+            theTags = self.theParent.theIndex.getTagCompletions(
+                thePrefix, itemClass, maxCount=self.MAX_COMPLETE
+            )
+        if not theTags or theTags == [thePrefix]:
+            thePopup.hide()
+            return False
+
+        self.tagStart = theCursor.position() - len(thePrefix)
+        self.tagCompleter.model().setStringList(theTags)
+        self.tagCompleter.setCompletionPrefix(thePrefix)
+
+        theRect = self.cursorRect()
+        theRect.translate(self.viewport().pos())
+        theRect.setWidth(
+            thePopup.sizeHintForColumn(0) + thePopup.verticalScrollBar().sizeHint().width()
+        )
+        self.tagCompleter.complete(theRect)
+        thePopup.setCurrentIndex(self.tagCompleter.completionModel().index(0, 0))
+
+        return True
+
+    def _checkMetaChange(self, thePos, chrAdd):
+        """Check if a change to the document may have changed its meta
+        data or heading lines, and if so, add the changed lines to the
+        range of lines to send to the index. That is the case if lines
+        were added or removed, if the change starts at the beginning of
+        a line, or if any of the changed lines start with @ or #.
+        """
+        endPos = thePos + chrAdd
+        nDelta = self.qDocument.blockCount() - self.metaBlocks
+        firstBlock = self.qDocument.findBlock(thePos)
+
+        isMeta = nDelta != 0 or thePos == firstBlock.position()
+        theBlock = firstBlock
+        while not isMeta and theBlock.isValid() and theBlock.position() <= endPos:
+            isMeta = theBlock.text().startswith(("@", "#"))
+            theBlock = theBlock.next()
+
+        if not isMeta:
+            return False
+
+        # The range is given as the first changed block, and the end of
+        # the changed blocks before and after the change. It is merged
+        # with the range of earlier changes not yet sent to the index.
+        lastBlock = self.qDocument.findBlock(endPos)
+        if not lastBlock.isValid():
+            lastBlock = self.qDocument.lastBlock()
+
+        nFirst = firstBlock.blockNumber()
+        nNewEnd = lastBlock.blockNumber() + 1
+        nOldEnd = nNewEnd - nDelta
+        if self.metaRange is not None:
+            prevFirst, prevOldEnd, prevNewEnd = self.metaRange
+            nMid = max(prevNewEnd, nOldEnd)
+            nFirst = min(prevFirst, nFirst)
+            nOldEnd = nMid - (prevNewEnd - prevOldEnd)
+            nNewEnd = nMid + nDelta
+
+        self.metaRange = [nFirst, nOldEnd, nNewEnd]
+        self.metaBlocks += nDelta
+
+        return True
+
     def _checkDocSize(self, theSize):
         """Check if document size crosses the big document limit set in
         config. If so, we will set the big document flag to True.
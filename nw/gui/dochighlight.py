@@ -260,6 +260,19 @@ class GuiDocHighlighter(QSyntaxHighlighter):
         )
         return
 
+    def rehighlightByTags(self, theTags):
+        """Loop through all meta data blocks and rehighlight those that
+        have one or more of the given tags as values.
+        """
+        theBlock = self.document().begin()
+        while theBlock.isValid():
+            if theBlock.userState() & self.BLOCK_META > 0:
+                isValid, theBits, _ = self.theIndex.scanThis(theBlock.text())
+                if isValid and not theTags.isdisjoint(theBits[1:]):
+                    self.rehighlightBlock(theBlock)
+            theBlock = theBlock.next()
+        return
+
     ##
     #  Highlight Block
     ##
@@ -42,7 +42,7 @@ from PyQt5.QtWidgets import (
 )
 
 from nw.core import ToHtml
-from nw.constants import nwAlert, nwItemType, nwDocAction, nwUnicode
+from nw.constants import nwAlert, nwItemType, nwDocAction, nwUnicode, nwIndexEvent
 
 logger = logging.getLogger(__name__)
 
@@ -1122,6 +1122,11 @@ class GuiDocViewFooter(QWidget):
 
 class GuiDocViewDetails(QScrollArea):
 
+    REFRESH_EVENTS = (
+        nwIndexEvent.INDEX_RESET, nwIndexEvent.REFS_CHANGED, nwIndexEvent.TAG_ADDED,
+        nwIndexEvent.TAG_MOVED, nwIndexEvent.TAG_REMOVED
+    )
+
     def __init__(self, theParent):
         QScrollArea.__init__(self, theParent)
 
@@ -1155,6 +1160,9 @@ class GuiDocViewDetails(QScrollArea):
         self.setWidgetResizable(True)
         self.setMinimumHeight(self.mainConf.pxInt(50))
 
+        # Refresh the references when the index changes
+        self.theParent.theIndex.addListener(self._indexChanged)
+
         logger.debug("GuiDocViewDetails initialisation complete")
 
         return
@@ -1184,6 +1192,18 @@ class GuiDocViewDetails(QScrollArea):
     #  Internal Functions
     ##
 
+    def _indexChanged(self, theEvents):
+        """Called by the index after each change. The back references
+        are refreshed if references or tags changed.
+        """
+        if self.currHandle is None:
+            return
+        for theEvent, _, _ in theEvents:
+            if theEvent in self.REFRESH_EVENTS:
+                self.refreshReferences(self.currHandle)
+                break
+        return
+
     def _linkClicked(self, theLink):
         """Capture the link-click and forward it to the document viewer
         class for handling.
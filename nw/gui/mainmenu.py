@@ -670,6 +670,16 @@ class GuiMainMenu(QMenuBar):
         self.aReplaceNext.triggered.connect(lambda: self._docAction(nwDocAction.REPL_NEXT))
         self.srcMenu.addAction(self.aReplaceNext)
 
+        # Search > Separator
+        self.srcMenu.addSeparator()
+
+        # Search > Search Project
+        self.aSearchProject = QAction("Search Project", self)
+        self.aSearchProject.setStatusTip("Search the text of all documents in the project")
+        self.aSearchProject.setShortcut("Ctrl+Shift+F")
+        self.aSearchProject.triggered.connect(lambda: self.theParent.showProjectSearch())
+        self.srcMenu.addAction(self.aSearchProject)
+
         return
 
     def _buildFormatMenu(self):
@@ -866,6 +876,13 @@ class GuiMainMenu(QMenuBar):
         self.aWritingStats.triggered.connect(lambda: self.theParent.showWritingStatsDialog())
         self.toolsMenu.addAction(self.aWritingStats)
 
+        # Tools > Reference Stats
+        self.aRefStats = QAction("Reference Statistics", self)
+        self.aRefStats.setStatusTip("Show which tags are referenced together in the novel")
+        self.aRefStats.setShortcut("Shift+F6")
+        self.aRefStats.triggered.connect(lambda: self.theParent.showRefStatsDialog())
+        self.toolsMenu.addAction(self.aRefStats)
+
         # Tools > Settings
         self.aPreferences = QAction("Preferences", self)
         self.aPreferences.setStatusTip("Preferences")
@@ -30,9 +30,9 @@ import logging
 
 from time import time
 
-from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtCore import Qt, QSize, pyqtSlot
 from PyQt5.QtWidgets import (
-    QTreeWidget, QTreeWidgetItem, QMenu, QAction, QAbstractItemView
+    QTreeWidget, QTreeWidgetItem, QMenu, QAction, QAbstractItemView, QLineEdit
 )
 
 from nw.constants import nwKeyWords, nwLabels, nwOutline
@@ -94,6 +94,8 @@ class GuiOutline(QTreeWidget):
 
         self.firstView = True
         self.lastBuild = 0
+        self.novelVersion = 0
+        self.theFilter = ""
 
         self.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.setSelectionMode(QAbstractItemView.SingleSelection)
@@ -150,6 +152,7 @@ class GuiOutline(QTreeWidget):
         self.setColumnCount(1)
         self.setHeaderLabel(nwLabels.OUTLINE_COLS[nwOutline.TITLE])
 
+        self.treeMap   = {}
         self.treeOrder = []
         self.colWidth  = {}
         self.colHidden = {}
@@ -177,14 +180,22 @@ class GuiOutline(QTreeWidget):
             self.firstView = False
             return
 
-        # If the novel index has changed since the tree was last built,
-        # we rebuild the tree from the updated index.
-        lastChange = self.theParent.theIndex.timeNovel
-        logger.verbose("Last outline build: %.3f" % self.lastBuild)
-        logger.verbose("Novel index change: %.3f" % lastChange)
+        # If the novel structure has changed since the tree was last
+        # built, we update the items of the documents that changed, or
+        # rebuild the tree if the changes cannot be applied in place.
+        if overRide:
+            logger.debug("Rebuilding Project Outline")
+            self._populateTree()
+            return
+
+        if not self.theProject.autoOutline:
+            return
+
+        novelVersion, theHandles = self.theIndex.getNovelChanges(self.novelVersion)
+        logger.verbose("Outline version: %d" % self.novelVersion)
+        logger.verbose("Novel version: %d" % novelVersion)
 
-        doBuild = lastChange > self.lastBuild and self.theProject.autoOutline
-        if doBuild or overRide:
+        if theHandles is None or not self._updateTree(theHandles):
             logger.debug("Rebuilding Project Outline")
             self._populateTree()
 
@@ -196,8 +207,18 @@ class GuiOutline(QTreeWidget):
         self._saveHeaderState()
         self.clearOutline()
         self.firstView = True
+        self.theFilter = ""
         return
 
+    def setFilter(self, theFilter):
+        """Only show the headers whose references match a filter, and
+        the headers they are under. An empty filter shows all headers.
+        Returns the number of matching headers, or None if the filter
+        is not valid.
+        """
+        self.theFilter = theFilter.strip()
+        return self._applyFilter()
+
     ##
     #  Slots
     ##
@@ -352,6 +373,8 @@ class GuiOutline(QTreeWidget):
         is fast and doesn't require a rebuild of the tree.
         """
         self.clear()
+        self.treeMap = {}
+        self.novelVersion = self.theIndex.getNovelVersion()
 
         if self.firstView:
             theLabels = []
@@ -387,11 +410,13 @@ class GuiOutline(QTreeWidget):
 
             if tHandle not in self.theIndex.novelIndex:
                 continue
-            if sTitle not in self.theIndex.novelIndex[tHandle]:
+
+            novIdx = self.theIndex.novelIndex[tHandle].get(sTitle)
+            if novIdx is None:
                 continue
 
-            tLevel = self.theIndex.novelIndex[tHandle][sTitle]["level"]
-            tItem  = self._createTreeItem(tHandle, sTitle, tLevel)
+            tLevel = novIdx.level
+            tItem  = self._createTreeItem(tHandle, sTitle, novIdx)
             self.treeMap[titleKey] = tItem
 
             if tLevel == "H1":
@@ -432,32 +457,93 @@ class GuiOutline(QTreeWidget):
 
             tItem.setExpanded(True)
 
+        self._applyFilter()
         self.lastBuild = time()
 
         return
 
-    def _createTreeItem(self, tHandle, sTitle, tLevel):
-        """Populate a tree item with all the column values.
+    def _updateTree(self, theHandles):
+        """Update the tree items of the headers of a set of documents in
+        place. Returns False if headers have been added, removed, or
+        have changed level, in which case the tree must be rebuilt.
         """
-        nwItem = self.theProject.projTree[tHandle]
-        novIdx = self.theIndex.novelIndex[tHandle][sTitle]
+        theStructure = self.theIndex.getNovelStructure(skipExcluded=True)
+        newKeys = [titleKey for titleKey in theStructure if titleKey[:13] in theHandles]
+        oldKeys = [titleKey for titleKey in self.treeMap if titleKey[:13] in theHandles]
+        if newKeys != oldKeys:
+            return False
 
+        for titleKey in newKeys:
+            tHandle = titleKey[:13]
+            sTitle  = titleKey[14:]
+            novIdx  = self.theIndex.novelIndex[tHandle].get(sTitle)
+            tItem   = self.treeMap[titleKey]
+            if novIdx is None or novIdx.level != tItem.text(self.colIndex[nwOutline.LEVEL]):
+                return False
+            self._setTreeItemValues(tItem, tHandle, sTitle, novIdx)
+
+        logger.debug("Updated %d item(s) in the Project Outline" % len(newKeys))
+        self._applyFilter()
+        self.novelVersion = self.theIndex.getNovelVersion()
+        self.lastBuild = time()
+
+        return True
+
+    def _applyFilter(self):
+        """Hide the tree items that don't match the current filter.
+        The parents of matching items are kept visible, so that their
+        children can be shown.
+        """
+        if not self.theFilter:
+            for tItem in self.treeMap.values():
+                tItem.setHidden(False)
+            return len(self.treeMap)
+
+        theKeys = self.theIndex.queryNovel(self.theFilter, skipExcluded=True)
+        if theKeys is None:
+            return None
+
+        for tItem in self.treeMap.values():
+            tItem.setHidden(True)
+
+        nMatch = 0
+        for titleKey in theKeys:
+            tItem = self.treeMap.get(titleKey, None)
+            if tItem is None:
+                continue
+            nMatch += 1
+            while tItem is not None and tItem.isHidden():
+                tItem.setHidden(False)
+                tItem = tItem.parent()
+
+        return nMatch
+
+    def _createTreeItem(self, tHandle, sTitle, novIdx):
+        """Create a tree item with all the column values.
+        """
         newItem = QTreeWidgetItem()
-        hIcon   = "doc_%s" % tLevel.lower()
+        self._setTreeItemValues(newItem, tHandle, sTitle, novIdx)
+        return newItem
 
-        cC = int(novIdx["cCount"])
-        wC = int(novIdx["wCount"])
-        pC = int(novIdx["pCount"])
+    def _setTreeItemValues(self, newItem, tHandle, sTitle, novIdx):
+        """Populate a tree item with all the column values.
+        """
+        nwItem = self.theProject.projTree[tHandle]
+        hIcon  = "doc_%s" % novIdx.level.lower()
+
+        cC = int(novIdx.cCount)
+        wC = int(novIdx.wCount)
+        pC = int(novIdx.pCount)
 
-        newItem.setText(self.colIndex[nwOutline.TITLE],  novIdx["title"])
+        newItem.setText(self.colIndex[nwOutline.TITLE],  novIdx.title)
         newItem.setData(self.colIndex[nwOutline.TITLE],  Qt.UserRole, tHandle)
         newItem.setIcon(self.colIndex[nwOutline.TITLE],  self.theTheme.getIcon(hIcon))
-        newItem.setText(self.colIndex[nwOutline.LEVEL],  novIdx["level"])
+        newItem.setText(self.colIndex[nwOutline.LEVEL],  novIdx.level)
         newItem.setText(self.colIndex[nwOutline.LABEL],  nwItem.itemName)
         newItem.setIcon(self.colIndex[nwOutline.LABEL],  self.theTheme.getIcon("proj_document"))
         newItem.setText(self.colIndex[nwOutline.LINE],   sTitle[1:].lstrip("0"))
         newItem.setData(self.colIndex[nwOutline.LINE],   Qt.UserRole, sTitle)
-        newItem.setText(self.colIndex[nwOutline.SYNOP],  novIdx["synopsis"])
+        newItem.setText(self.colIndex[nwOutline.SYNOP],  novIdx.synopsis)
         newItem.setText(self.colIndex[nwOutline.CCOUNT], f"{cC:n}")
         newItem.setText(self.colIndex[nwOutline.WCOUNT], f"{wC:n}")
         newItem.setText(self.colIndex[nwOutline.PCOUNT], f"{pC:n}")
@@ -475,10 +561,58 @@ class GuiOutline(QTreeWidget):
         newItem.setText(self.colIndex[nwOutline.ENTITY], ", ".join(theRefs[nwKeyWords.ENTITY_KEY]))
         newItem.setText(self.colIndex[nwOutline.CUSTOM], ", ".join(theRefs[nwKeyWords.CUSTOM_KEY]))
 
-        return newItem
+        return
 
 # END Class GuiOutline
 
+class GuiOutlineFilter(QLineEdit):
+
+    def __init__(self, theParent):
+        QLineEdit.__init__(self, theParent)
+
+        logger.debug("Initialising GuiOutlineFilter ...")
+        self.theParent = theParent
+
+        self.setPlaceholderText("Filter by references, e.g. @pov:Jane -@plot:Main")
+        self.setToolTip(
+            "Only show the headers with all of the given references. A reference is a "
+            "tag, or a keyword and a comma separated list of tags, like @char:Jane,John. "
+            "Start a reference with - to hide the headers that have it. Tags with spaces "
+            "must be quoted."
+        )
+        self.setClearButtonEnabled(True)
+        self.returnPressed.connect(self._doFilter)
+        self.textChanged.connect(self._textChanged)
+
+        logger.debug("GuiOutlineFilter initialisation complete")
+
+        return
+
+    ##
+    #  Slots
+    ##
+
+    @pyqtSlot()
+    def _doFilter(self):
+        """Apply the filter to the outline.
+        """
+        nMatch = self.theParent.projView.setFilter(self.text())
+        if nMatch is None:
+            self.theParent.setStatus("The outline filter is not valid")
+        elif self.text().strip():
+            self.theParent.setStatus("Found %d matching headers" % nMatch)
+        return
+
+    @pyqtSlot(str)
+    def _textChanged(self, theText):
+        """Show all headers again when the filter is cleared.
+        """
+        if not theText.strip() and self.theParent.projView.theFilter:
+            self.theParent.projView.setFilter("")
+        return
+
+# END Class GuiOutlineFilter
+
 class GuiOutlineHeaderMenu(QMenu):
 
     def __init__(self, theParent):
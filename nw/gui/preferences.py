@@ -344,6 +344,24 @@ class GuiConfigEditProjectsTab(QWidget):
             theUnit="seconds"
         )
 
+        # Project Index Settings
+        # ======================
+        self.mainForm.addGroupLabel("Project Index")
+
+        ## Index Storage Format
+        self.indexFormat = QComboBox(self)
+        self.indexFormat.addItem("JSON file", nwConst.IDX_JSON)
+        self.indexFormat.addItem("SQLite database", nwConst.IDX_SQLITE)
+        self.indexFormat.addItem("Binary file", nwConst.IDX_BINARY)
+        fmtIdx = self.indexFormat.findData(self.mainConf.indexFormat)
+        if fmtIdx != -1:
+            self.indexFormat.setCurrentIndex(fmtIdx)
+        self.mainForm.addRow(
+            "Index storage format",
+            self.indexFormat,
+            "The database and binary formats load faster. Applies when a project is opened."
+        )
+
         # Backup Settings
         # ===============
         self.mainForm.addGroupLabel("Project Backup")
@@ -389,12 +407,14 @@ class GuiConfigEditProjectsTab(QWidget):
 
         autoSaveDoc     = self.autoSaveDoc.value()
         autoSaveProj    = self.autoSaveProj.value()
+        indexFormat     = self.indexFormat.currentData()
         backupPath      = self.backupPath
         backupOnClose   = self.backupOnClose.isChecked()
         askBeforeBackup = self.askBeforeBackup.isChecked()
 
         self.mainConf.autoSaveDoc     = autoSaveDoc
         self.mainConf.autoSaveProj    = autoSaveProj
+        self.mainConf.indexFormat     = indexFormat
         self.mainConf.backupPath      = backupPath
         self.mainConf.backupOnClose   = backupOnClose
         self.mainConf.askBeforeBackup = askBeforeBackup
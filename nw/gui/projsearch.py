@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""novelWriter GUI Project Search
+
+ novelWriter – GUI Project Search
+==================================
+ Class holding the project search panel
+
+ File History:
+ Created: 2021-02-06 [1.1rc1]
+
+ This file is a part of novelWriter
+ Copyright 2018–2021, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import nw
+import logging
+
+from time import time
+
+from PyQt5.QtCore import Qt, pyqtSlot
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QLineEdit, QTreeWidget, QTreeWidgetItem
+)
+
+from nw.core import NWDoc
+from nw.constants import nwUnicode
+
+logger = logging.getLogger(__name__)
+
+class GuiProjectSearch(QWidget):
+
+    MAX_HITS = 1000
+
+    def __init__(self, theParent):
+        QWidget.__init__(self, theParent)
+
+        logger.debug("Initialising GuiProjectSearch ...")
+        self.mainConf   = nw.CONFIG
+        self.theParent  = theParent
+        self.theProject = theParent.theProject
+        self.theIndex   = theParent.theIndex
+
+        # Search Box
+        self.searchBox = QLineEdit()
+        self.searchBox.setPlaceholderText("Search project")
+        self.searchBox.setToolTip(
+            "Use double quotes to search for a phrase, and end a word with * "
+            "to search for all words starting with it."
+        )
+        self.searchBox.setClearButtonEnabled(True)
+        self.searchBox.returnPressed.connect(self._doSearch)
+
+        # Search Results
+        self.resultTree = QTreeWidget()
+        self.resultTree.setHeaderHidden(True)
+        self.resultTree.setColumnCount(1)
+        self.resultTree.setIndentation(self.mainConf.pxInt(12))
+        self.resultTree.itemActivated.connect(self._openResult)
+
+        # Assemble
+        self.outerBox = QVBoxLayout()
+        self.outerBox.setContentsMargins(0, 0, 0, 0)
+        self.outerBox.addWidget(self.searchBox)
+        self.outerBox.addWidget(self.resultTree)
+        self.setLayout(self.outerBox)
+
+        logger.debug("GuiProjectSearch initialisation complete")
+
+        return
+
+    ##
+    #  Methods
+    ##
+
+    def clearSearch(self):
+        """Clear the search box and the results.
+        """
+        self.searchBox.clear()
+        self.resultTree.clear()
+        return
+
+    def beginSearch(self, theText=""):
+        """Show the panel and move the focus to the search box. If some
+        text is provided, it replaces the current search.
+        """
+        if theText:
+            self.searchBox.setText(theText)
+        self.setVisible(True)
+        self.searchBox.setFocus()
+        self.searchBox.selectAll()
+        return
+
+    def searchProject(self, theQuery):
+        """Search the project and list the results, grouped by document.
+        Returns the number of hits.
+        """
+        self.resultTree.clear()
+        if not self.theParent.hasProject:
+            return 0
+
+        bfTime = time()
+        theHits = self.theIndex.searchProject(theQuery)
+        afTime = time()
+        logger.debug("Project searched in %.3f ms" % (1000*(afTime-bfTime)))
+
+        theDoc = NWDoc(self.theProject, self.theParent)
+        docItem = None
+        docLines = []
+        for tHandle, nLine, nCol, nLen in theHits[:self.MAX_HITS]:
+            if docItem is None or docItem.data(0, Qt.UserRole)[0] != tHandle:
+                nwItem = self.theProject.projTree[tHandle]
+                theText = theDoc.openDocument(tHandle, showStatus=False)
+                docLines = theText.splitlines() if theText else []
+                docItem = QTreeWidgetItem([nwItem.itemName if nwItem else tHandle])
+                docItem.setData(0, Qt.UserRole, (tHandle, 0, 0, 0))
+                self.resultTree.addTopLevelItem(docItem)
+                docItem.setExpanded(True)
+
+            theLine = docLines[nLine-1] if nLine <= len(docLines) else ""
+            hitItem = QTreeWidgetItem(["%d: %s" % (nLine, self._makeSnippet(theLine, nCol, nLen))])
+            hitItem.setData(0, Qt.UserRole, (tHandle, nLine, nCol, nLen))
+            hitItem.setToolTip(0, theLine)
+            docItem.addChild(hitItem)
+
+        if len(theHits) > self.MAX_HITS:
+            self.theParent.setStatus("Found %d results, showing the first %d" % (
+                len(theHits), self.MAX_HITS
+            ))
+        else:
+            self.theParent.setStatus("Found %d results" % len(theHits))
+
+        return len(theHits)
+
+    ##
+    #  Slots
+    ##
+
+    @pyqtSlot()
+    def _doSearch(self):
+        """Run the search in the search box.
+        """
+        self.searchProject(self.searchBox.text())
+        return
+
+    @pyqtSlot("QTreeWidgetItem*", int)
+    def _openResult(self, theItem, theColumn):
+        """Open the document of a result, and select the text of the hit.
+        """
+        tHandle, nLine, nCol, nLen = theItem.data(0, Qt.UserRole)
+        if nLine == 0:
+            self.theParent.openDocument(tHandle, doScroll=True)
+        elif self.theParent.openDocument(tHandle, tLine=nLine-1, doScroll=True):
+            self.theParent.docEditor.setCursorSelection(nLine, nCol, nLen)
+        return
+
+    ##
+    #  Internal Functions
+    ##
+
+    @staticmethod
+    def _makeSnippet(theLine, nCol, nLen, nContext=30):
+        """Cut out the text around a hit on a line.
+        """
+        sPos = max(0, nCol - nContext)
+        ePos = nCol + nLen + nContext
+        theSnippet = theLine[sPos:ePos].strip()
+        if sPos > 0:
+            theSnippet = nwUnicode.U_HELLIP + theSnippet
+        if ePos < len(theLine):
+            theSnippet = theSnippet + nwUnicode.U_HELLIP
+        return theSnippet
+
+# END Class GuiProjectSearch
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""novelWriter GUI Reference Statistics
+
+ novelWriter – GUI Reference Statistics
+========================================
+ Class holding the dialog showing which tags appear together in the novel
+
+ File History:
+ Created: 2021-02-08 [1.1rc1]
+
+ This file is a part of novelWriter
+ Copyright 2018–2021, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import nw
+import logging
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QCursor
+from PyQt5.QtWidgets import (
+    qApp, QDialog, QTreeWidget, QTreeWidgetItem, QDialogButtonBox, QVBoxLayout,
+    QHBoxLayout, QLabel, QComboBox, QTabWidget
+)
+
+from nw.constants import nwItemClass, nwKeyWords, nwLabels
+
+logger = logging.getLogger(__name__)
+
+class GuiRefStats(QDialog):
+
+    MAX_PAIRS = 500
+
+    def __init__(self, theParent, theProject):
+        QDialog.__init__(self, theParent)
+
+        logger.debug("Initialising GuiRefStats ...")
+        self.setObjectName("GuiRefStats")
+
+        self.mainConf   = nw.CONFIG
+        self.theParent  = theParent
+        self.theProject = theProject
+        self.theIndex   = theParent.theIndex
+        self.theTheme   = theParent.theTheme
+        self.optState   = theProject.optState
+
+        self.setWindowTitle("Reference Statistics")
+        self.setMinimumWidth(self.mainConf.pxInt(420))
+        self.setMinimumHeight(self.mainConf.pxInt(400))
+        self.resize(
+            self.mainConf.pxInt(self.optState.getInt("GuiRefStats", "winWidth",  600)),
+            self.mainConf.pxInt(self.optState.getInt("GuiRefStats", "winHeight", 500))
+        )
+
+        # Class Selection
+        self.itemClass = QComboBox(self)
+        for itemClass in nwKeyWords.KEY_CLASS.values():
+            if self.itemClass.findData(itemClass) == -1:
+                self.itemClass.addItem(nwLabels.CLASS_NAME[itemClass], itemClass)
+        lastClass = self.optState.getString("GuiRefStats", "itemClass", "CHARACTER")
+        clIndex = self.itemClass.findData(
+            nwItemClass.__members__.get(lastClass, nwItemClass.CHARACTER)
+        )
+        if clIndex != -1:
+            self.itemClass.setCurrentIndex(clIndex)
+        self.itemClass.currentIndexChanged.connect(self._updateLists)
+
+        self.infoLabel = QLabel("")
+
+        self.optsBox = QHBoxLayout()
+        self.optsBox.addWidget(QLabel("Tags of class"), 0)
+        self.optsBox.addWidget(self.itemClass, 0)
+        self.optsBox.addStretch(1)
+        self.optsBox.addWidget(self.infoLabel, 0)
+
+        # Pairs List
+        self.pairList = QTreeWidget()
+        self.pairList.setHeaderLabels(["Tag", "Tag", "Sections"])
+        self.pairList.setIndentation(0)
+        self.pairList.headerItem().setTextAlignment(2, Qt.AlignRight)
+
+        # Timeline List
+        self.timeList = QTreeWidget()
+        self.timeList.setIndentation(0)
+
+        self.listTabs = QTabWidget()
+        self.listTabs.addTab(self.pairList, "Appear Together")
+        self.listTabs.addTab(self.timeList, "Chapter Timeline")
+
+        # Buttons
+        self.buttonBox = QDialogButtonBox(QDialogButtonBox.Close)
+        self.buttonBox.rejected.connect(self._doClose)
+
+        # Assemble
+        self.outerBox = QVBoxLayout()
+        self.outerBox.addLayout(self.optsBox)
+        self.outerBox.addWidget(self.listTabs)
+        self.outerBox.addWidget(self.buttonBox)
+        self.setLayout(self.outerBox)
+
+        logger.debug("GuiRefStats initialisation complete")
+
+        return
+
+    def populateGUI(self):
+        """Populate the lists from the index.
+        """
+        qApp.setOverrideCursor(QCursor(Qt.WaitCursor))
+        self._updateLists()
+        qApp.restoreOverrideCursor()
+        return
+
+    ##
+    #  Slots
+    ##
+
+    def _doClose(self):
+        """Save the state of the window and close.
+        """
+        winWidth  = self.mainConf.rpxInt(self.width())
+        winHeight = self.mainConf.rpxInt(self.height())
+        itemClass = self.itemClass.currentData()
+
+        self.optState.setValue("GuiRefStats", "winWidth",  winWidth)
+        self.optState.setValue("GuiRefStats", "winHeight", winHeight)
+        self.optState.setValue("GuiRefStats", "itemClass", itemClass.name)
+
+        self.optState.saveSettings()
+        self.close()
+
+        return
+
+    def _updateLists(self, dummyVar=None):
+        """Rebuild the lists for the selected class. The dummyVar
+        variable captures the variable sent from the combo box and
+        discards it.
+        """
+        self.pairList.clear()
+        self.timeList.clear()
+
+        theStats = self.theIndex.getRefStats(itemClass=self.itemClass.currentData())
+        self.infoLabel.setText("%d sections, %d tags, %d pairs" % (
+            len(theStats.theKeys), len(theStats.theTags), len(theStats.pairCount)
+        ))
+
+        for tagA, tagB, nCount in theStats.getPairs(maxCount=self.MAX_PAIRS):
+            newItem = QTreeWidgetItem([tagA, tagB, f"{nCount:n}"])
+            newItem.setTextAlignment(2, Qt.AlignRight)
+            newItem.setFont(2, self.theTheme.guiFontFixed)
+            self.pairList.addTopLevelItem(newItem)
+
+        # The chapters are numbered, with their titles as tool tips
+        theHeaders = ["Tag", "Total"]
+        theHeaders += [str(nChap) for nChap in range(1, len(theStats.theChapters) + 1)]
+        self.timeList.setColumnCount(len(theHeaders))
+        self.timeList.setHeaderLabels(theHeaders)
+        for nChap, nSec in enumerate(theStats.theChapters, 2):
+            tHandle = theStats.theKeys[nSec][:13]
+            sTitle  = theStats.theKeys[nSec][14:]
+            self.timeList.headerItem().setToolTip(
+                nChap, self.theIndex.novelIndex[tHandle][sTitle]["title"]
+            )
+
+        for nTag, theTag in enumerate(theStats.theTags):
+            newItem = QTreeWidgetItem([theTag, f"{theStats.tagCount[nTag]:n}"])
+            for nChap, nCount in theStats.chapCount[nTag].items():
+                newItem.setText(nChap + 2, f"{nCount:n}")
+            self.timeList.addTopLevelItem(newItem)
+
+        return
+
+# END Class GuiRefStats
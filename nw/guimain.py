@@ -31,9 +31,12 @@ import os
 
 from datetime import datetime
 from time import time
+from threading import Event
 
-from PyQt5.QtCore import Qt, QTimer, QThreadPool
-from PyQt5.QtGui import QIcon, QPixmap, QColor, QKeySequence, QCursor
+from PyQt5.QtCore import (
+    Qt, QTimer, QThreadPool, QObject, QRunnable, pyqtSlot, pyqtSignal
+)
+from PyQt5.QtGui import QIcon, QPixmap, QColor, QKeySequence
 from PyQt5.QtWidgets import (
     qApp, QMainWindow, QVBoxLayout, QWidget, QSplitter, QFileDialog, QShortcut,
     QMessageBox, QDialog, QTabWidget
@@ -42,11 +45,11 @@ from PyQt5.QtWidgets import (
 from nw.gui import (
     GuiAbout, GuiBuildNovel, GuiDocEditor, GuiDocMerge, GuiDocSplit,
     GuiDocViewDetails, GuiDocViewer, GuiItemDetails, GuiItemEditor,
-    GuiMainMenu, GuiMainStatus, GuiOutline, GuiOutlineDetails, GuiPreferences,
-    GuiProjectLoad, GuiProjectSettings, GuiProjectTree, GuiProjectWizard,
-    GuiTheme, GuiWritingStats
+    GuiMainMenu, GuiMainStatus, GuiOutline, GuiOutlineDetails, GuiOutlineFilter,
+    GuiPreferences, GuiProjectLoad, GuiProjectSearch, GuiProjectSettings,
+    GuiProjectTree, GuiProjectWizard, GuiRefStats, GuiTheme, GuiWritingStats
 )
-from nw.core import NWProject, NWDoc, NWIndex
+from nw.core import NWDoc, NWProject, NWIndex
 from nw.constants import nwItemType, nwItemClass, nwAlert, nwLists
 from nw.common import getGuiItem, hexToInt
 
@@ -87,6 +90,8 @@ class GuiMain(QMainWindow):
         self.theIndex    = NWIndex(self.theProject, self)
         self.hasProject  = False
         self.isFocusMode = False
+        self.isIndexing  = False
+        self.idxBuilder  = None
 
         # Prepare Main Window
         self.resize(*self.mainConf.getWinSize())
@@ -97,15 +102,17 @@ class GuiMain(QMainWindow):
         # =============
 
         # Main GUI Elements
-        self.statusBar = GuiMainStatus(self)
-        self.treeView  = GuiProjectTree(self)
-        self.docEditor = GuiDocEditor(self)
-        self.viewMeta  = GuiDocViewDetails(self)
-        self.docViewer = GuiDocViewer(self)
-        self.treeMeta  = GuiItemDetails(self)
-        self.projView  = GuiOutline(self)
-        self.projMeta  = GuiOutlineDetails(self)
-        self.mainMenu  = GuiMainMenu(self)
+        self.statusBar  = GuiMainStatus(self)
+        self.treeView   = GuiProjectTree(self)
+        self.docEditor  = GuiDocEditor(self)
+        self.viewMeta   = GuiDocViewDetails(self)
+        self.docViewer  = GuiDocViewer(self)
+        self.treeMeta   = GuiItemDetails(self)
+        self.projSearch = GuiProjectSearch(self)
+        self.projView   = GuiOutline(self)
+        self.projFilter = GuiOutlineFilter(self)
+        self.projMeta   = GuiOutlineDetails(self)
+        self.mainMenu   = GuiMainMenu(self)
 
         # Minor Gui Elements
         self.statusIcons = []
@@ -116,6 +123,7 @@ class GuiMain(QMainWindow):
         self.treeBox = QVBoxLayout()
         self.treeBox.setContentsMargins(0, 0, 0, 0)
         self.treeBox.addWidget(self.treeView)
+        self.treeBox.addWidget(self.projSearch)
         self.treeBox.addWidget(self.treeMeta)
         self.treePane.setLayout(self.treeBox)
 
@@ -130,9 +138,17 @@ class GuiMain(QMainWindow):
         self.splitDocs.addWidget(self.docEditor)
         self.splitDocs.addWidget(self.splitView)
 
+        # Project Outline
+        self.outlinePane = QWidget()
+        self.outlineBox = QVBoxLayout()
+        self.outlineBox.setContentsMargins(0, 0, 0, 0)
+        self.outlineBox.addWidget(self.projFilter)
+        self.outlineBox.addWidget(self.projView)
+        self.outlinePane.setLayout(self.outlineBox)
+
         # Splitter : Project Outlie / Outline Details
         self.splitOutline = QSplitter(Qt.Vertical)
-        self.splitOutline.addWidget(self.projView)
+        self.splitOutline.addWidget(self.outlinePane)
         self.splitOutline.addWidget(self.projMeta)
         self.splitOutline.setSizes(self.mainConf.getOutlinePanePos())
 
@@ -173,6 +189,7 @@ class GuiMain(QMainWindow):
         # Editor / Viewer Default State
         self.splitView.setVisible(False)
         self.docEditor.closeSearch()
+        self.projSearch.setVisible(False)
 
         # Initialise the Project Tree
         self.treeView.itemSelectionChanged.connect(self._treeSingleClick)
@@ -200,6 +217,7 @@ class GuiMain(QMainWindow):
 
         keyReturn = QShortcut(self.treeView)
         keyReturn.setKey(QKeySequence(Qt.Key_Return))
+        keyReturn.setContext(Qt.WidgetShortcut)
         keyReturn.activated.connect(self._treeKeyPressReturn)
 
         keyEscape = QShortcut(self)
@@ -255,11 +273,13 @@ class GuiMain(QMainWindow):
         # Project Area
         self.treeView.clearTree()
         self.treeMeta.clearDetails()
+        self.projSearch.clearSearch()
 
         # Work Area
         self.docEditor.clearEditor()
         self.docEditor.setDictionaries()
         self.closeDocViewer()
+        self.projFilter.clear()
         self.projMeta.clearDetails()
 
         # General
@@ -314,7 +334,10 @@ class GuiMain(QMainWindow):
             self.saveProject()
             self.hasProject = True
             self.docEditor.setDictionaries()
+            # A new project only has a few documents, so the index is
+            # ready when the project is
             self.rebuildIndex(beQuiet=True)
+            self.waitForIndex()
             self.statusBar.setRefTime(self.theProject.projOpened)
             self.statusBar.setProjectStatus(True)
             self.statusBar.setDocumentStatus(None)
@@ -346,6 +369,10 @@ class GuiMain(QMainWindow):
         if self.docEditor.docChanged:
             self.saveDocument()
 
+        # A running rebuild is completed first, so the project is saved
+        # with the word counts of the rebuilt index
+        self.waitForIndex()
+
         if self.theProject.projAltered:
             saveOK   = self.saveProject()
             doBackup = False
@@ -363,6 +390,7 @@ class GuiMain(QMainWindow):
             saveOK = True
 
         if saveOK:
+            self.cancelIndexing()
             self.closeDocument()
             self.docViewer.clearNavHistory()
             self.projView.closeOutline()
@@ -433,8 +461,21 @@ class GuiMain(QMainWindow):
         # Project is loaded
         self.hasProject = True
 
-        # Load the tag index
+        # Load the tag index, and rescan documents that have changed
+        # since the index was last saved. If the index has no file
+        # stamps to compare with, every document would be rescanned, so
+        # the index is instead rebuilt in the background further down.
         self.theIndex.loadIndex()
+        hasStamps = bool(self.theIndex.fileStamps)
+        reIndexed = []
+        if hasStamps and not self.theIndex.indexBroken:
+            reIndexed = self.theIndex.reIndexChanged()
+            for tHandle in reIndexed:
+                tItem = self.theProject.projTree[tHandle]
+                cC, wC, pC = self.theIndex.getCounts(tHandle)
+                tItem.setCharCount(cC)
+                tItem.setWordCount(wC)
+                tItem.setParaCount(pC)
 
         # Update GUI
         self._updateWindowTitle(self.theProject.projName)
@@ -445,6 +486,12 @@ class GuiMain(QMainWindow):
         self.statusBar.setRefTime(self.theProject.projOpened)
         self.statusBar.setStats(self.theProject.currWCount, 0)
 
+        # Update the word counts of the rescanned documents in the tree
+        if reIndexed:
+            for tHandle in reIndexed:
+                self.treeView.propagateCount(tHandle, self.theIndex.getCounts(tHandle)[1])
+            self.treeView.projectWordCount()
+
         # Restore previously open documents, if any
         if self.theProject.lastEdited is not None:
             self.openDocument(self.theProject.lastEdited, doScroll=True)
@@ -455,6 +502,8 @@ class GuiMain(QMainWindow):
         # Check if we need to rebuild the index
         if self.theIndex.indexBroken:
             self.rebuildIndex()
+        elif not hasStamps:
+            self.rebuildIndex(beQuiet=True)
 
         # Make sure the changed status is set to false on all that was
         # just opened
@@ -706,6 +755,68 @@ class GuiMain(QMainWindow):
             self.docEditor.docAction(theAction)
         return True
 
+    def renameTag(self, oldTag, newTag):
+        """Rename a tag where it is defined, and where it is referenced.
+        Only the lines the index has recorded for the tag are rewritten,
+        and the index is updated once for all the changed documents. The
+        document open in the editor is changed in the editor, so that
+        the change can be undone, and is then saved with the others.
+        """
+        if not self.hasProject:
+            logger.error("No project open")
+            return False
+
+        newTag = newTag.strip()
+        if newTag == oldTag:
+            return False
+
+        if not newTag or "," in newTag:
+            self.makeAlert("The tag name '%s' is not valid." % newTag, nwAlert.ERROR)
+            return False
+
+        # The lines of the tag must be looked up in the complete index
+        self.waitForIndex()
+
+        if newTag in self.theIndex.tagIndex:
+            self.makeAlert("The tag '%s' already exists." % newTag, nwAlert.ERROR)
+            return False
+
+        theLines = self.theIndex.getTagLines(oldTag)
+        if not theLines:
+            logger.error("Unknown tag '%s'" % oldTag)
+            return False
+
+        bfTime = time()
+        theDoc = NWDoc(self.theProject, self)
+        theTexts = {}
+        for tHandle, nLines in theLines.items():
+            if tHandle == self.docEditor.theHandle:
+                if self.docEditor.replaceTag(nLines, oldTag, newTag):
+                    self.docEditor.saveText(updateIndex=False)
+                    theTexts[tHandle] = self.docEditor.getText()
+                continue
+
+            theText = theDoc.openDocument(tHandle, showStatus=False)
+            if theText is None:
+                logger.error("Could not read document %s" % tHandle)
+                continue
+
+            newText = self.theIndex.replaceTagLines(theText, nLines, oldTag, newTag)
+            if newText != theText and theDoc.saveDocument(newText):
+                theTexts[tHandle] = newText
+
+        self.theIndex.scanTexts(theTexts)
+        if self.docViewer.theHandle in theTexts:
+            self.docViewer.reloadText()
+
+        afTime = time()
+        logger.debug("Tag renamed in %.3f ms" % (1000*(afTime - bfTime)))
+        self.setStatus("Renamed tag '%s' to '%s' in %d document(s)" % (
+            oldTag, newTag, len(theTexts)
+        ))
+
+        return True
+
     ##
     #  Tree Item Actions
     ##
@@ -772,49 +883,60 @@ class GuiMain(QMainWindow):
         return
 
     def rebuildIndex(self, beQuiet=False):
-        """Rebuild the entire index.
+        """Rebuild the entire index. The documents are scanned in the
+        background, and the result is merged into the index when the
+        scan is complete. Until then, the old index remains in use.
         """
         if not self.hasProject:
             logger.error("No project open")
             return False
 
-        logger.debug("Rebuilding index ...")
-        qApp.setOverrideCursor(QCursor(Qt.WaitCursor))
-        tStart = time()
+        if self.isIndexing:
+            # The running rebuild may have been started before the
+            # project changed, so it is restarted
+            logger.debug("Restarting the index rebuild")
+            beQuiet = beQuiet and self.idxBuilder.beQuiet
+            self._stopIndexing()
 
+        logger.debug("Rebuilding index ...")
         self.treeView.saveTreeOrder()
-        self.theIndex.clearIndex()
 
-        theDoc = NWDoc(self.theProject, self)
-        for nDone, tItem in enumerate(self.theProject.projTree):
+        self.isIndexing = True
+        self.idxBuilder = BackgroundIndexBuilder(self.theIndex.makeScanJobs(), beQuiet)
+        self.idxBuilder.setAutoDelete(False)
+        self.idxBuilder.signals.indexProgress.connect(self._indexProgress)
+        self.idxBuilder.signals.indexFinished.connect(self._indexFinished)
+        self.setStatus("Indexing project ...")
+        self.threadPool.start(self.idxBuilder)
 
-            if tItem is not None:
-                self.setStatus("Indexing: '%s'" % tItem.itemName)
-            else:
-                self.setStatus("Indexing: Unknown item")
+        return True
 
-            if tItem is not None and tItem.itemType == nwItemType.FILE:
-                logger.verbose("Scanning: %s" % tItem.itemName)
-                theText = theDoc.openDocument(tItem.itemHandle, showStatus=False)
+    def cancelIndexing(self):
+        """Cancel a running index rebuild, and wait for it to stop. The
+        index is left as it was before the rebuild started.
+        """
+        if not self.isIndexing:
+            return False
 
-                # Build tag index
-                self.theIndex.scanText(tItem.itemHandle, theText)
+        logger.debug("Cancelling index rebuild")
+        self._stopIndexing()
+        self.setStatus("Indexing cancelled")
 
-                # Get Word Counts
-                cC, wC, pC = self.theIndex.getCounts(tItem.itemHandle)
-                tItem.setCharCount(cC)
-                tItem.setWordCount(wC)
-                tItem.setParaCount(pC)
-                self.treeView.propagateCount(tItem.itemHandle, wC)
-                self.treeView.projectWordCount()
+        return True
 
-        tEnd = time()
-        self.setStatus("Indexing completed in %.1f ms" % ((tEnd - tStart)*1000.0))
-        self.docEditor.updateTagHighLighting()
-        qApp.restoreOverrideCursor()
+    def waitForIndex(self):
+        """Wait for a running index rebuild to complete, and merge its
+        results into the index. Returns False if no rebuild was running.
+        """
+        if not self.isIndexing:
+            return False
 
-        if not beQuiet:
-            self.makeAlert("The project index has been successfully rebuilt.", nwAlert.INFO)
+        theBuilder = self.idxBuilder
+        theBuilder.waitForDone()
+        if theBuilder.isFinished:
+            self._mergeIndex(theBuilder)
+        else:
+            self._stopIndexing()
 
         return True
 
@@ -947,6 +1069,24 @@ class GuiMain(QMainWindow):
 
         return
 
+    def showRefStatsDialog(self):
+        """Open the reference statistics dialog.
+        """
+        if not self.hasProject:
+            logger.error("No project open")
+            return
+
+        dlgStats = getGuiItem("GuiRefStats")
+        if dlgStats is None:
+            dlgStats = GuiRefStats(self, self.theProject)
+
+        dlgStats.setModal(False)
+        dlgStats.show()
+        qApp.processEvents()
+        dlgStats.populateGUI()
+
+        return
+
     def showAboutNWDialog(self, showNotes=False):
         """Show the about dialog for novelWriter.
         """
@@ -1093,6 +1233,16 @@ class GuiMain(QMainWindow):
         self.splitDocs.setSizes(vPos)
         return not self.splitView.isVisible()
 
+    def showProjectSearch(self):
+        """Show the project search panel, and search for the text
+        selected in the editor, if any.
+        """
+        if not self.hasProject:
+            logger.error("No project open")
+            return False
+        self.projSearch.beginSearch(self.docEditor.textCursor().selectedText())
+        return True
+
     def toggleFocusMode(self):
         """Main GUI Focus Mode hides tree, view pane and optionally also
         statusbar and menu.
@@ -1149,6 +1299,55 @@ class GuiMain(QMainWindow):
     #  Internal Functions
     ##
 
+    def _stopIndexing(self):
+        """Stop the running index builder. Only the builder itself is
+        waited for, not any other task on the thread pool. A builder
+        that hasn't started yet is just removed from the pool's queue.
+        """
+        theBuilder = self.idxBuilder
+        theBuilder.cancel()
+        if not self.threadPool.tryTake(theBuilder):
+            theBuilder.waitForDone()
+
+        self.isIndexing = False
+        self.idxBuilder = None
+
+        return
+
+    def _mergeIndex(self, theBuilder):
+        """Merge the results of a finished index builder into the
+        index, and update the item counts in one batch.
+        """
+        self.isIndexing = False
+        self.idxBuilder = None
+
+        tStart = time()
+        self.theIndex.mergeScanResults(theBuilder.theResults)
+
+        # Documents saved while the scan was running are rescanned
+        self.theIndex.reIndexChanged()
+
+        # Update the counts on all the project items in one batch
+        for tItem in self.theProject.projTree:
+            if tItem is not None and tItem.itemType == nwItemType.FILE:
+                cC, wC, pC = self.theIndex.getCounts(tItem.itemHandle)
+                tItem.setCharCount(cC)
+                tItem.setWordCount(wC)
+                tItem.setParaCount(pC)
+                self.treeView.propagateCount(tItem.itemHandle, wC)
+
+        self.treeView.projectWordCount()
+
+        tEnd = time()
+        self.setStatus("Indexing completed in %.1f ms" % (
+            (tEnd - tStart + theBuilder.runTime)*1000.0
+        ))
+
+        if not theBuilder.beQuiet:
+            self.makeAlert("The project index has been successfully rebuilt.", nwAlert.INFO)
+
+        return
+
     def _connectMenuActions(self):
         """Connect to the main window all menu actions that need to be
         available also when the main menu is hidden.
@@ -1240,11 +1439,13 @@ class GuiMain(QMainWindow):
 
     def _autoSaveDocument(self):
         """Triggered by the auto-save document timer to save the
-        document.
+        document, and sync the changes to the index journal to disk.
         """
         if self.hasProject and self.docEditor.docChanged:
             logger.debug("Autosaving document")
             self.saveDocument()
+        if self.hasProject:
+            self.theIndex.syncJournal()
         return
 
     def _makeStatusIcons(self):
@@ -1371,7 +1572,11 @@ class GuiMain(QMainWindow):
         """When the escape key is pressed somewhere in the main window,
         do the following, in order:
         """
-        if self.docEditor.docSearch.isVisible():
+        if self.docEditor.closeTagCompletion():
+            pass
+        elif self.isIndexing:
+            self.cancelIndexing()
+        elif self.docEditor.docSearch.isVisible():
             self.docEditor.closeSearch()
         elif self.isFocusMode:
             self.toggleFocusMode()
@@ -1388,4 +1593,96 @@ class GuiMain(QMainWindow):
                 self.projView.refreshTree()
         return
 
+    @pyqtSlot(int, int)
+    def _indexProgress(self, nDone, nTotal):
+        """Slot for the index builder's progress signal.
+        """
+        if self.isIndexing:
+            self.setStatus("Indexing: %d of %d documents (press Esc to cancel)" % (nDone, nTotal))
+        return
+
+    @pyqtSlot()
+    def _indexFinished(self):
+        """Slot for the index builder's finished signal. The scan
+        results are merged into the index, and the item counts are
+        updated in one batch.
+        """
+        theBuilder = self.idxBuilder
+        if theBuilder is None or self.sender() is not theBuilder.signals:
+            # The rebuild was cancelled, or already merged by waitForIndex
+            return
+
+        self._mergeIndex(theBuilder)
+
+        return
+
 # END Class GuiMain
+
+# =============================================================================================== #
+#  The Off-GUI Thread Index Builder
+#  A runnable for reading and scanning project documents off the main GUI thread.
+# =============================================================================================== #
+
+class BackgroundIndexBuilder(QRunnable):
+
+    def __init__(self, theJobs, beQuiet=False):
+        QRunnable.__init__(self)
+        self.theJobs = theJobs
+        self.beQuiet = beQuiet
+        self.signals = BackgroundIndexBuilderSignals()
+        self.theResults = []
+        self.runTime = 0.0
+        self.isFinished = False
+        self._isCancelled = False
+        self._isDone = Event()
+        return
+
+    def cancel(self):
+        self._isCancelled = True
+        return
+
+    def waitForDone(self):
+        """Block until the run function has returned.
+        """
+        self._isDone.wait()
+        return
+
+    @pyqtSlot()
+    def run(self):
+        """Overloaded run function for the index builder. The results
+        are collected, and the finished signal is emitted only if the
+        scan was not cancelled.
+        """
+        tStart = time()
+        nTotal = len(self.theJobs)
+        lastPct = -1
+        theScanner = NWIndex.scanDocFiles(self.theJobs)
+        try:
+            for nDone, theResult in enumerate(theScanner, 1):
+                if self._isCancelled:
+                    break
+                self.theResults.append(theResult)
+                thisPct = (100*nDone)//nTotal
+                if thisPct > lastPct:
+                    self.signals.indexProgress.emit(nDone, nTotal)
+                    lastPct = thisPct
+
+            theScanner.close()
+            self.runTime = time() - tStart
+            if not self._isCancelled:
+                self.isFinished = True
+                self.signals.indexFinished.emit()
+
+        finally:
+            self._isDone.set()
+
+        return
+
+# END Class BackgroundIndexBuilder
+
+class BackgroundIndexBuilderSignals(QObject):
+
+    indexProgress = pyqtSignal(int, int)
+    indexFinished = pyqtSignal()
+
+# END Class BackgroundIndexBuilderSignals
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark of the emphasis tags written by ToHtml.doConvert, comparing
+the single pass span writer with the string slicing it replaced, on
+paragraphs with heavy emphasis.
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+
+from nw.core.tohtml import ToHtml # noqa: E402
+
+nRepeat = 10
+nLoops = 5
+
+htmlTags = {
+    ToHtml.FMT_B_B : "<strong>",
+    ToHtml.FMT_B_E : "</strong>",
+    ToHtml.FMT_I_B : "<em>",
+    ToHtml.FMT_I_E : "</em>",
+    ToHtml.FMT_D_B : "<del>",
+    ToHtml.FMT_D_E : "</del>",
+}
+
+def sliceTags(theTokens):
+    """The emphasis tags as they were written with string slicing.
+    """
+    theResult = []
+    for tType, tLine, tText, tFormat, tStyle in theTokens:
+        if tType == ToHtml.T_TEXT:
+            tTemp = tText
+            for xPos, xLen, xFmt in reversed(tFormat):
+                tTemp = tTemp[:xPos]+htmlTags[xFmt]+tTemp[xPos+xLen:]
+            theResult.append(tTemp)
+    return theResult
+
+def makeText(nWords, nLines):
+    """Make paragraphs of long lines where every word is emphasised.
+    """
+    theWords = []
+    for n in range(nWords):
+        theWords.append(("**bold%d**", "_italic%d_", "~~strike%d~~", "**_both%d_**")[n % 4] % n)
+    aLine = " ".join(theWords)
+    return "\n\n".join([aLine]*nLines) + "\n"
+
+theHtml = ToHtml(None, None)
+theHtml.setStyles(False)
+theHtml.autoReplace = {}
+
+print("")
+for nWords, nLines in ((10, 1000), (100, 100), (1000, 10), (10000, 1)):
+    theHtml.theText = makeText(nWords, nLines)
+    theHtml.tokenizeText()
+    theTokens = theHtml.theTokens
+    nSpans = sum(len(tToken[3]) for tToken in theTokens if tToken[0] == ToHtml.T_TEXT)
+
+    # Check that both write the same text
+    theHtml.doConvert()
+    theParts = [x[3:].rstrip() for x in theHtml.theResult.split("</p>\n") if x]
+    assert theParts == sliceTags(theTokens)
+
+    tSlice = min(timeit.repeat(
+        lambda: sliceTags(theTokens), number=nLoops, repeat=nRepeat
+    ))/nLoops
+    tSpans = min(timeit.repeat(
+        lambda: theHtml.doConvert(), number=nLoops, repeat=nRepeat
+    ))/nLoops
+
+    print("%5d words per line, %6d spans: slicing %8.2f ms, doConvert %8.2f ms, %6.1fx" % (
+        nWords, nSpans, 1e3*tSlice, 1e3*tSpans, tSlice/tSpans
+    ))
+
+print("")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark of the emphasis formatting scan of the Tokenizer class,
+comparing the compiled re pattern with the QRegularExpression scan it
+replaced, on the documents of the lipsum test project.
+"""
+
+import os
+import sys
+import glob
+import timeit
+
+from operator import itemgetter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+
+from PyQt5.QtCore import QRegularExpression # noqa: E402
+
+from nw.constants import nwRegEx # noqa: E402
+from nw.core.tokenizer import Tokenizer # noqa: E402
+
+nRepeat = 20
+nLoops = 10
+
+def qtFormats(theLines):
+    """The formatting scan as it was done with QRegularExpression.
+    """
+    rxFormats = [
+        (QRegularExpression(nwRegEx.FMT_EI), [None, Tokenizer.FMT_I_B, None, Tokenizer.FMT_I_E]),
+        (QRegularExpression(nwRegEx.FMT_EB), [None, Tokenizer.FMT_B_B, None, Tokenizer.FMT_B_E]),
+        (QRegularExpression(nwRegEx.FMT_ST), [None, Tokenizer.FMT_D_B, None, Tokenizer.FMT_D_E]),
+    ]
+    theResult = []
+    for aLine in theLines:
+        fmtPos = []
+        for theRX, theKeys in rxFormats:
+            rxThis = theRX.globalMatch(aLine, 0)
+            while rxThis.hasNext():
+                rxMatch = rxThis.next()
+                for n in range(1, len(theKeys)):
+                    if theKeys[n] is not None:
+                        xPos = rxMatch.capturedStart(n)
+                        xLen = rxMatch.capturedLength(n)
+                        fmtPos.append([xPos, xLen, theKeys[n]])
+        theResult.append(sorted(fmtPos, key=itemgetter(0)))
+    return theResult
+
+def reFormats(theTokenizer, theText):
+    """The formatting scan of the tokenizer.
+    """
+    theTokenizer.theText = theText
+    return [
+        tToken[3] for tToken in theTokenizer.iterTokens() if tToken[0] == Tokenizer.T_TEXT
+    ]
+
+theTokenizer = Tokenizer(None, None)
+theTexts = []
+for docPath in sorted(glob.glob(os.path.join(
+    os.path.dirname(__file__), "lipsum", "content", "*.nwd"
+))):
+    with open(docPath, mode="r", encoding="utf8") as inFile:
+        theTexts.append(inFile.read())
+
+# The text lines are the lines the tokenizer scans for formatting
+theLines = []
+for theText in theTexts:
+    theLines.append([
+        aLine for aLine in theText.splitlines()
+        if aLine.strip() and aLine[0] not in "%@" and not aLine.startswith("#")
+    ])
+
+for theText, textLines in zip(theTexts, theLines):
+    assert reFormats(theTokenizer, theText) == qtFormats(textLines)
+
+nBytes = sum(len(theText.encode("utf8")) for theText in theTexts)
+
+def runQt():
+    for textLines in theLines:
+        qtFormats(textLines)
+
+def runRe():
+    for theText in theTexts:
+        reFormats(theTokenizer, theText)
+
+def runNoFormat():
+    for theText in theTexts:
+        theTokenizer.theText = theText
+        for tToken in theTokenizer.iterTokens():
+            pass
+
+print("")
+print("Lipsum project: %d documents, %d bytes" % (len(theTexts), nBytes))
+print("The formatting of both scans is identical")
+print("")
+
+tQt = min(timeit.repeat(runQt, number=nLoops, repeat=nRepeat))/nLoops
+tRe = min(timeit.repeat(runRe, number=nLoops, repeat=nRepeat))/nLoops
+
+# The re scan is timed as part of the whole tokenizer, so the time of
+# the tokenizer without formatting is measured separately
+rxFormat = Tokenizer.RX_FORMAT
+Tokenizer.RX_FORMAT = type("NoFormat", (), {"finditer": lambda self, x: ()})()
+tNone = min(timeit.repeat(runNoFormat, number=nLoops, repeat=nRepeat))/nLoops
+Tokenizer.RX_FORMAT = rxFormat
+
+tScan = max(tRe - tNone, 1e-9)
+print("QRegularExpression scan: %8.3f ms, %7.2f MB/s" % (1e3*tQt, nBytes/tQt/1e6))
+print("Compiled re scan:        %8.3f ms, %7.2f MB/s" % (1e3*tScan, nBytes/tScan/1e6))
+print("Tokenizer with re scan:  %8.3f ms, %7.2f MB/s" % (1e3*tRe, nBytes/tRe/1e6))
+print("Speedup of the scan:     %8.1fx" % (tQt/tScan))
+print("")
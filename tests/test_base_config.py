@@ -502,4 +502,17 @@ def testBaseConfig_Internal(monkeypatch, tmpConf):
     assert tmpConf.hasAssistant is False
     monkeypatch.undo()
 
+    # The numpy package is only looked up, not imported
+    monkeypatch.delitem(sys.modules, "numpy", raising=False)
+    monkeypatch.setattr("importlib.util.find_spec", lambda *args: object())
+    tmpConf._checkOptionalPackages()
+    assert tmpConf.hasNumPy is True
+    assert "numpy" not in sys.modules
+    monkeypatch.undo()
+
+    monkeypatch.setattr("importlib.util.find_spec", lambda *args: None)
+    tmpConf._checkOptionalPackages()
+    assert tmpConf.hasNumPy is False
+    monkeypatch.undo()
+
 # END Test testBaseConfig_Internal
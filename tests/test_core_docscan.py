@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Document Scanning Tester
+"""
+
+import pytest
+import os
+
+from tools import writeFile
+
+from nw.core.docscan import readDocFile, scanThis
+
+@pytest.mark.core
+def testCoreDocScan_ReadDocFile(monkeypatch, fncDir):
+    """Test reading a document file without its meta data lines.
+    """
+    docPath = os.path.join(fncDir, "0000000000000.nwd")
+
+    # A document that doesn't exist is empty, and has no stamp
+    assert readDocFile(docPath) == ("", None)
+
+    # The meta data lines are skipped
+    writeFile(docPath, (
+        "%%~name: Chapter One\n"
+        "%%~path: a508bb932959c/f5ab3e30151e1\n"
+        "%%~kind: NOVEL/CHAPTER\n"
+        "# Chapter One\n"
+        "\n"
+        "%%~ Not a meta data line.\n"
+    ))
+    theText, fileStamp = readDocFile(docPath)
+    assert theText == "# Chapter One\n\n%%~ Not a meta data line.\n"
+    assert fileStamp == [os.stat(docPath).st_mtime_ns, os.stat(docPath).st_size]
+
+    # Only meta data lines
+    writeFile(docPath, "%%~name: Chapter One\n")
+    assert readDocFile(docPath)[0] == ""
+
+    # A document that cannot be read has no text
+    with monkeypatch.context() as mp:
+        mp.setattr("builtins.open", lambda *args, **kwargs: None)
+        assert readDocFile(docPath) == (None, None)
+
+# END Test testCoreDocScan_ReadDocFile
+
+@pytest.mark.core
+def testCoreDocScan_ScanThis():
+    """Test the keyword line scanner, which the index also provides.
+    """
+    assert scanThis("@tag: this, and this") == (
+        True, ["@tag", "this", "and this"], [0, 6, 12]
+    )
+    assert scanThis("@:") == (False, [], [])
+
+# END Test testCoreDocScan_ScanThis
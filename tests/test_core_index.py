@@ -5,14 +5,20 @@
 import pytest
 import os
 import json
+import copy
+import sqlite3
 
 from shutil import copyfile
 
-from tools import cmpFiles
+from tools import cmpFiles, writeFile
 
 from nw.core.project import NWProject
+from nw.core.document import NWDoc
 from nw.core.index import NWIndex
-from nw.constants import nwItemClass, nwItemLayout
+from nw.core.indexstore import (
+    NWIndexJson, NWIndexDB, NWIndexFile, NWIndexMap, NWHeading, NWHeadingMap
+)
+from nw.constants import nwConst, nwFiles, nwItemClass, nwItemLayout, nwIndexEvent
 
 @pytest.mark.core
 def testCoreIndex_LoadSave(monkeypatch, nwLipsum, dummyGUI, outDir, refDir):
@@ -29,6 +35,11 @@ def testCoreIndex_LoadSave(monkeypatch, nwLipsum, dummyGUI, outDir, refDir):
 
     monkeypatch.setattr("nw.core.index.time", lambda: 123.4)
 
+    # Fix the file time stamps so that the saved index is reproducible
+    contDir = os.path.join(nwLipsum, "content")
+    for docFile in os.listdir(contDir):
+        os.utime(os.path.join(contDir, docFile), ns=(1234000000000, 1234000000000))
+
     theIndex = NWIndex(theProject, dummyGUI)
     notIndexable = {
         "b3643d0f92e32": False, # Novel ROOT
@@ -56,30 +67,46 @@ def testCoreIndex_LoadSave(monkeypatch, nwLipsum, dummyGUI, outDir, refDir):
     assert theIndex.saveIndex()
 
     # Take a copy of the index
-    tagIndex = str(theIndex.tagIndex)
-    refIndex = str(theIndex.refIndex)
-    novelIndex = str(theIndex.novelIndex)
-    noteIndex = str(theIndex.noteIndex)
-    textCounts = str(theIndex.textCounts)
+    tagIndex = copy.deepcopy(theIndex.tagIndex)
+    tagHandles = {tHandle: set(theTags) for tHandle, theTags in theIndex.tagHandles.items()}
+    tagRefs = {tTag: dict(theRefs) for tTag, theRefs in theIndex.tagRefs.items()}
+    refIndex = copy.deepcopy(theIndex.refIndex)
+    novelIndex = copy.deepcopy(theIndex.novelIndex)
+    noteIndex = copy.deepcopy(theIndex.noteIndex)
+    textCounts = copy.deepcopy(theIndex.textCounts)
+    fileStamps = copy.deepcopy(theIndex.fileStamps)
 
     # Delete a handle
     assert theIndex.tagIndex.get("Bod", None) is not None
     assert theIndex.refIndex.get("4c4f28287af27", None) is not None
     assert theIndex.noteIndex.get("4c4f28287af27", None) is not None
     assert theIndex.textCounts.get("4c4f28287af27", None) is not None
+    assert "Bod" in theIndex.tagHandles["4c4f28287af27"]
     theIndex.deleteHandle("4c4f28287af27")
     assert theIndex.tagIndex.get("Bod", None) is None
+    assert theIndex.tagHandles.get("4c4f28287af27", None) is None
     assert theIndex.refIndex.get("4c4f28287af27", None) is None
     assert theIndex.noteIndex.get("4c4f28287af27", None) is None
     assert theIndex.textCounts.get("4c4f28287af27", None) is None
+    assert theIndex.fileStamps.get("4c4f28287af27", None) is None
 
     # Clear the index
     theIndex.clearIndex()
     assert not theIndex.tagIndex
+    assert not theIndex.tagHandles
     assert not theIndex.refIndex
     assert not theIndex.novelIndex
     assert not theIndex.noteIndex
     assert not theIndex.textCounts
+    assert not theIndex.fileStamps
+
+    # The deletion is in the journal, and is applied on load
+    jnlFile = os.path.join(nwLipsum, "meta", nwFiles.INDEX_JNL)
+    assert os.path.isfile(jnlFile)
+    assert theIndex.loadIndex()
+    assert theIndex.tagIndex.get("Bod", None) is None
+    assert theIndex.refIndex.get("4c4f28287af27", None) is None
+    os.unlink(jnlFile)
 
     # Make the load fail
     monkeypatch.setattr(json, "load", doPanic)
@@ -89,48 +116,76 @@ def testCoreIndex_LoadSave(monkeypatch, nwLipsum, dummyGUI, outDir, refDir):
     monkeypatch.undo()
     assert theIndex.loadIndex()
 
-    assert str(theIndex.tagIndex) == tagIndex
-    assert str(theIndex.refIndex) == refIndex
-    assert str(theIndex.novelIndex) == novelIndex
-    assert str(theIndex.noteIndex) == noteIndex
-    assert str(theIndex.textCounts) == textCounts
+    assert theIndex.tagIndex == tagIndex
+    assert theIndex.tagHandles == tagHandles
+    assert theIndex.tagRefs == tagRefs
+    assert isinstance(theIndex.refIndex, NWIndexMap)
+    assert dict(theIndex.refIndex) == refIndex
+    assert dict(theIndex.novelIndex) == novelIndex
+    assert dict(theIndex.noteIndex) == noteIndex
+    assert theIndex.textCounts == textCounts
+    assert theIndex.fileStamps == fileStamps
+
+    # Break the index, and check that only the broken document is
+    # scanned again
+    monkeypatch.setattr("nw.core.index.time", lambda: 123.4)
+    reIndexed = []
+    reIndexHandle = theIndex.reIndexHandle
+    monkeypatch.setattr(
+        theIndex, "reIndexHandle", lambda h: reIndexed.append(h) or reIndexHandle(h)
+    )
+
+    def checkRepair(tHandle):
+        reIndexed.clear()
+        theIndex.checkIndex()
+        assert not theIndex.indexBroken
+        assert reIndexed == [tHandle]
+        assert theIndex.tagIndex == tagIndex
+        assert theIndex.tagHandles == tagHandles
+        assert theIndex.tagRefs == tagRefs
+        assert dict(theIndex.refIndex) == refIndex
+        assert dict(theIndex.novelIndex) == novelIndex
+        assert dict(theIndex.noteIndex) == noteIndex
+        assert theIndex.textCounts == textCounts
+        assert theIndex.fileStamps == fileStamps
+        assert theIndex.loadIndex()
+        assert not theIndex.indexBroken
 
-    # Break the index and check that we notice
-    assert not theIndex.indexBroken
     theIndex.tagIndex["Bod"].append("Stuff") # No longer len() == 4
-    theIndex.checkIndex()
-    assert theIndex.indexBroken
+    checkRepair("4c4f28287af27")
 
-    assert theIndex.loadIndex()
-    assert not theIndex.indexBroken
     theIndex.refIndex["fb609cd8319dc"]["T000001"]["tags"].append("Stuff") # No longer len() == 3
-    theIndex.checkIndex()
-    assert theIndex.indexBroken
+    checkRepair("fb609cd8319dc")
 
-    assert theIndex.loadIndex()
-    assert not theIndex.indexBroken
-    theIndex.novelIndex["7a992350f3eb6"]["T000001"]["Stuff"] = "" # No longer len(keys()) == 8
-    theIndex.checkIndex()
-    assert theIndex.indexBroken
+    theIndex.novelIndex["7a992350f3eb6"]["T000001"] = {"Stuff": ""} # No longer a NWHeading
+    checkRepair("7a992350f3eb6")
 
-    assert theIndex.loadIndex()
-    assert not theIndex.indexBroken
-    theIndex.noteIndex["4c4f28287af27"]["T000001"]["Stuff"] = "" # No longer len(keys()) == 8
-    theIndex.checkIndex()
-    assert theIndex.indexBroken
+    theIndex.noteIndex["4c4f28287af27"]["T000001"] = {"Stuff": ""} # No longer a NWHeading
+    checkRepair("4c4f28287af27")
+
+    theIndex.noteIndex["4c4f28287af27"]["Stuff"] = theIndex.noteIndex["4c4f28287af27"][1]
+    checkRepair("4c4f28287af27")
 
-    assert theIndex.loadIndex()
-    assert not theIndex.indexBroken
     theIndex.textCounts["7a992350f3eb6"].append("Stuff") # No longer len() == 3
-    theIndex.checkIndex()
-    assert theIndex.indexBroken
+    checkRepair("7a992350f3eb6")
+
+    theIndex.fileStamps["7a992350f3eb6"].append("Stuff") # No longer len() == 2
+    checkRepair("7a992350f3eb6")
 
-    # Make the try/except trigger as well
-    assert theIndex.loadIndex()
-    assert not theIndex.indexBroken
     theIndex.refIndex["fb609cd8319dc"]["T000001"] = {"tagssss": []} # Wrong key name
+    checkRepair("fb609cd8319dc")
+
+    # A heading with an extra field is not converted
+    theIndex.novelIndex["7a992350f3eb6"] = NWHeadingMap.fromJson(
+        {"T000001": dict(theIndex.novelIndex["7a992350f3eb6"][1], Stuff="")}
+    )
+    checkRepair("7a992350f3eb6")
+
+    # A tag entry that cannot be traced to a document breaks the index
+    theIndex.tagIndex["Bod"] = "Stuff"
     theIndex.checkIndex()
     assert theIndex.indexBroken
+    assert not theIndex.tagIndex
 
     # Finalise
     assert theProject.closeProject()
@@ -140,6 +195,647 @@ def testCoreIndex_LoadSave(monkeypatch, nwLipsum, dummyGUI, outDir, refDir):
 
 # END Test testCoreIndex_LoadSave
 
+@pytest.mark.core
+def testCoreIndex_JsonFile(monkeypatch, nwLipsum, dummyGUI):
+    """Test that the entries of the JSON index file are checked when
+    first used, and that only a damaged document is scanned again.
+    """
+    jsonFile = os.path.join(nwLipsum, "meta", "tagsIndex.json")
+
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwLipsum)
+
+    monkeypatch.setattr("nw.core.index.time", lambda: 123.4)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    for tItem in theProject.projTree:
+        theIndex.reIndexHandle(tItem.itemHandle)
+    assert theIndex.saveIndex()
+
+    tagRefs = copy.deepcopy(theIndex.tagRefs)
+    refIndex = copy.deepcopy(theIndex.refIndex)
+    novelIndex = copy.deepcopy(theIndex.novelIndex)
+
+    def readFile():
+        with open(jsonFile, mode="r", encoding="utf8") as inFile:
+            return json.load(inFile)
+
+    def writeFile(theData):
+        with open(jsonFile, mode="w", encoding="utf8") as outFile:
+            json.dump(theData, outFile)
+
+    def loadIndex():
+        newIndex = NWIndex(theProject, dummyGUI)
+        reIndexHandle = newIndex.reIndexHandle
+        monkeypatch.setattr(
+            newIndex, "reIndexHandle", lambda h: reIndexed.append(h) or reIndexHandle(h)
+        )
+        reIndexed.clear()
+        assert newIndex.loadIndex()
+        assert not newIndex.indexBroken
+        return newIndex
+
+    reIndexed = []
+    theData = readFile()
+    assert theData["indexVersion"] == NWIndexJson.FILE_VERSION
+    assert set(theData["checkSums"]) == set(refIndex) | set(theIndex.noteIndex) | set(novelIndex)
+
+    # Change a reference in the file, so only the checksum is wrong
+    theData["refIndex"]["fb609cd8319dc"]["T000001"]["tags"][0][2] = "Stuff"
+    writeFile(theData)
+
+    newIndex = loadIndex()
+    assert isinstance(newIndex.refIndex, NWIndexMap)
+    assert not newIndex.refIndex.isLoaded("fb609cd8319dc")
+    assert "Stuff" in newIndex.tagRefs
+    assert reIndexed == []
+
+    # The document is scanned again when its entry is first used
+    assert newIndex.refIndex["fb609cd8319dc"] == refIndex["fb609cd8319dc"]
+    assert reIndexed == ["fb609cd8319dc"]
+    assert newIndex.tagRefs == tagRefs
+    assert dict(newIndex.refIndex) == refIndex
+    assert dict(newIndex.novelIndex) == novelIndex
+    assert reIndexed == ["fb609cd8319dc"]
+
+    # Only the used entries get new checksums when saved
+    newIndex = loadIndex()
+    assert newIndex.novelIndex["fb609cd8319dc"] == novelIndex["fb609cd8319dc"]
+    assert newIndex.saveIndex()
+    theData = readFile()
+    assert theData["refIndex"]["fb609cd8319dc"] == refIndex["fb609cd8319dc"]
+
+    newIndex = loadIndex()
+    assert dict(newIndex.refIndex) == refIndex
+    assert dict(newIndex.novelIndex) == novelIndex
+    assert reIndexed == []
+
+    # A file without checksums only has the structure checked
+    del theData["indexVersion"]
+    del theData["checkSums"]
+    theData["refIndex"]["fb609cd8319dc"]["T000001"]["tags"][0][2] = "Stuff"
+    del theData["novelIndex"]["7a992350f3eb6"]["T000001"]["level"]
+    writeFile(theData)
+
+    newIndex = loadIndex()
+    assert newIndex.refIndex["fb609cd8319dc"]["T000001"]["tags"][0][2] == "Stuff"
+    assert reIndexed == []
+    assert newIndex.novelIndex["7a992350f3eb6"] == novelIndex["7a992350f3eb6"]
+    assert reIndexed == ["7a992350f3eb6"]
+
+    # A newer file version is not loaded
+    theData["indexVersion"] = NWIndexJson.FILE_VERSION + 1
+    writeFile(theData)
+    assert not NWIndex(theProject, dummyGUI).loadIndex()
+
+    assert theProject.closeProject()
+
+# END Test testCoreIndex_JsonFile
+
+@pytest.mark.core
+def testCoreIndex_SQLite(monkeypatch, nwLipsum, dummyGUI):
+    """Test saving and loading the index to and from the database, and
+    that only the changed documents are written.
+    """
+    jsonFile = os.path.join(nwLipsum, "meta", "tagsIndex.json")
+    dbFile = os.path.join(nwLipsum, "meta", "tagsIndex.sqlite")
+
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwLipsum)
+
+    monkeypatch.setattr("nw.core.index.time", lambda: 123.4)
+
+    # Build the index, and save it as JSON first
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.indexFormat == nwConst.IDX_JSON
+    for tItem in theProject.projTree:
+        theIndex.reIndexHandle(tItem.itemHandle)
+    assert theIndex.saveIndex()
+    assert os.path.isfile(jsonFile)
+    assert not os.path.isfile(dbFile)
+
+    tagIndex = copy.deepcopy(theIndex.tagIndex)
+    tagHandles = copy.deepcopy(theIndex.tagHandles)
+    tagRefs = copy.deepcopy(theIndex.tagRefs)
+    refIndex = copy.deepcopy(theIndex.refIndex)
+    novelIndex = copy.deepcopy(theIndex.novelIndex)
+    noteIndex = copy.deepcopy(theIndex.noteIndex)
+    textCounts = copy.deepcopy(theIndex.textCounts)
+    fileStamps = copy.deepcopy(theIndex.fileStamps)
+
+    # Switch to the database, which is created from the JSON file
+    monkeypatch.setattr(theIndex.mainConf, "indexFormat", nwConst.IDX_SQLITE)
+    theIndex.clearIndex()
+    assert theIndex.loadIndex()
+    assert theIndex.indexFormat == nwConst.IDX_SQLITE
+    assert theIndex.saveIndex()
+    assert os.path.isfile(dbFile)
+
+    # Load the database in a fresh index
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    assert not theIndex.indexBroken
+
+    assert isinstance(theIndex.novelIndex, NWIndexMap)
+    assert theIndex.tagIndex == tagIndex
+    assert theIndex.tagHandles == tagHandles
+    assert theIndex.tagRefs == tagRefs
+    assert theIndex.textCounts == textCounts
+    assert theIndex.fileStamps == fileStamps
+
+    # The headers are loaded when used
+    assert len(theIndex.novelIndex) == len(novelIndex)
+    assert not theIndex.novelIndex.isLoaded("7a992350f3eb6")
+    assert theIndex.getCounts("7a992350f3eb6", "T000001") == (230, 40, 3)
+    assert theIndex.novelIndex.isLoaded("7a992350f3eb6")
+    assert not theIndex.novelIndex.isLoaded("88243afbe5ed8")
+    assert theIndex.getReferences("88243afbe5ed8", "T000001")["@pov"] == ["Bod"]
+    assert not theIndex.novelIndex.isLoaded("88243afbe5ed8")
+
+    assert theIndex.refIndex == refIndex
+    assert theIndex.novelIndex == novelIndex
+    assert theIndex.noteIndex == noteIndex
+
+    # Only the changed documents are written
+    theWrites = []
+    writeIndex = NWIndexDB.writeIndex
+
+    def recordWrite(self, theIndex, theHandles=None):
+        theWrites.append(None if theHandles is None else set(theHandles))
+        return writeIndex(self, theIndex, theHandles)
+
+    monkeypatch.setattr(NWIndexDB, "writeIndex", recordWrite)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    assert theIndex.scanText("4c4f28287af27", (
+        "# Jane Smith\n"
+        "@tag: Jane\n"
+    ))
+    theIndex.deleteHandle("fb609cd8319dc")
+    assert theIndex.saveIndex()
+    assert theWrites == [{"4c4f28287af27", "fb609cd8319dc"}]
+    assert theIndex.saveIndex()
+    assert theWrites == [{"4c4f28287af27", "fb609cd8319dc"}, set()]
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    assert "Bod" not in theIndex.tagIndex
+    assert theIndex.tagIndex["Jane"][1] == "4c4f28287af27"
+    assert theIndex.noteIndex["4c4f28287af27"]["T000001"]["title"] == "Jane Smith"
+    assert "fb609cd8319dc" not in theIndex.novelIndex
+    assert "fb609cd8319dc" not in theIndex.refIndex
+    assert "fb609cd8319dc" not in theIndex.textCounts
+    assert theIndex.tagRefs.get("Bod", {}).get("fb609cd8319dc", None) is None
+    assert theIndex.novelIndex["88243afbe5ed8"] == novelIndex["88243afbe5ed8"]
+
+    # Removing an entry doesn't load it
+    assert not theIndex.novelIndex.isLoaded("f96ec11c6a3da")
+    assert theIndex.novelIndex.pop("f96ec11c6a3da", None) is None
+    assert "f96ec11c6a3da" not in theIndex.novelIndex
+
+    # A rebuild rewrites the whole database
+    theIndex.rebuildIndex(numWorkers=1)
+    assert theIndex.saveIndex()
+    assert theWrites[-1] is None
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    assert theIndex.tagIndex == tagIndex
+    assert theIndex.refIndex == refIndex
+
+    # Failing to open the database
+    def doPanic(*args, **kwargs):
+        raise Exception
+
+    monkeypatch.setattr("sqlite3.connect", doPanic)
+    assert not theIndex.loadIndex()
+    assert not theIndex.saveIndex()
+    assert theIndex.novelIndex._theLoader("88243afbe5ed8") is None
+    assert theIndex.refIndex._theLoader("88243afbe5ed8") is None
+    monkeypatch.undo()
+
+    # An unknown database version is not loaded
+    monkeypatch.setattr(theIndex.mainConf, "indexFormat", nwConst.IDX_SQLITE)
+    theDB = sqlite3.connect(dbFile)
+    theDB.execute("PRAGMA user_version = 99")
+    theDB.commit()
+    theDB.close()
+    assert not theIndex.loadIndex()
+
+    assert theProject.closeProject()
+
+# END Test testCoreIndex_SQLite
+
+@pytest.mark.core
+def testCoreIndex_BinaryFile(monkeypatch, nwLipsum, dummyGUI):
+    """Test converting, saving and loading the index to and from the
+    binary index file format, and the lazy decoding of entries.
+    """
+    jsonFile = os.path.join(nwLipsum, "meta", "tagsIndex.json")
+    binFile = os.path.join(nwLipsum, "meta", "tagsIndex.nwi")
+
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwLipsum)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    for tItem in theProject.projTree:
+        theIndex.reIndexHandle(tItem.itemHandle)
+    assert theIndex.saveIndex()
+
+    tagIndex = copy.deepcopy(theIndex.tagIndex)
+    tagHandles = copy.deepcopy(theIndex.tagHandles)
+    tagRefs = copy.deepcopy(theIndex.tagRefs)
+    refIndex = copy.deepcopy(theIndex.refIndex)
+    novelIndex = copy.deepcopy(theIndex.novelIndex)
+    noteIndex = copy.deepcopy(theIndex.noteIndex)
+    textCounts = copy.deepcopy(theIndex.textCounts)
+    fileStamps = copy.deepcopy(theIndex.fileStamps)
+
+    # Convert the JSON file
+    assert not NWIndexFile.convertJsonFile(jsonFile+"~", binFile)
+    assert NWIndexFile.convertJsonFile(jsonFile, binFile)
+    assert os.path.getsize(binFile) < os.path.getsize(jsonFile)/2
+
+    # Load the converted file
+    monkeypatch.setattr(theIndex.mainConf, "indexFormat", nwConst.IDX_BINARY)
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    assert not theIndex.indexBroken
+
+    assert theIndex.tagIndex == tagIndex
+    assert theIndex.tagHandles == tagHandles
+    assert theIndex.tagRefs == tagRefs
+    assert theIndex.textCounts == textCounts
+    assert theIndex.fileStamps == fileStamps
+
+    assert not theIndex.refIndex.isLoaded("88243afbe5ed8")
+    assert not theIndex.novelIndex.isLoaded("88243afbe5ed8")
+    assert theIndex.getNovelStructure()[:2] == ["7a992350f3eb6:T000001", "88d59a277361b:T000001"]
+    assert theIndex.novelIndex.isLoaded("88243afbe5ed8")
+    assert not theIndex.refIndex.isLoaded("88243afbe5ed8")
+
+    assert theIndex.refIndex == refIndex
+    assert theIndex.novelIndex == novelIndex
+    assert theIndex.noteIndex == noteIndex
+
+    # Only the decoded or changed entries are encoded again on save
+    theEncoded = []
+    encodeHeaders = NWIndexFile._encodeHeaders
+
+    def recordEncode(self, theWriter, theHeads):
+        theEncoded.append(theHeads)
+        return encodeHeaders(self, theWriter, theHeads)
+
+    monkeypatch.setattr(NWIndexFile, "_encodeHeaders", recordEncode)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    assert theIndex.getCounts("7a992350f3eb6", "T000001") == (230, 40, 3)
+    assert theIndex.scanText("4c4f28287af27", (
+        "# Jane Smith\n"
+        "@tag: Jane\n"
+    ))
+    assert theIndex.saveIndex()
+    assert len(theEncoded) == 2
+
+    # Saving twice copies the same blocks again
+    assert theIndex.saveIndex()
+    assert len(theEncoded) == 4
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    assert theIndex.tagIndex["Jane"][1] == "4c4f28287af27"
+    assert theIndex.noteIndex["4c4f28287af27"]["T000001"]["title"] == "Jane Smith"
+    assert theIndex.novelIndex["88243afbe5ed8"] == novelIndex["88243afbe5ed8"]
+    assert theIndex.refIndex["88243afbe5ed8"] == refIndex["88243afbe5ed8"]
+    assert theIndex.textCounts["4c4f28287af27"] == [10, 2, 0]
+
+    # A new file is written from the JSON file if there is none
+    os.unlink(binFile)
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    assert isinstance(theIndex.novelIndex, NWIndexMap)
+    assert not os.path.isfile(binFile)
+    assert theIndex.saveIndex()
+    assert os.path.isfile(binFile)
+
+    # Broken or unknown files are not loaded
+    with open(binFile, mode="rb") as inFile:
+        theData = inFile.read()
+
+    with open(binFile, mode="wb") as outFile:
+        outFile.write(b"JUNK" + theData[4:])
+    assert not theIndex.loadIndex()
+
+    with open(binFile, mode="wb") as outFile:
+        outFile.write(theData[:4] + b"\xff\xff" + theData[6:])
+    assert not theIndex.loadIndex()
+
+    with open(binFile, mode="wb") as outFile:
+        outFile.write(theData[:100])
+    assert not theIndex.loadIndex()
+
+    # A broken entry is scanned again when decoded
+    with open(binFile, mode="wb") as outFile:
+        outFile.write(theData[:-8])
+    assert theIndex.loadIndex()
+    reIndexed = []
+    monkeypatch.setattr(theIndex, "reIndexHandle", lambda h: reIndexed.append(h))
+    nEntries = len(refIndex) + len(novelIndex) + len(noteIndex)
+    theMaps = (theIndex.refIndex, theIndex.novelIndex, theIndex.noteIndex)
+    assert sum(len(theMap) for theMap in theMaps) == nEntries
+    for theMap in theMaps:
+        theMap.items()
+    assert reIndexed == ["04468803b92e1"]
+    assert sum(len(theMap) for theMap in theMaps) == nEntries - 2
+
+    # The entries of a document that cannot be read are dropped
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    with monkeypatch.context() as mp:
+        mp.setattr(NWDoc, "openDocument", lambda *args, **kwargs: None)
+        theIndex.noteIndex.items()
+    assert "04468803b92e1" not in theIndex.refIndex
+    assert theIndex.refIndex.get("04468803b92e1") is None
+    assert "04468803b92e1" not in theIndex.textCounts
+
+    # The broken entry of an empty document is replaced by an empty one
+    docFile = os.path.join(nwLipsum, "content", "04468803b92e1.nwd")
+    writeFile(docFile, "")
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    theIndex.noteIndex.items()
+    assert "04468803b92e1" in theIndex.refIndex
+    assert list(theIndex.refIndex["04468803b92e1"]) == ["T000000"]
+    assert theIndex.textCounts["04468803b92e1"] == [0, 0, 0]
+
+    # Failing to write the file
+    monkeypatch.setattr("builtins.open", lambda *args, **kwargs: None)
+    assert not theIndex.saveIndex()
+    monkeypatch.undo()
+
+    assert theProject.closeProject()
+
+# END Test testCoreIndex_BinaryFile
+
+@pytest.mark.core
+def testCoreIndex_ReIndexChanged(nwLipsum, dummyGUI):
+    """Test that only documents changed on disk since they were last
+    indexed are rescanned when checking the file stamps.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwLipsum)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    for tItem in theProject.projTree:
+        theIndex.reIndexHandle(tItem.itemHandle)
+    assert theIndex.saveIndex()
+
+    # Nothing has changed, so nothing should be rescanned
+    theIndex.clearIndex()
+    assert theIndex.loadIndex()
+    assert theIndex.reIndexChanged() == []
+
+    # Change a document on disk
+    docFile = os.path.join(nwLipsum, "content", "4c4f28287af27.nwd")
+    docStat = os.stat(docFile)
+    with open(docFile, mode="a", encoding="utf8") as outFile:
+        outFile.write("\n@tag: Bodzilla\n")
+    os.utime(docFile, ns=(docStat.st_atime_ns, docStat.st_mtime_ns + 1000000000))
+
+    assert "Bodzilla" not in theIndex.tagIndex
+    assert theIndex.reIndexChanged() == ["4c4f28287af27"]
+    assert theIndex.tagIndex["Bodzilla"][1] == "4c4f28287af27"
+    assert theIndex.reIndexChanged() == []
+
+    # Delete a document on disk
+    assert theIndex.noteIndex.get("4c4f28287af27", None) is not None
+    os.unlink(docFile)
+    assert theIndex.reIndexChanged() == ["4c4f28287af27"]
+    assert theIndex.noteIndex.get("4c4f28287af27", None) is None
+    assert "Bodzilla" not in theIndex.tagIndex
+    assert theIndex.reIndexChanged() == []
+
+    # A missing index should cause all documents to be scanned
+    theIndex.clearIndex()
+    nFiles = len(theIndex.reIndexChanged())
+    assert nFiles > 0
+    assert theIndex.reIndexChanged() == []
+
+    assert theProject.closeProject()
+
+# END Test testCoreIndex_ReIndexChanged
+
+@pytest.mark.core
+def testCoreIndex_Journal(monkeypatch, nwLipsum, dummyGUI):
+    """Test that the changes made to the index since it was last saved
+    are recorded in the journal, and applied when the index is loaded.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwLipsum)
+    jnlFile = os.path.join(nwLipsum, "meta", nwFiles.INDEX_JNL)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    for tItem in theProject.projTree:
+        theIndex.reIndexHandle(tItem.itemHandle)
+    assert os.path.isfile(jnlFile)
+    assert theIndex.saveIndex()
+    assert not os.path.isfile(jnlFile)
+
+    # Change one document and delete another
+    theDoc = NWDoc(theProject, dummyGUI)
+    theText = theDoc.openDocument("4c4f28287af27")
+    assert theDoc.saveDocument(theText + "\n# Zed\n@tag: Zed\n")
+    assert theIndex.scanText("4c4f28287af27", theText + "\n# Zed\n@tag: Zed\n")
+    theIndex.deleteHandle("88243afbe5ed8")
+    with open(jnlFile, mode="r", encoding="utf8") as inFile:
+        assert len(inFile.readlines()) == 2
+
+    tagIndex = copy.deepcopy(theIndex.tagIndex)
+    refIndex = copy.deepcopy(theIndex.refIndex)
+    novelIndex = copy.deepcopy(theIndex.novelIndex)
+    noteIndex = copy.deepcopy(theIndex.noteIndex)
+    textCounts = copy.deepcopy(theIndex.textCounts)
+    fileStamps = copy.deepcopy(theIndex.fileStamps)
+
+    # A new index, as after a crash, gets the changes from the journal
+    newIndex = NWIndex(theProject, dummyGUI)
+    assert newIndex.loadIndex()
+    assert not newIndex.indexBroken
+    assert newIndex.tagIndex == tagIndex
+    assert dict(newIndex.refIndex) == refIndex
+    assert dict(newIndex.novelIndex) == novelIndex
+    assert dict(newIndex.noteIndex) == noteIndex
+    assert newIndex.textCounts == textCounts
+    assert newIndex.fileStamps == fileStamps
+    assert newIndex.tagRefs == theIndex.tagRefs
+
+    # The changed document is added to the text index again when needed
+    assert newIndex.searchProject("zed") != []
+
+    # An entry that was only partly written ends the journal, and is
+    # removed when the journal is applied
+    with open(jnlFile, mode="a", encoding="utf8") as outFile:
+        outFile.write("{\"op\":\"delete\",\"hand")
+    newIndex = NWIndex(theProject, dummyGUI)
+    assert newIndex.loadIndex()
+    assert newIndex.tagIndex == tagIndex
+    with open(jnlFile, mode="r", encoding="utf8") as inFile:
+        assert len(inFile.readlines()) == 2
+
+    # The journal is compacted when it grows too long
+    monkeypatch.setattr(NWIndex, "JOURNAL_MAX", 4)
+    for i in range(5):
+        assert newIndex.scanText("4c4f28287af27", theText + "\n@tag: Zed%d\n" % i)
+    assert newIndex.indexJnl.nEntries <= 4
+    newIndex = NWIndex(theProject, dummyGUI)
+    assert newIndex.loadIndex()
+    assert newIndex.tagIndex["Zed4"][1] == "4c4f28287af27"
+    assert "Zed3" not in newIndex.tagIndex
+    assert newIndex.noteIndex.get("88243afbe5ed8", None) is None
+    assert newIndex.novelIndex.get("88243afbe5ed8", None) is None
+
+    # Saving the index clears the journal
+    assert newIndex.saveIndex()
+    assert not os.path.isfile(jnlFile)
+
+    # A journal that doesn't exist yet is also compacted, and is only
+    # synced to disk when asked to
+    theSyncs = []
+    monkeypatch.setattr("nw.core.indexstore.os.fsync", lambda fd: theSyncs.append(fd))
+    newIndex = NWIndex(theProject, dummyGUI)
+    assert newIndex.loadIndex()
+    assert newIndex.indexJnl.nEntries == 0
+    for i in range(5):
+        assert newIndex.scanText("4c4f28287af27", theText + "\n@tag: Zed%d\n" % i)
+    assert newIndex.indexJnl.nEntries <= 4
+    assert theSyncs == []
+    assert newIndex.syncJournal()
+    assert newIndex.syncJournal()
+    assert len(theSyncs) == 1
+
+    # A rebuilt index clears the journal, as its entries are outdated
+    newIndex.mergeScanResults(list(NWIndex.scanDocFiles(newIndex.makeScanJobs())))
+    assert not os.path.isfile(jnlFile)
+    assert newIndex.indexJnl.nEntries == 0
+
+    assert theProject.closeProject()
+
+# END Test testCoreIndex_Journal
+
+@pytest.mark.core
+def testCoreIndex_HeadingRecords():
+    """Test the heading records of the novel and notes index.
+    """
+    theHead = NWHeading("H1", "Title", "TITLE", cCount=10, updated=1234)
+    assert theHead.level == "H1"
+    assert theHead["title"] == "Title"
+    assert theHead["wCount"] == 0
+    theHead["synopsis"] = "Text"
+    assert theHead.synopsis == "Text"
+    with pytest.raises(KeyError):
+        theHead["Stuff"]
+    with pytest.raises(KeyError):
+        theHead["Stuff"] = ""
+    with pytest.raises(AttributeError):
+        theHead.Stuff = ""
+
+    # Conversion to and from the JSON index file format
+    theData = theHead.toDict()
+    assert list(theData.keys()) == list(theHead.keys())
+    assert NWHeading.fromDict(theData) == theHead
+    assert NWHeading.fromDict(theData) != NWHeading("H2", "Title", "TITLE")
+    theData["Stuff"] = ""
+    with pytest.raises(ValueError):
+        NWHeading.fromDict(theData)
+    with pytest.raises(ValueError):
+        NWHeading.fromDict(None)
+
+    # The map is keyed by line number, but also takes title keys
+    theHeads = NWHeadingMap()
+    theHeads[12] = theHead
+    theHeads["T000003"] = NWHeading("H2", "Chapter", "CHAPTER")
+    assert list(theHeads.keys()) == [12, 3]
+    assert theHeads["T000012"] is theHead
+    assert "T000003" in theHeads
+    assert 3 in theHeads
+    assert "T00003" not in theHeads
+    assert theHeads.get("T000004") is None
+    assert theHeads.pop("T000004", None) is None
+
+    theJson = theHeads.toJson()
+    assert list(theJson.keys()) == ["T000012", "T000003"]
+    assert NWHeadingMap.fromJson(theJson) == theHeads
+
+    del theHeads["T000003"]
+    assert theHeads.pop("T000012") is theHead
+    assert not theHeads
+
+# END Test testCoreIndex_HeadingRecords
+
+@pytest.mark.core
+def testCoreIndex_RebuildIndex(monkeypatch, nwLipsum, dummyGUI):
+    """Test that rebuilding the index from the files on disk, both in a
+    single process and in parallel, gives the same result as scanning
+    each file in turn.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwLipsum)
+
+    # The time stamps in worker processes cannot be monkeypatched, so
+    # they are removed from the results before comparing
+    def indexData(theIndex):
+        theData = json.loads(json.dumps({
+            "tagIndex"   : theIndex.tagIndex,
+            "refIndex"   : theIndex.refIndex,
+            "novelIndex" : {h: theHeads.toJson() for h, theHeads in theIndex.novelIndex.items()},
+            "noteIndex"  : {h: theHeads.toJson() for h, theHeads in theIndex.noteIndex.items()},
+            "textCounts" : theIndex.textCounts,
+            "fileStamps" : theIndex.fileStamps,
+            "tagRefs"    : theIndex.tagRefs,
+        }))
+        for idxName in ("refIndex", "novelIndex", "noteIndex"):
+            for tHandle in theData[idxName]:
+                for sTitle in theData[idxName][tHandle]:
+                    theData[idxName][tHandle][sTitle].pop("updated")
+        theData["tagHandles"] = theIndex.tagHandles
+        return theData
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    for tItem in theProject.projTree:
+        theIndex.reIndexHandle(tItem.itemHandle)
+    refData = indexData(theIndex)
+    assert refData["tagIndex"]
+    assert refData["novelIndex"]
+    assert refData["noteIndex"]
+
+    # Serial rebuild
+    assert theIndex.rebuildIndex(numWorkers=1)
+    assert indexData(theIndex) == refData
+
+    # Parallel rebuild
+    assert theIndex.rebuildIndex(numWorkers=2)
+    assert indexData(theIndex) == refData
+
+    # If the worker pool fails, the serial scan is used instead
+    def doPanic(*args, **kwargs):
+        raise Exception
+
+    monkeypatch.setattr("nw.core.index.multiprocessing.get_context", doPanic)
+    assert theIndex.rebuildIndex(numWorkers=2)
+    assert indexData(theIndex) == refData
+
+    assert theProject.closeProject()
+
+# END Test testCoreIndex_RebuildIndex
+
 @pytest.mark.core
 def testCoreIndex_ScanThis(nwMinimal, dummyGUI):
     """Test the tag scanner function scanThis.
@@ -286,8 +982,36 @@ def testCoreIndex_ScanText(nwMinimal, dummyGUI):
         "Well, not really.\n"
     ))
     assert str(theIndex.tagIndex) == "{'Jane': [2, '%s', 'CHARACTER', 'T000001']}" % cHandle
+    assert theIndex.tagHandles == {cHandle: {"Jane"}}
     assert theIndex.novelIndex[nHandle]["T000001"]["title"] == "Hello World!"
 
+    # Moving a tag to another file should update the reverse lookup
+    assert theIndex.scanText(nHandle, (
+        "# Hello World!\n"
+        "@tag: Jane\n"
+    ))
+    assert theIndex.tagIndex["Jane"][1] == nHandle
+    assert theIndex.tagHandles == {nHandle: {"Jane"}}
+
+    # Rescanning the old file should not remove the moved tag
+    assert theIndex.scanText(cHandle, (
+        "# Jane Smith\n"
+    ))
+    assert theIndex.tagIndex["Jane"][1] == nHandle
+    assert theIndex.tagHandles == {nHandle: {"Jane"}}
+
+    # Moving it back restores the original state
+    assert theIndex.scanText(cHandle, (
+        "# Jane Smith\n"
+        "@tag: Jane\n"
+    ))
+    assert theIndex.scanText(nHandle, (
+        "# Hello World!\n"
+        "@pov: Jane\n"
+    ))
+    assert str(theIndex.tagIndex) == "{'Jane': [2, '%s', 'CHARACTER', 'T000001']}" % cHandle
+    assert theIndex.tagHandles == {cHandle: {"Jane"}}
+
     # Check that title sections are indexed properly
     assert theIndex.scanText(nHandle, (
         "# Title One\n\n"
@@ -407,6 +1131,632 @@ def testCoreIndex_ScanText(nwMinimal, dummyGUI):
 
 # END Test testCoreIndex_ScanText
 
+@pytest.mark.core
+def testCoreIndex_NovelStructure(nwMinimal, dummyGUI):
+    """Check the caching of the novel structure, and the tracking of
+    changes to it.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwMinimal)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    aHandle = theProject.newFile("One", nwItemClass.NOVEL,     "a508bb932959c")
+    bHandle = theProject.newFile("Two", nwItemClass.NOVEL,     "a508bb932959c")
+    cHandle = theProject.newFile("Jane", nwItemClass.CHARACTER, "afb3043c7b2b3")
+
+    assert theIndex.scanText(aHandle, "# Chapter One\n\n### Scene One\n")
+    assert theIndex.scanText(bHandle, "# Chapter Two\n")
+    assert theIndex.getNovelStructure() == [
+        "%s:T000001" % aHandle, "%s:T000003" % aHandle, "%s:T000001" % bHandle
+    ]
+
+    # The structure is cached, but callers get their own copy
+    theStructure = theIndex.getNovelStructure()
+    theStructure.clear()
+    assert theIndex._novelCache[True][1] is not theStructure
+    assert len(theIndex.getNovelStructure()) == 3
+
+    # Scanning a note doesn't change the novel structure
+    novelVersion = theIndex.getNovelVersion()
+    assert theIndex.scanText(cHandle, "# Jane Smith\n@tag: Jane\n")
+    assert theIndex.getNovelVersion() == novelVersion
+    assert theIndex.getNovelChanges(novelVersion) == (novelVersion, set())
+
+    # Scanning a novel document is tracked per document
+    assert theIndex.scanText(bHandle, "# Chapter Two\n\n### Scene Two\n")
+    newVersion, theHandles = theIndex.getNovelChanges(novelVersion)
+    assert newVersion > novelVersion
+    assert theHandles == {bHandle}
+    assert theIndex.getNovelStructure()[-1] == "%s:T000003" % bHandle
+    assert theIndex.getNovelChanges(newVersion) == (newVersion, set())
+
+    theIndex.deleteHandle(aHandle)
+    assert theIndex.getNovelChanges(novelVersion)[1] == {aHandle, bHandle}
+    assert theIndex.getNovelStructure() == ["%s:T000001" % bHandle, "%s:T000003" % bHandle]
+
+    # Changes to the project tree require a full rebuild
+    novelVersion = theIndex.getNovelVersion()
+    theProject.projTree[bHandle].setExported(False)
+    assert theIndex.getNovelChanges(novelVersion)[1] is None
+    assert theIndex.getNovelStructure() == []
+    theProject.projTree[bHandle].setExported(True)
+
+    novelVersion = theIndex.getNovelVersion()
+    theProject.projTree.setOrder(theProject.projTree.handles())
+    assert theIndex.getNovelChanges(novelVersion)[1] is None
+
+    novelVersion = theIndex.getNovelVersion()
+    theIndex.clearIndex()
+    assert theIndex.getNovelChanges(novelVersion)[1] is None
+    assert theIndex.getNovelStructure() == []
+
+    assert theProject.closeProject()
+
+# END Test testCoreIndex_NovelStructure
+
+@pytest.mark.core
+def testCoreIndex_IndexEvents(nwMinimal, dummyGUI):
+    """Check the change events sent to the index listeners.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwMinimal)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    aHandle = theProject.newFile("One", nwItemClass.NOVEL,     "a508bb932959c")
+    cHandle = theProject.newFile("Jane", nwItemClass.CHARACTER, "afb3043c7b2b3")
+
+    theEvents = []
+    theIndex.addListener(theEvents.extend)
+    theIndex.addListener(theEvents.extend)
+    assert len(theIndex._indexListeners) == 1
+
+    # A new document adds headers, tags, references and counts
+    assert theIndex.scanText(cHandle, "# Jane Smith\n@tag: Jane\n")
+    assert set(theEvents) == {
+        (nwIndexEvent.HEAD_ADDED, cHandle, 1),
+        (nwIndexEvent.TAG_ADDED, cHandle, "Jane"),
+        (nwIndexEvent.REFS_CHANGED, cHandle, None),
+        (nwIndexEvent.COUNTS_CHANGED, cHandle, None),
+    }
+
+    # Scanning the same text again changes nothing
+    theEvents.clear()
+    assert theIndex.scanText(cHandle, "# Jane Smith\n@tag: Jane\n")
+    assert theEvents == []
+
+    # Moving the tag and changing the header
+    assert theIndex.scanText(cHandle, "# Jane Doe\n\n@tag: Jane\n")
+    assert set(theEvents) == {
+        (nwIndexEvent.HEAD_CHANGED, cHandle, 1),
+        (nwIndexEvent.TAG_MOVED, cHandle, "Jane"),
+        (nwIndexEvent.COUNTS_CHANGED, cHandle, None),
+    }
+
+    # Adding a reference to the tag
+    theEvents.clear()
+    assert theIndex.scanText(aHandle, "# Chapter\n\n### Scene\n@pov: Jane\n")
+    assert set(theEvents) == {
+        (nwIndexEvent.HEAD_ADDED, aHandle, 1),
+        (nwIndexEvent.HEAD_ADDED, aHandle, 3),
+        (nwIndexEvent.REFS_CHANGED, aHandle, None),
+        (nwIndexEvent.COUNTS_CHANGED, aHandle, None),
+    }
+
+    # Removing a header
+    theEvents.clear()
+    assert theIndex.scanText(aHandle, "# Chapter\n\n@pov: Jane\n")
+    assert (nwIndexEvent.HEAD_REMOVED, aHandle, 3) in theEvents
+    assert (nwIndexEvent.REFS_CHANGED, aHandle, None) in theEvents
+
+    # Deleting a document removes everything it defined
+    theEvents.clear()
+    theIndex.deleteHandle(cHandle)
+    assert set(theEvents) == {
+        (nwIndexEvent.HEAD_REMOVED, cHandle, 1),
+        (nwIndexEvent.TAG_REMOVED, cHandle, "Jane"),
+        (nwIndexEvent.REFS_CHANGED, cHandle, None),
+        (nwIndexEvent.COUNTS_CHANGED, cHandle, None),
+    }
+
+    # A failing listener doesn't stop the others
+    def badListener(theEvents):
+        raise ValueError("Oops")
+
+    theIndex.removeListener(theEvents.extend)
+    theIndex.addListener(badListener)
+    theIndex.addListener(theEvents.extend)
+    theEvents.clear()
+    theIndex.clearIndex()
+    assert theEvents == [(nwIndexEvent.INDEX_RESET, None, None)]
+
+    theIndex.removeListener(badListener)
+    theIndex.removeListener(theEvents.extend)
+    theIndex.removeListener(theEvents.extend)
+    assert theIndex._indexListeners == []
+
+    assert theProject.closeProject()
+
+# END Test testCoreIndex_IndexEvents
+
+@pytest.mark.core
+def testCoreIndex_TextSearch(nwMinimal, dummyGUI):
+    """Check the full-text index and the project search.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwMinimal)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    aHandle = theProject.newFile("One", nwItemClass.NOVEL,     "a508bb932959c")
+    bHandle = theProject.newFile("Two", nwItemClass.NOVEL,     "a508bb932959c")
+    cHandle = theProject.newFile("Jane", nwItemClass.CHARACTER, "afb3043c7b2b3")
+
+    theDoc = NWDoc(theProject, dummyGUI)
+
+    def saveAndScan(tHandle, theText):
+        theDoc.openDocument(tHandle)
+        assert theDoc.saveDocument(theText)
+        return theIndex.scanText(tHandle, theText)
+
+    assert saveAndScan(aHandle, "# Chapter One\n\nThe quick brown fox.\n")
+    assert saveAndScan(bHandle, "# Chapter Two\n\nA brown dog, and a quick fox.\n")
+    assert saveAndScan(cHandle, "# Jane\n\nJane has a brown Fox named Quickly.\n")
+
+    # Terms are matched in lower case, and hits are in project order
+    assert theIndex.searchProject("FOX") == [
+        (aHandle, 3, 16, 3), (bHandle, 3, 25, 3), (cHandle, 3, 17, 3)
+    ]
+    assert theIndex.searchProject("foxes") == []
+    assert theIndex.searchProject("") == []
+
+    # Prefix queries
+    assert theIndex.textIndex.findTerms("qu") == ["quick", "quickly"]
+    assert theIndex.searchProject("quick*") == [
+        (aHandle, 3, 4, 5), (bHandle, 3, 19, 5), (cHandle, 3, 27, 7)
+    ]
+
+    # Phrase queries
+    assert theIndex.searchProject("\"brown fox\"") == [
+        (aHandle, 3, 10, 9), (cHandle, 3, 11, 9)
+    ]
+    assert theIndex.searchProject("\"quick fox\"") == [(bHandle, 3, 19, 9)]
+    assert theIndex.searchProject("\"chapter t*\"") == [(bHandle, 1, 2, 11)]
+
+    # All parts must match on the same line
+    assert theIndex.searchProject("dog fox") == [(bHandle, 3, 8, 3), (bHandle, 3, 25, 3)]
+    assert theIndex.searchProject("chapter fox") == []
+
+    # The text index is updated when documents change
+    assert saveAndScan(aHandle, "# Chapter One\n\nThe slow brown fox.\n")
+    assert theIndex.searchProject("quick") == [(bHandle, 3, 19, 5)]
+    assert theIndex.textIndex.findTerms("qu") == ["quick", "quickly"]
+    assert theIndex.textIndex.findTerms("sl") == ["slow"]
+    theIndex.deleteHandle(cHandle)
+    assert theIndex.textIndex.findTerms("qu") == ["quick"]
+    assert theIndex.searchProject("jane") == []
+
+    # The text index is saved with the index, one file per document,
+    # and loaded when needed
+    assert theIndex.saveIndex()
+    assert not theIndex.textIndex.isChanged
+    textDir = os.path.join(theProject.projMeta, nwFiles.INDEX_TEXT)
+    aFile = os.path.join(textDir, aHandle+".json")
+    bFile = os.path.join(textDir, bHandle+".json")
+    assert os.path.isfile(aFile)
+    assert os.path.isfile(bFile)
+    assert not os.path.isfile(os.path.join(textDir, cHandle+".json"))
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    assert not theIndex.textIndex.hasDocument(aHandle)
+    assert theIndex.searchProject("brown") == [(aHandle, 3, 9, 5), (bHandle, 3, 2, 5)]
+    assert not theIndex.textIndex.isChanged
+
+    # Only the changed document is saved, without loading the others
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    os.utime(bFile, ns=(0, 0))
+    assert saveAndScan(aHandle, "# Chapter One\n\nThe slow brown dog.\n")
+    assert theIndex.saveIndex()
+    assert not theIndex.textIndex.hasDocument(bHandle)
+    assert os.stat(bFile).st_mtime_ns == 0
+    assert theIndex.searchProject("brown") == [(aHandle, 3, 9, 5), (bHandle, 3, 2, 5)]
+    assert theIndex.searchProject("dog") == [(aHandle, 3, 15, 3), (bHandle, 3, 8, 3)]
+
+    # Documents missing from the text files are read from disk
+    os.unlink(aFile)
+    assert theDoc.openDocument(aHandle)
+    assert theDoc.saveDocument("# Chapter One\n\nA brown cat.\n")
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    assert theIndex.loadIndex()
+    assert theIndex.searchProject("brown") == [(aHandle, 3, 2, 5), (bHandle, 3, 2, 5)]
+
+    assert theProject.closeProject()
+
+# END Test testCoreIndex_TextSearch
+
+@pytest.mark.core
+def testCoreIndex_ScanSections(monkeypatch, nwMinimal, dummyGUI):
+    """Check that sections that have not changed are not scanned again
+    when a document is rescanned.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwMinimal)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    nHandle = theProject.newFile("Draft", nwItemClass.NOVEL, "a508bb932959c")
+    cHandle = theProject.newFile("Jane", nwItemClass.CHARACTER, "afb3043c7b2b3")
+    assert theIndex.scanText(cHandle, "# Jane Smith\n@tag: Jane\n")
+
+    theLines = ["@pov: Jane", ""]
+    for n in range(5):
+        theLines += [
+            "### Scene %d" % n, "%% synopsis: Scene %d." % n, "@char: Jane", "",
+            "Some text in scene %d." % n, "",
+        ]
+
+    theScans = []
+    realScan = NWIndex._scanSection
+
+    def countScans(tHandle, theLines, *args):
+        theScans.append(theLines[0])
+        return realScan(tHandle, theLines, *args)
+
+    monkeypatch.setattr(NWIndex, "_scanSection", countScans)
+    assert theIndex.scanText(nHandle, "\n".join(theLines))
+    assert len(theScans) == 6
+    assert len(theIndex._docSections[nHandle]) == 6
+
+    # Adding a paragraph to a scene only rescans that scene, and moves
+    # the headers and references of the scenes that follow
+    theScans.clear()
+    theLines.insert(16, "More text.")
+    assert theIndex.scanText(nHandle, "\n".join(theLines))
+    assert theScans == ["### Scene 2"]
+
+    newIndex = NWIndex(theProject, dummyGUI)
+    assert newIndex.scanText(cHandle, "# Jane Smith\n@tag: Jane\n")
+    assert newIndex.scanText(nHandle, "\n".join(theLines))
+
+    theHeads = theIndex.novelIndex[nHandle]
+    assert list(theHeads.keys()) == [3, 9, 15, 22, 28]
+    assert theHeads[15].wCount == 9
+    assert theHeads[22].synopsis == "Scene 3."
+    for nLine, theHead in newIndex.novelIndex[nHandle].items():
+        assert theHeads[nLine].sameContent(theHead)
+    assert theIndex.refIndex[nHandle].keys() == newIndex.refIndex[nHandle].keys()
+    for sTitle, theRefs in newIndex.refIndex[nHandle].items():
+        assert theIndex.refIndex[nHandle][sTitle]["tags"] == theRefs["tags"]
+    assert theIndex.textCounts[nHandle] == newIndex.textCounts[nHandle]
+    assert theIndex.searchProject("scene") == newIndex.searchProject("scene")
+
+    # Changing the item's layout rescans everything
+    theScans.clear()
+    theProject.projTree[nHandle].setLayout(nwItemLayout.CHAPTER)
+    assert theIndex.scanText(nHandle, "\n".join(theLines))
+    assert len(theScans) == 6
+    assert theIndex.novelIndex[nHandle][3].layout == "CHAPTER"
+
+    theIndex.deleteHandle(nHandle)
+    assert nHandle not in theIndex._docSections
+
+    assert theProject.closeProject()
+
+# END Test testCoreIndex_ScanSections
+
+@pytest.mark.core
+def testCoreIndex_ScanMetaLines(nwMinimal, dummyGUI):
+    """Check the live update of the tags and references of a document
+    from its edited meta data lines.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwMinimal)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    aHandle = theProject.newFile("One", nwItemClass.NOVEL,     "a508bb932959c")
+    cHandle = theProject.newFile("Jane", nwItemClass.CHARACTER, "afb3043c7b2b3")
+    tHandle = theProject.newFile("Bin", nwItemClass.NOVEL,     "a508bb932959c")
+    theProject.projTree[tHandle].setParent(theProject.trashFolder())
+
+    assert theIndex.scanText(cHandle, "# Jane Smith\n@tag: Jane\n")
+    assert theIndex.scanText(aHandle, "# Chapter\n\n### Scene\n@pov: Jane\n")
+    headRecord = theIndex.novelIndex[aHandle]
+    sceneRefs = theIndex.refIndex[aHandle]["T000003"]
+
+    theEvents = []
+    theIndex.addListener(theEvents.extend)
+
+    # Unknown and trashed documents are not updated
+    assert not theIndex.scanMetaLines("0000000000000", [(1, "@tag: John")])
+    assert not theIndex.scanMetaLines(tHandle, [(1, "@tag: John")])
+    assert "John" not in theIndex.tagIndex
+
+    # The same lines change nothing
+    assert theIndex.scanMetaLines(cHandle, [(1, "# Jane Smith"), (2, "@tag: Jane")])
+    assert theEvents == []
+
+    # Renaming the tag
+    assert theIndex.scanMetaLines(cHandle, [(1, "# Jane Smith"), (2, "@tag: Janet")])
+    assert set(theEvents) == {
+        (nwIndexEvent.TAG_REMOVED, cHandle, "Jane"),
+        (nwIndexEvent.TAG_ADDED, cHandle, "Janet"),
+    }
+    assert "Jane" not in theIndex.tagIndex
+    assert theIndex.tagIndex["Janet"] == [2, cHandle, "CHARACTER", "T000001"]
+    assert theIndex.tagHandles[cHandle] == {"Janet"}
+    assert theIndex.checkThese(["@pov", "Jane"], theProject.projTree[aHandle]) == [True, False]
+
+    # Adding a reference in a new section only replaces the references
+    # and adds the new header, while the sections and headers that
+    # didn't change are kept
+    sceneHead = headRecord[3]
+    theEvents.clear()
+    assert theIndex.scanMetaLines(aHandle, [
+        (1, "# Chapter"), (3, "### Scene"), (4, "@pov: Jane"), (6, "### New"), (7, "@char: Janet")
+    ])
+    assert theEvents == [
+        (nwIndexEvent.REFS_CHANGED, aHandle, None),
+        (nwIndexEvent.HEAD_ADDED, aHandle, 6),
+    ]
+    assert theIndex.refIndex[aHandle]["T000003"] is sceneRefs
+    assert theIndex.refIndex[aHandle]["T000006"]["tags"] == [[7, "@char", "Janet"]]
+    assert theIndex.tagRefs["Janet"] == {aHandle: "T000006"}
+    assert theIndex.novelIndex[aHandle][3] is sceneHead
+    assert theIndex.novelIndex[aHandle][6].title == "New"
+
+    # Inserting two lines before the scene only scans the changed lines,
+    # and moves the sections, references and headers after them
+    theEvents.clear()
+    assert theIndex.scanMetaLines(aHandle, [(2, "@pov: Jane")], 2, 1, 3)
+    theRefs = theIndex.refIndex[aHandle]
+    assert list(theRefs) == ["T000000", "T000001", "T000005", "T000008"]
+    assert theRefs["T000001"]["tags"] == [[2, "@pov", "Jane"]]
+    assert theRefs["T000005"]["tags"] == [[6, "@pov", "Jane"]]
+    assert theRefs["T000005"]["updated"] == sceneRefs["updated"]
+    assert theRefs["T000008"]["tags"] == [[9, "@char", "Janet"]]
+    assert theIndex.tagRefs["Janet"] == {aHandle: "T000008"}
+    assert list(theIndex.novelIndex[aHandle]) == [1, 5, 8]
+    assert theIndex.novelIndex[aHandle][5] is sceneHead
+    assert theIndex.getCounts(aHandle, "T000005") == (
+        sceneHead.cCount, sceneHead.wCount, sceneHead.pCount
+    )
+
+    # Changing a header keeps its counts, and removing one moves the
+    # references of its section to the section before it
+    theEvents.clear()
+    assert theIndex.scanMetaLines(aHandle, [(5, "### The Scene")], 5, 1, 1)
+    assert theIndex.novelIndex[aHandle][5].title == "The Scene"
+    assert theIndex.novelIndex[aHandle][5].wCount == sceneHead.wCount
+    assert theEvents == [(nwIndexEvent.HEAD_CHANGED, aHandle, 5)]
+
+    theEvents.clear()
+    assert theIndex.scanMetaLines(aHandle, [], 5, 1, 0)
+    theRefs = theIndex.refIndex[aHandle]
+    assert list(theRefs) == ["T000000", "T000001", "T000007"]
+    assert theRefs["T000001"]["tags"] == [[2, "@pov", "Jane"], [5, "@pov", "Jane"]]
+    assert list(theIndex.novelIndex[aHandle]) == [1, 7]
+    assert (nwIndexEvent.HEAD_REMOVED, aHandle, 5) in theEvents
+
+    # Removing the reference
+    theEvents.clear()
+    assert theIndex.scanMetaLines(aHandle, [(1, "# Chapter"), (3, "### Scene")])
+    assert theEvents[0] == (nwIndexEvent.REFS_CHANGED, aHandle, None)
+    assert theIndex.refIndex[aHandle]["T000003"]["tags"] == []
+    assert list(theIndex.novelIndex[aHandle]) == [1, 3]
+    assert "Jane" not in theIndex.tagRefs
+    assert "Janet" not in theIndex.tagRefs
+
+    # A full scan of the saved text agrees with the live updates
+    theEvents.clear()
+    assert theIndex.scanText(cHandle, "# Jane Smith\n@tag: Janet\n")
+    assert [e for e in theEvents if e[0] != nwIndexEvent.COUNTS_CHANGED] == []
+
+# END Test testCoreIndex_ScanMetaLines
+
+@pytest.mark.core
+def testCoreIndex_TagCompletions(nwMinimal, dummyGUI):
+    """Check the completion of tag names, and that the sorted names are
+    kept in sync with the tag index.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwMinimal)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    cHandle = theProject.newFile("People", nwItemClass.CHARACTER, "afb3043c7b2b3")
+    dHandle = theProject.newFile("Others", nwItemClass.CHARACTER, "afb3043c7b2b3")
+    wHandle = theProject.newFile("Places", nwItemClass.WORLD,     "9d5247ab588e0")
+
+    assert theIndex.scanText(cHandle, "# People\n@tag: jane\n# Jim\n@tag: Jim\n# Bob\n@tag: Bob\n")
+    assert theIndex.scanText(wHandle, "# Places\n@tag: Jungle\n")
+    assert theIndex.getTagCompletions("j", nwItemClass.CHARACTER) == ["jane", "Jim"]
+    assert theIndex.getTagCompletions("J", nwItemClass.CHARACTER, maxCount=1) == ["jane"]
+    assert theIndex.getTagCompletions("jo", nwItemClass.CHARACTER) == []
+    assert theIndex.getTagCompletions("j", nwItemClass.WORLD) == ["Jungle"]
+    assert theIndex.getTagCompletions("j", nwItemClass.PLOT) == []
+
+    # Moving a tag to another document keeps a single entry
+    assert theIndex.scanText(dHandle, "# Others\n@tag: Jim\n@tag: Joe\n")
+    assert theIndex.getTagCompletions("j", nwItemClass.CHARACTER) == ["jane", "Jim", "Joe"]
+
+    # Removing tags and documents removes the names
+    assert theIndex.scanMetaLines(cHandle, [(1, "# People"), (2, "@tag: Janet")])
+    assert theIndex.getTagCompletions("j", nwItemClass.CHARACTER) == ["Janet", "Jim", "Joe"]
+    theIndex.deleteHandle(dHandle)
+    assert theIndex.getTagCompletions("j", nwItemClass.CHARACTER) == ["Janet"]
+    theIndex.deleteHandle(wHandle)
+    assert "WORLD" not in theIndex.tagNames
+
+    # The names are rebuilt when the index is loaded
+    assert theIndex.saveIndex()
+    theIndex.tagNames = {}
+    assert theIndex.loadIndex()
+    assert theIndex.getTagCompletions("", nwItemClass.CHARACTER) == ["Janet"]
+
+# END Test testCoreIndex_TagCompletions
+
+@pytest.mark.core
+def testCoreIndex_QueryNovel(nwMinimal, dummyGUI):
+    """Check the filtering of the novel sections by their references.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwMinimal)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    nHandle = theProject.newFile("Scenes", nwItemClass.NOVEL,     "a508bb932959c")
+    cHandle = theProject.newFile("People", nwItemClass.CHARACTER, "afb3043c7b2b3")
+    pHandle = theProject.newFile("Plots",  nwItemClass.PLOT,      "7695ce551d265")
+
+    assert theIndex.scanText(cHandle, (
+        "# People\n@tag: Jane\n\n# John\n@tag: John\n\n# Jane Smith\n@tag: Jane Smith\n"
+    ))
+    assert theIndex.scanText(pHandle, "# Plots\n@tag: Main\n\n# Sub\n@tag: Sub\n")
+    assert theIndex.scanText(nHandle, (
+        "# Chapter\n\n"
+        "### One\n@pov: Jane\n@char: John\n@plot: Main\n\n"
+        "### Two\n@pov: John\n@char: Jane\n@plot: Sub\n\n"
+        "### Three\n@pov: Jane\n@char: John, Jane Smith\n@plot: Sub\n\n"
+    ))
+    tOne   = nHandle + ":T000003"
+    tTwo   = nHandle + ":T000008"
+    tThree = nHandle + ":T000013"
+
+    # Filters on keywords, any keyword, alternatives and exclusions
+    assert theIndex.queryNovel("") == theIndex.getNovelStructure()
+    assert theIndex.queryNovel("@pov:Jane") == [tOne, tThree]
+    assert theIndex.queryNovel("@pov: Jane @char:John") == [tOne, tThree]
+    assert theIndex.queryNovel("@pov:Jane @char:John -@plot:Main") == [tThree]
+    assert theIndex.queryNovel("Jane") == [tOne, tTwo, tThree]
+    assert theIndex.queryNovel("@plot:Main,Sub -John") == []
+    assert theIndex.queryNovel("@char:\"Jane Smith\"") == [tThree]
+    assert theIndex.queryNovel("@char:Nobody") == []
+
+    # Invalid queries
+    assert theIndex.queryNovel("@tag:Jane") is None
+    assert theIndex.queryNovel("@pov:") is None
+    assert theIndex.queryNovel("@pov:\"Jane") is None
+
+    # Changes to the references update the lookup
+    assert theIndex.scanMetaLines(nHandle, [
+        (1, "# Chapter"), (3, "### One"), (4, "@pov: John"),
+        (8, "### Two"), (9, "@pov: John"), (13, "### Three"), (14, "@pov: Jane"),
+    ])
+    assert theIndex.queryNovel("@pov:John") == [tOne, tTwo]
+    theIndex.deleteHandle(nHandle)
+    assert theIndex.queryNovel("@pov:John") == []
+
+# END Test testCoreIndex_QueryNovel
+
+@pytest.mark.core
+def testCoreIndex_RenameTag(nwMinimal, dummyGUI):
+    """Check the functions used to rename a tag.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwMinimal)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    nHandle = theProject.newFile("Scenes", nwItemClass.NOVEL,     "a508bb932959c")
+    cHandle = theProject.newFile("People", nwItemClass.CHARACTER, "afb3043c7b2b3")
+
+    cText = "# People\n@tag: Jane\n\n# John\n@tag: John\n"
+    nText = (
+        "# Chapter\n\n"
+        "### One\n@pov: Jane\n@char: John, Jane\n\n"
+        "### Two\n@pov: John\n@char: Jane Smith\n\n"
+    )
+    assert theIndex.scanText(cHandle, cText)
+    assert theIndex.scanText(nHandle, nText)
+
+    # Lines of a tag
+    assert theIndex.getTagLines("Jane") == {cHandle: [2], nHandle: [4, 5]}
+    assert theIndex.getTagLines("John") == {cHandle: [5], nHandle: [5, 8]}
+    assert theIndex.getTagLines("Nobody") == {}
+
+    # Replace on a single line
+    assert NWIndex.replaceTag("@char: John, Jane", "Jane", "Janet") == "@char: John, Janet"
+    assert NWIndex.replaceTag("@char:Jane,Jane", "Jane", "J") == "@char:J,J"
+    assert NWIndex.replaceTag("@char: Jane Smith", "Jane", "Janet") == "@char: Jane Smith"
+    assert NWIndex.replaceTag("Jane", "Jane", "Janet") == "Jane"
+
+    # Replace on the indexed lines only
+    newText = NWIndex.replaceTagLines(nText, [4, 5], "Jane", "Janet")
+    assert newText == nText.replace("pov: Jane", "pov: Janet").replace("John, Jane", "John, Janet")
+
+    # If the lines are off, all @ lines are checked instead
+    assert NWIndex.replaceTagLines(nText, [3, 5], "Jane", "Janet") == newText
+    assert NWIndex.replaceTagLines(nText, [99], "Jane", "Janet") == newText
+
+    # Batch scan of the changed texts
+    assert theIndex.scanTexts({
+        cHandle: NWIndex.replaceTagLines(cText, [2], "Jane", "Janet"),
+        nHandle: newText,
+    }) == 2
+    assert "Jane" not in theIndex.tagIndex
+    assert theIndex.getTagLines("Janet") == {cHandle: [2], nHandle: [4, 5]}
+    assert theIndex.getTagLines("Jane") == {}
+
+# END Test testCoreIndex_RenameTag
+
+@pytest.mark.core
+def testCoreIndex_RefStats(monkeypatch, nwMinimal, dummyGUI):
+    """Check the statistics of the tags referenced together.
+    """
+    theProject = NWProject(dummyGUI)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwMinimal)
+
+    theIndex = NWIndex(theProject, dummyGUI)
+    nHandle = theProject.newFile("Scenes", nwItemClass.NOVEL,     "a508bb932959c")
+    cHandle = theProject.newFile("People", nwItemClass.CHARACTER, "afb3043c7b2b3")
+
+    assert theIndex.scanText(cHandle, (
+        "# People\n@tag: Jane\n\n# John\n@tag: John\n\n# Mary\n@tag: Mary\n"
+    ))
+    assert theIndex.scanText(nHandle, (
+        "### Prologue\n@pov: Mary\n\n"
+        "## Chapter One\n\n"
+        "### One\n@pov: Jane\n@char: John, Jane\n@plot: Main\n\n"
+        "### Two\n@pov: John\n@char: Jane, Mary\n\n"
+        "## Chapter Two\n@char: John\n\n"
+        "### Three\n@pov: Jane\n@char: John\n\n"
+    ))
+
+    for useNumPy in (False, True):
+        monkeypatch.setattr(theIndex.mainConf, "hasNumPy", useNumPy)
+        theIndex._refStats = {}
+        theStats = theIndex.getRefStats()
+        assert theStats.theTags == ["Jane", "John", "Mary"]
+        assert theStats.theChapters == [0, 1, 4]
+        assert theStats.tagCount == [3, 4, 2]
+        assert theStats.getPairs() == [
+            ("Jane", "John", 3), ("Jane", "Mary", 1), ("John", "Mary", 1)
+        ]
+        assert theStats.getPairs(maxCount=1) == [("Jane", "John", 3)]
+        assert theStats.getPartners("Mary") == {"Jane": 1, "John": 1}
+        assert theStats.getPartners("Nobody") == {}
+        assert theStats.getTimeline("John") == [0, 2, 2]
+        assert theStats.getTimeline("Mary") == [1, 1, 0]
+        assert theStats.getTimeline("Nobody") == [0, 0, 0]
+
+    # Other classes, and an empty novel
+    assert theIndex.getRefStats(itemClass=nwItemClass.PLOT).theTags == ["Main"]
+    assert theIndex.getRefStats(itemClass=nwItemClass.PLOT).getPairs() == []
+    assert theIndex.getRefStats() is theIndex.getRefStats()
+
+    theIndex.deleteHandle(nHandle)
+    theStats = theIndex.getRefStats()
+    assert theStats.theTags == []
+    assert theStats.getPairs() == []
+
+# END Test testCoreIndex_RefStats
+
 @pytest.mark.core
 def testCoreIndex_ExtractData(nwMinimal, dummyGUI):
     """Check the index data extraction functions.
@@ -471,6 +1821,45 @@ def testCoreIndex_ExtractData(nwMinimal, dummyGUI):
     # The character file should have a record of the reference from the novel file
     theRefs = theIndex.getBackReferenceList(cHandle)
     assert theRefs == {nHandle: "T000001"}
+    assert theIndex.tagRefs == {"Jane": {nHandle: "T000001"}}
+
+    # The first title referring to the tag should be returned
+    assert theIndex.scanText(nHandle, (
+        "# Hello World!\n\n"
+        "## Hello Again!\n"
+        "@pov: Jane\n\n"
+        "## Hello Once More!\n"
+        "@char: Jane\n"
+    ))
+    assert theIndex.getBackReferenceList(cHandle) == {nHandle: "T000003"}
+
+    # Removing the reference should remove the back reference
+    assert theIndex.scanText(nHandle, (
+        "# Hello World!\n"
+    ))
+    assert theIndex.getBackReferenceList(cHandle) == {}
+    assert theIndex.tagRefs == {}
+
+    # Deleting the referring file should also remove the back reference
+    assert theIndex.scanText(nHandle, (
+        "# Hello World!\n"
+        "@pov: Jane\n"
+        "@char: Jane\n\n"
+        "% this is a comment\n\n"
+        "This is a story about Jane Smith.\n\n"
+        "Well, not really.\n"
+    ))
+    assert theIndex.getBackReferenceList(cHandle) == {nHandle: "T000001"}
+    theIndex.deleteHandle(nHandle)
+    assert theIndex.getBackReferenceList(cHandle) == {}
+    assert theIndex.scanText(nHandle, (
+        "# Hello World!\n"
+        "@pov: Jane\n"
+        "@char: Jane\n\n"
+        "% this is a comment\n\n"
+        "This is a story about Jane Smith.\n\n"
+        "Well, not really.\n"
+    ))
 
     ##
     #  getTagSource
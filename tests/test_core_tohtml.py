@@ -3,8 +3,12 @@
 """
 
 import pytest
+import os
+import json
 
 from nw.core import NWProject, NWIndex, ToHtml
+from nw.core.tohtml import _convertDocFile
+from nw.constants import nwFiles, nwItemClass, nwItemType
 
 @pytest.mark.core
 def testCoreToHtml_Format(dummyGUI):
@@ -370,4 +374,207 @@ def testCoreToHtml_Methods(dummyGUI):
     theHtml.setStyles(False)
     assert theHtml.getStyleSheet() == []
 
+    # Iterators
+    # =========
+
+    theHtml.setPreview(False, False)
+    theHtml.theText = "# Title\n\nSome **bold** text\\*\n\n% A comment\n"
+    theHtml.doAutoReplace()
+    theHtml.tokenizeText()
+    theTokens = theHtml.theTokens
+    assert list(theHtml.iterTokens()) == theTokens
+
 # END Test testCoreToHtml_Methods
+
+@pytest.mark.core
+def testCoreToHtml_ConvertDocFiles(monkeypatch, nwLipsum, dummyGUI):
+    """Test that converting the documents of a project one at a time, and
+    in one or more worker processes, gives the same result.
+    """
+    theProject = NWProject(dummyGUI)
+    dummyGUI.theIndex = NWIndex(theProject, dummyGUI)
+    assert theProject.openProject(nwLipsum)
+
+    # A heading interrupting a paragraph cannot be split from it
+    with open(os.path.join(nwLipsum, "content", "88243afbe5ed8.nwd"), mode="a") as outFile:
+        outFile.write("\nSome text\n### Next Scene\nMore text\n")
+
+    theItems = [
+        tItem for tItem in theProject.projTree
+        if tItem.itemType == nwItemType.FILE and tItem.itemClass != nwItemClass.TRASH
+    ]
+
+    def makeHtml(fmtScene):
+        theHtml = ToHtml(theProject, dummyGUI)
+        theHtml.setChapterFormat(r"Chapter %chw%: %title%")
+        theHtml.setSceneFormat(fmtScene, fmtScene == "")
+        theHtml.setSectionFormat(r"Section: %title%", False)
+        theHtml.setComments(True)
+        theHtml.setLinkHeaders(True)
+        return theHtml
+
+    def buildSerial(theHtml):
+        theResult = []
+        for tItem in theItems:
+            theHtml.setText(tItem.itemHandle)
+            theHtml.doAutoReplace()
+            theHtml.tokenizeText()
+            theHtml.doHeaders()
+            theHtml.doConvert()
+            theHtml.doPostProcessing()
+            theResult.append((theHtml.getResult(), theHtml.getFilteredMarkdown()))
+        return theResult
+
+    def buildJobs(theHtml, numWorkers):
+        theResult = []
+        theJobs = theHtml.makeConvertJobs(theItems)
+        for tHandle, theRecord in theHtml.convertDocFiles(theJobs, numWorkers=numWorkers):
+            theHtml.applyConverted(tHandle, theRecord)
+            theResult.append((theHtml.getResult(), theHtml.getFilteredMarkdown()))
+        return theResult
+
+    for fmtScene in (r"Scene %sca%: %title%", "* * *", ""):
+        theResult = buildSerial(makeHtml(fmtScene))
+        assert buildJobs(makeHtml(fmtScene), 1) == theResult
+        assert buildJobs(makeHtml(fmtScene), 2) == theResult
+
+    # If the worker pool fails, the documents are converted serially
+    def doPanic(*args, **kwargs):
+        raise Exception
+
+    with monkeypatch.context() as mp:
+        mp.setattr("nw.core.tohtml.multiprocessing.get_context", doPanic)
+        assert buildJobs(makeHtml("* * *"), 2) == buildSerial(makeHtml("* * *"))
+
+    # A document that cannot be read has no record
+    badFile = os.path.join(nwLipsum, "content", "0000000000000.nwd")
+    with open(badFile, mode="wb") as outFile:
+        outFile.write(b"\xff\xfe\xfa")
+
+    theHtml = makeHtml("")
+    theJob = list(theHtml.makeConvertJobs(theItems[:1])[0])
+    theJob[0] = "0000000000000"
+    theJob[1] = badFile
+    assert list(theHtml.convertDocFiles([tuple(theJob)])) == [("0000000000000", None)]
+
+    assert theProject.closeProject()
+
+# END Test testCoreToHtml_ConvertDocFiles
+
+@pytest.mark.core
+def testCoreToHtml_ConvertCached(monkeypatch, nwLipsum, dummyGUI):
+    """Test that converting with a cache of documents only converts the
+    documents that have changed, and gives the same result.
+    """
+    theProject = NWProject(dummyGUI)
+    dummyGUI.theIndex = NWIndex(theProject, dummyGUI)
+    assert theProject.openProject(nwLipsum)
+
+    theItems = [
+        tItem for tItem in theProject.projTree
+        if tItem.itemType == nwItemType.FILE and tItem.itemClass != nwItemClass.TRASH
+    ]
+
+    convHandles = []
+
+    def countConvert(theJob):
+        convHandles.append(theJob[0])
+        return _convertDocFile(theJob)
+
+    monkeypatch.setattr("nw.core.tohtml._convertDocFile", countConvert)
+
+    cacheDir = os.path.join(theProject.projCache, nwFiles.BUILD_DIR)
+    cacheFile = os.path.join(cacheDir, "88243afbe5ed8.json")
+
+    def buildCached(docCache, fmtScene=r"Scene %sca%: %title%"):
+        convHandles.clear()
+        theHtml = ToHtml(theProject, dummyGUI)
+        theHtml.setSceneFormat(fmtScene, False)
+        theResult = []
+        for tHandle, theRecord in theHtml.convertCached(theItems, docCache, cacheDir):
+            theHtml.applyConverted(tHandle, theRecord)
+            theResult.append((theHtml.getResult(), theHtml.getFilteredMarkdown()))
+        assert theHtml.numConverted == len(convHandles)
+        return theResult
+
+    # All documents are converted the first time
+    docCache = {}
+    theResult = buildCached(docCache)
+    assert convHandles == [tItem.itemHandle for tItem in theItems]
+    assert len(docCache["keys"]) == len(theItems)
+
+    # Only the keys are kept in memory, and each record has its own file
+    assert set(docCache) == {"cache", "keys"}
+    assert sorted(os.listdir(cacheDir)) == sorted(
+        tItem.itemHandle+".json" for tItem in theItems
+    )
+
+    # None are converted again, also after saving the cache as JSON
+    assert buildCached(docCache) == theResult
+    assert convHandles == []
+
+    docCache = json.loads(json.dumps(docCache))
+    assert buildCached(docCache) == theResult
+    assert convHandles == []
+
+    # A changed document is converted again
+    with open(os.path.join(nwLipsum, "content", "88243afbe5ed8.nwd"), mode="a") as outFile:
+        outFile.write("\n### Another Scene\n")
+
+    newResult = buildCached(docCache)
+    assert convHandles == ["88243afbe5ed8"]
+    assert newResult != theResult
+
+    # A missing or outdated record file is converted again
+    os.unlink(cacheFile)
+    assert buildCached(docCache) == newResult
+    assert convHandles == ["88243afbe5ed8"]
+    assert os.path.isfile(cacheFile)
+
+    with open(cacheFile, mode="r", encoding="utf8") as inFile:
+        theData = json.load(inFile)
+    theData["cache"] = "0"
+    with open(cacheFile, mode="w", encoding="utf8") as outFile:
+        json.dump(theData, outFile)
+    assert buildCached(docCache) == newResult
+    assert convHandles == ["88243afbe5ed8"]
+    assert buildCached(docCache) == newResult
+    assert convHandles == []
+
+    # Closing the generator early keeps the cached documents
+    theHtml = ToHtml(theProject, dummyGUI)
+    theHtml.setSceneFormat(r"Scene %sca%: %title%", False)
+    theResults = theHtml.convertCached(theItems, docCache, cacheDir)
+    next(theResults)
+    theResults.close()
+    assert len(docCache["keys"]) == len(theItems)
+
+    # Changed settings convert all documents again
+    buildCached(docCache, fmtScene="* * *")
+    assert convHandles == [tItem.itemHandle for tItem in theItems]
+    assert buildCached(docCache) == newResult
+    assert len(convHandles) == len(theItems)
+
+    # A cache from another version converts all documents again
+    cacheId = docCache["cache"]
+    monkeypatch.setattr("nw.__version__", "0.0.0")
+    assert buildCached(docCache) == newResult
+    assert len(convHandles) == len(theItems)
+    assert buildCached(docCache) == newResult
+    assert convHandles == []
+    assert docCache["cache"] != cacheId
+
+    monkeypatch.setattr(ToHtml, "CACHE_VERSION", ToHtml.CACHE_VERSION + 1)
+    assert buildCached(docCache) == newResult
+    assert len(convHandles) == len(theItems)
+
+    # The records of documents no longer in the build are deleted
+    theItems = [tItem for tItem in theItems if tItem.itemHandle != "88243afbe5ed8"]
+    buildCached(docCache)
+    assert convHandles == []
+    assert "88243afbe5ed8" not in docCache["keys"]
+    assert not os.path.isfile(cacheFile)
+
+    assert theProject.closeProject()
+
+# END Test testCoreToHtml_ConvertCached
@@ -344,6 +344,24 @@ def testCoreToken_Tokenize(dummyGUI):
         "Some **nested bold and _italic_ and ~~strikethrough~~ text** here\n\n"
     )
 
+    # Overlapping emphasis of the same kind is skipped
+    theToken.theText = "Some _italic _text_ here_ and \\_escaped_ text\n"
+    theToken.tokenizeText()
+    assert theToken.theTokens[0][3] == [
+        [5,  1, Tokenizer.FMT_I_B],
+        [18, 1, Tokenizer.FMT_I_E],
+    ]
+
+    # Word characters are ASCII only, and the positions are characters
+    theToken.theText = "Æ_italic_ and \U0001F600 **bold** text\n"
+    theToken.tokenizeText()
+    assert theToken.theTokens[0][3] == [
+        [1,  1, Tokenizer.FMT_I_B],
+        [8,  1, Tokenizer.FMT_I_E],
+        [16, 2, Tokenizer.FMT_B_B],
+        [22, 2, Tokenizer.FMT_B_E],
+    ]
+
 # END Test testCoreToken_Tokenize
 
 @pytest.mark.core
@@ -4,7 +4,7 @@
 
 import pytest
 
-from nw.core.tools import countWords, numberToRoman, numberToWord
+from nw.core.tools import countWords, countSections, numberToRoman, numberToWord
 
 @pytest.mark.core
 def testCoreTools_CountWords():
@@ -37,6 +37,44 @@ def testCoreTools_CountWords():
 
 # END Test testCoreTools_CountWords
 
+@pytest.mark.core
+def testCoreTools_CountSections():
+    """Test the section word counter against the word counter.
+    """
+    testText = (
+        "Text before the first heading.\n"
+        "\n"
+        "# Heading One\n"
+        "@tag: value\n"
+        "\n"
+        "The first paragraph.\n"
+        "   \n"
+        "## Heading Two\n"
+        "% A comment that should not be counted.\n"
+        "The second paragraph.\n"
+        "#Not a heading\n"
+        "\n"
+        "#### \n"
+        "\n"
+        "### Heading Three\n"
+        "\n"
+        "Dashes\u2013and even longer\u2014dashes."
+    )
+    theLines = testText.splitlines()
+    theCounts, theSections = countSections(theLines)
+    assert theCounts == countWords(testText)
+    assert list(theSections.keys()) == [3, 8, 13, 15]
+
+    secStart = [1] + list(theSections.keys()) + [len(theLines) + 1]
+    for i in range(1, len(secStart) - 1):
+        secText = "\n".join(theLines[secStart[i]-1:secStart[i+1]-1])
+        assert theSections[secStart[i]] == countWords(secText)
+
+    assert theSections[15] == (43, 7, 1)
+    assert countSections([]) == ((0, 0, 0), {})
+
+# END Test testCoreTools_CountSections
+
 @pytest.mark.core
 def testCoreTools_RomanNumbers():
     """Test conversion of integers to Roman numbers.
@@ -316,8 +316,18 @@ def testCoreTree_Reorder(dummyGUI, dummyItems):
     assert aHandle != bHandle
 
     assert theTree.handles() == aHandle
+    treeVersion = theTree.treeVersion()
     theTree.setOrder(bHandle)
     assert theTree.handles() == bHandle
+    assert theTree.treeVersion() > treeVersion
+
+    # Changing the export flag of an item changes the project's tree
+    nwItem = dummyItems[3][2]
+    treeVersion = nwItem.theProject.projTree.treeVersion()
+    nwItem.setExported(True)
+    assert nwItem.theProject.projTree.treeVersion() == treeVersion
+    nwItem.setExported(False)
+    assert nwItem.theProject.projTree.treeVersion() > treeVersion
 
     theTree.setOrder(bHandle + ["dummy"])
     assert theTree.handles() == bHandle
@@ -3,6 +3,7 @@
 """
 
 import pytest
+import json
 import os
 
 from shutil import copyfile
@@ -12,6 +13,7 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QAction, QMessageBox, QFileDialog
 
 from nw.gui import GuiBuildNovel
+from nw.core.tohtml import _convertDocFile
 
 keyDelay = 2
 typeDelay = 1
@@ -161,13 +163,75 @@ def testGuiBuild_Tool(qtbot, monkeypatch, nwGUI, nwLipsum, refDir, outDir):
     copyfile(projFile, testFile)
     assert cmpFiles(testFile, compFile, [8])
 
-    assert nwBuild._saveDocument(nwBuild.FMT_JSON_M)
+    # The build time is the time of the build made when saving
+    with monkeypatch.context() as mp:
+        mp.setattr("nw.gui.build.time", lambda: 1234.5)
+        assert nwBuild._saveDocument(nwBuild.FMT_JSON_M)
     projFile = os.path.join(nwLipsum, "Lorem Ipsum.json")
     testFile = os.path.join(outDir, "guiBuild_Tool_Step4M_Lorem_Ipsum.json")
     compFile = os.path.join(refDir, "guiBuild_Tool_Step4M_Lorem_Ipsum.json")
     copyfile(projFile, testFile)
     assert cmpFiles(testFile, compFile, [8])
 
+    with open(projFile, mode="r", encoding="utf8") as inFile:
+        assert json.load(inFile)["meta"]["buildTime"] == 1234
+
+    # A build that fails when saving leaves the old file in place
+    with open(projFile, mode="r", encoding="utf8") as inFile:
+        jsonText = inFile.read()
+
+    with monkeypatch.context() as mp:
+        mp.setattr(QMessageBox, "critical", lambda *args: QMessageBox.Yes)
+        tItem = next(iter(nwGUI.theProject.projTree))
+        mp.setattr(nwBuild, "_iterBuildDocs", lambda makeHtml: iter([(tItem, False)]))
+        assert not nwBuild._saveDocument(nwBuild.FMT_JSON_M)
+
+    with open(projFile, mode="r", encoding="utf8") as inFile:
+        assert inFile.read() == jsonText
+    assert not os.path.isfile(projFile + "~")
+
+    # A result too big for the preview can still be saved
+    with monkeypatch.context() as mp:
+        mp.setattr("nw.gui.build.nwConst.MAX_BUILDSIZE", 1000)
+        qtbot.mouseClick(nwBuild.buildNovel, Qt.LeftButton)
+        assert nwBuild.htmlText == []
+        assert nwBuild.nwdText == []
+
+        assert nwBuild._saveDocument(nwBuild.FMT_HTM)
+        projFile = os.path.join(nwLipsum, "Lorem Ipsum.htm")
+        testFile = os.path.join(outDir, "guiBuild_Tool_Step4B_Lorem_Ipsum.htm")
+        compFile = os.path.join(refDir, "guiBuild_Tool_Step4_Lorem_Ipsum.htm")
+        copyfile(projFile, testFile)
+        assert cmpFiles(testFile, compFile)
+
+        assert nwBuild._saveDocument(nwBuild.FMT_JSON_M)
+        projFile = os.path.join(nwLipsum, "Lorem Ipsum.json")
+        testFile = os.path.join(outDir, "guiBuild_Tool_Step4B_Lorem_Ipsum.json")
+        compFile = os.path.join(refDir, "guiBuild_Tool_Step4M_Lorem_Ipsum.json")
+        copyfile(projFile, testFile)
+        assert cmpFiles(testFile, compFile, [8])
+
+    qtbot.mouseClick(nwBuild.buildNovel, Qt.LeftButton)
+    assert nwBuild.htmlText != []
+
+    # Building in worker processes gives the same result
+    htmlText = nwBuild.htmlText
+    nwdText = nwBuild.nwdText
+    with monkeypatch.context() as mp:
+        mp.setattr("nw.gui.build.nwConst.MIN_PARALLEL_BUILD", 1)
+        mp.setattr("nw.core.tohtml.os.cpu_count", lambda: 2)
+        nwBuild.docCache = {}
+        qtbot.mouseClick(nwBuild.buildNovel, Qt.LeftButton)
+        assert nwBuild.htmlText == htmlText
+        assert nwBuild.nwdText == nwdText
+
+        assert nwBuild._saveDocument(nwBuild.FMT_HTM)
+        projFile = os.path.join(nwLipsum, "Lorem Ipsum.htm")
+        testFile = os.path.join(outDir, "guiBuild_Tool_Step4P_Lorem_Ipsum.htm")
+        compFile = os.path.join(refDir, "guiBuild_Tool_Step4_Lorem_Ipsum.htm")
+        copyfile(projFile, testFile)
+        assert cmpFiles(testFile, compFile)
+
     # Save other file types handled by Qt
     # We assume the export itself by the Qt library works, so we just
     # check that novelWriter successfully writes the files.
@@ -204,6 +268,25 @@ def testGuiBuild_Tool(qtbot, monkeypatch, nwGUI, nwLipsum, refDir, outDir):
     assert nwBuild.nwdText   == nwdText
     assert nwBuild.buildTime == buildTime
 
+    # Only the documents changed since the last build are converted
+    convHandles = []
+
+    def countConvert(theJob):
+        convHandles.append(theJob[0])
+        return _convertDocFile(theJob)
+
+    monkeypatch.setattr("nw.core.tohtml._convertDocFile", countConvert)
+    qtbot.mouseClick(nwBuild.buildNovel, Qt.LeftButton)
+    assert convHandles == []
+    assert nwBuild.htmlText == htmlText
+
+    with open(os.path.join(nwLipsum, "content", "88243afbe5ed8.nwd"), mode="a") as outFile:
+        outFile.write("\n### Another Scene\n")
+
+    qtbot.mouseClick(nwBuild.buildNovel, Qt.LeftButton)
+    assert convHandles == ["88243afbe5ed8"]
+    assert nwBuild.htmlText != htmlText
+
     nwBuild._doClose()
 
     # qtbot.stopForInteraction()
@@ -10,8 +10,9 @@ from tools import cmpFiles
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QTextCursor
-from PyQt5.QtWidgets import QAction, QMessageBox
+from PyQt5.QtWidgets import qApp, QAction, QMessageBox, QInputDialog
 
+from nw.core import NWDoc
 from nw.constants import nwItemType, nwDocAction
 
 keyDelay = 2
@@ -24,6 +25,7 @@ def testGuiEditor_Main(qtbot, monkeypatch, nwGUI, fncDir, fncProj, refDir, outDi
     """
     # Block message box
     monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.Yes)
+    monkeypatch.setattr(QMessageBox, "information", lambda *args: QMessageBox.Yes)
 
     # Create new, save, close project
     nwGUI.theProject.projTree.setSeed(42)
@@ -112,6 +114,39 @@ def testGuiEditor_Main(qtbot, monkeypatch, nwGUI, fncDir, fncProj, refDir, outDi
         qtbot.keyClick(nwGUI.docEditor, c, delay=typeDelay)
     qtbot.keyClick(nwGUI.docEditor, Qt.Key_Return, delay=keyDelay)
 
+    # The tag is indexed as it is typed, before the document is saved
+    qApp.processEvents()
+    assert nwGUI.docEditor.docChanged
+    tHandle = nwGUI.docEditor.theHandle
+    assert nwGUI.theIndex.tagIndex["Jane"] == [3, tHandle, "CHARACTER", "T000001"]
+    assert list(nwGUI.theIndex.noteIndex[tHandle]) == [1]
+
+    # Adding lines before the heading moves the heading and the tag
+    nwGUI.docEditor.setCursorPosition(0)
+    qtbot.keyClick(nwGUI.docEditor, Qt.Key_Return, delay=keyDelay)
+    qtbot.keyClick(nwGUI.docEditor, Qt.Key_Return, delay=keyDelay)
+    qApp.processEvents()
+    assert nwGUI.docEditor.metaRange is None
+    assert nwGUI.theIndex.tagIndex["Jane"] == [5, tHandle, "CHARACTER", "T000003"]
+    assert list(nwGUI.theIndex.noteIndex[tHandle]) == [3]
+    assert list(nwGUI.theIndex.refIndex[tHandle]) == ["T000000", "T000003"]
+
+    qtbot.keyClick(nwGUI.docEditor, Qt.Key_Backspace, delay=keyDelay)
+    qtbot.keyClick(nwGUI.docEditor, Qt.Key_Backspace, delay=keyDelay)
+    qApp.processEvents()
+    assert nwGUI.theIndex.tagIndex["Jane"] == [3, tHandle, "CHARACTER", "T000001"]
+    assert list(nwGUI.theIndex.noteIndex[tHandle]) == [1]
+
+    # A rebuilt index scans the saved document, so the unsaved text is
+    # sent to the index again in full
+    assert nwGUI.rebuildIndex(beQuiet=True)
+    assert nwGUI.waitForIndex()
+    qApp.processEvents()
+    assert nwGUI.docEditor.metaSynced
+    assert nwGUI.theIndex.tagIndex["Jane"] == [3, tHandle, "CHARACTER", "T000001"]
+    assert list(nwGUI.theIndex.noteIndex[tHandle]) == [1]
+    nwGUI.docEditor.setCursorPosition(nwGUI.docEditor.qDocument.characterCount() - 1)
+
     # Add a Plot File
     nwGUI.setFocus(1)
     nwGUI.treeView.clearSelection()
@@ -271,6 +306,8 @@ def testGuiEditor_Main(qtbot, monkeypatch, nwGUI, fncDir, fncProj, refDir, outDi
     assert not nwGUI.docEditor.docChanged
     qtbot.wait(stepDelay)
     nwGUI.rebuildIndex()
+    assert nwGUI.waitForIndex()
+    assert not nwGUI.isIndexing
     qtbot.wait(stepDelay)
 
     # Open and view the edited document
@@ -504,3 +541,121 @@ def testGuiEditor_Search(qtbot, monkeypatch, nwGUI, nwLipsum):
     # qtbot.stopForInteraction()
 
 # END Test testGuiEditor_Search
+
+@pytest.mark.gui
+def testGuiEditor_TagCompletion(qtbot, monkeypatch, nwGUI, nwLipsum):
+    """Test the completion of tags after reference keywords.
+    """
+    # Block message box
+    monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.Yes)
+    monkeypatch.setattr(QMessageBox, "information", lambda *args: QMessageBox.Yes)
+
+    # Open project
+    nwGUI.theProject.projTree.setSeed(42)
+    assert nwGUI.openProject(nwLipsum)
+    assert nwGUI.waitForIndex()
+    assert nwGUI.openDocument("88243afbe5ed8")
+    thePopup = nwGUI.docEditor.tagCompleter.popup()
+
+    # Start a new line at the end of the document
+    nwGUI.setFocus(2)
+    theCursor = nwGUI.docEditor.textCursor()
+    theCursor.movePosition(QTextCursor.End)
+    nwGUI.docEditor.setTextCursor(theCursor)
+    qtbot.keyClick(nwGUI.docEditor, Qt.Key_Return, delay=keyDelay)
+
+    # No completions for the tag keyword, or a tag of the wrong class
+    for c in "@tag: B":
+        qtbot.keyClick(nwGUI.docEditor, c, delay=typeDelay)
+    assert not thePopup.isVisible()
+    for i in range(6):
+        qtbot.keyClick(nwGUI.docEditor, Qt.Key_Backspace, delay=typeDelay)
+    for c in "plot: B":
+        qtbot.keyClick(nwGUI.docEditor, c, delay=typeDelay)
+    assert not thePopup.isVisible()
+
+    # A character reference is completed, ignoring case
+    for i in range(7):
+        qtbot.keyClick(nwGUI.docEditor, Qt.Key_Backspace, delay=typeDelay)
+    for c in "char: b":
+        qtbot.keyClick(nwGUI.docEditor, c, delay=typeDelay)
+    assert thePopup.isVisible()
+    assert nwGUI.docEditor.tagCompleter.model().stringList() == ["Bod"]
+    qtbot.keyClick(thePopup, Qt.Key_Return, delay=keyDelay)
+    assert not thePopup.isVisible()
+    assert nwGUI.docEditor.textCursor().block().text() == "@char: Bod"
+
+    # The next value after a comma is also completed
+    for c in ", b":
+        qtbot.keyClick(nwGUI.docEditor, c, delay=typeDelay)
+    assert thePopup.isVisible()
+    qtbot.keyClick(thePopup, Qt.Key_Escape, delay=keyDelay)
+    assert not thePopup.isVisible()
+    assert nwGUI.docEditor.textCursor().block().text() == "@char: Bod, b"
+
+    # A complete tag is not offered again
+    qtbot.keyClick(nwGUI.docEditor, Qt.Key_Backspace, delay=typeDelay)
+    for c in "Bod":
+        qtbot.keyClick(nwGUI.docEditor, c, delay=typeDelay)
+    assert not thePopup.isVisible()
+
+    # qtbot.stopForInteraction()
+
+# END Test testGuiEditor_TagCompletion
+
+@pytest.mark.gui
+def testGuiEditor_RenameTag(qtbot, monkeypatch, nwGUI, nwLipsum):
+    """Test renaming a tag from the editor.
+    """
+    # Block message box
+    monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.Yes)
+    monkeypatch.setattr(QMessageBox, "information", lambda *args: QMessageBox.Yes)
+    monkeypatch.setattr(QMessageBox, "critical", lambda *args: QMessageBox.Yes)
+
+    # Open project
+    nwGUI.theProject.projTree.setSeed(42)
+    assert nwGUI.openProject(nwLipsum)
+    assert nwGUI.openDocument("88243afbe5ed8")
+    assert nwGUI.viewDocument("4c4f28287af27")
+
+    # Find the tag under the cursor
+    theBlock = nwGUI.docEditor.document().findBlockByNumber(2)
+    assert theBlock.text() == "@pov: Bod"
+    theCursor = QTextCursor(theBlock)
+    assert nwGUI.docEditor._tagUnderCursor(theCursor) is None
+    theCursor.setPosition(theBlock.position() + 7)
+    assert nwGUI.docEditor._tagUnderCursor(theCursor) == "Bod"
+
+    # Invalid new names
+    assert not nwGUI.renameTag("Bod", "Bod")
+    assert not nwGUI.renameTag("Bod", " ")
+    assert not nwGUI.renameTag("Bod", "Bo, d")
+    assert not nwGUI.renameTag("Bod", "Europe")
+    assert not nwGUI.renameTag("Nobody", "Bodo")
+
+    # Rename the tag via the dialog
+    monkeypatch.setattr(QInputDialog, "getText", lambda *args, **kwargs: ("Bodo", False))
+    assert not nwGUI.docEditor._renameTag("Bod")
+    monkeypatch.setattr(QInputDialog, "getText", lambda *args, **kwargs: (" Bodo ", True))
+    assert nwGUI.docEditor._renameTag("Bod")
+
+    assert "Bod" not in nwGUI.theIndex.tagIndex
+    assert "Bodo" in nwGUI.theIndex.tagIndex
+    assert nwGUI.theIndex.getTagLines("Bod") == {}
+    assert len(nwGUI.theIndex.getTagLines("Bodo")) == 8
+
+    # The open document is changed and saved, and can be undone
+    assert theBlock.text() == "@pov: Bodo"
+    assert not nwGUI.docEditor.docChanged
+    theDoc = NWDoc(nwGUI.theProject, nwGUI)
+    assert "@pov: Bodo\n" in theDoc.openDocument("88243afbe5ed8")
+    assert "@pov: Bodo\n" in theDoc.openDocument("fb609cd8319dc")
+    assert "@tag: Bodo\n" in theDoc.openDocument("4c4f28287af27")
+    assert "Tag: Bodo" in nwGUI.docViewer.toPlainText()
+
+    nwGUI.docEditor.docAction(nwDocAction.UNDO)
+    assert theBlock.text() == "@pov: Bod"
+
+    # qtbot.stopForInteraction()
+
+# END Test testGuiEditor_RenameTag
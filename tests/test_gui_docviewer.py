@@ -20,18 +20,60 @@ def testGuiViewer_Main(qtbot, monkeypatch, nwGUI, nwLipsum):
     """
     # Block message box
     monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.Yes)
+    monkeypatch.setattr(QMessageBox, "information", lambda *args: QMessageBox.Yes)
 
     # Open project
     nwGUI.theProject.projTree.setSeed(42)
     assert nwGUI.openProject(nwLipsum)
 
-    # Rebuild the index as it isn't automatically copied
+    # The index isn't copied, so it is rebuilt in the background on open
+    assert nwGUI.waitForIndex()
+    assert nwGUI.theIndex.tagIndex != {}
+    assert nwGUI.theIndex.refIndex != {}
+
+    # Rebuild the index
+    nwGUI.theIndex.clearIndex()
+    assert nwGUI.theIndex.tagIndex == {}
+    assert nwGUI.theIndex.refIndex == {}
+
+    # A second rebuild restarts the running one, and a cancelled
+    # rebuild leaves the index as it was
+    assert nwGUI.rebuildIndex()
+    firstBuilder = nwGUI.idxBuilder
+    assert nwGUI.rebuildIndex()
+    assert nwGUI.idxBuilder is not firstBuilder
+    assert nwGUI.cancelIndexing()
+    assert not nwGUI.cancelIndexing()
+    assert not nwGUI.waitForIndex()
+    qApp.processEvents()
+    assert not nwGUI.isIndexing
     assert nwGUI.theIndex.tagIndex == {}
     assert nwGUI.theIndex.refIndex == {}
+
     nwGUI.mainMenu.aRebuildIndex.activate(QAction.Trigger)
+    assert nwGUI.waitForIndex()
+    assert not nwGUI.isIndexing
     assert nwGUI.theIndex.tagIndex != {}
     assert nwGUI.theIndex.refIndex != {}
 
+    # Search the project
+    assert not nwGUI.projSearch.isVisible()
+    nwGUI.mainMenu.aSearchProject.activate(QAction.Trigger)
+    assert nwGUI.projSearch.isVisible()
+    nwGUI.projSearch.searchBox.setText("\"etiam laoreet\"")
+    qtbot.keyClick(nwGUI.projSearch.searchBox, Qt.Key_Return, delay=keyDelay)
+    assert nwGUI.projSearch.resultTree.topLevelItemCount() == 1
+    docItem = nwGUI.projSearch.resultTree.topLevelItem(0)
+    assert docItem.childCount() == 2
+    hitItem = docItem.child(1)
+    assert hitItem.text(0).startswith("9: ")
+    nwGUI.projSearch._openResult(hitItem, 0)
+    assert nwGUI.docEditor.theHandle == "88243afbe5ed8"
+    assert nwGUI.docEditor.textCursor().selectedText() == "Etiam laoreet"
+    nwGUI.closeDocument()
+    nwGUI.projSearch.clearSearch()
+    assert nwGUI.projSearch.resultTree.topLevelItemCount() == 0
+
     # Select a document in the project tree
     assert nwGUI.treeView.setSelectedHandle("88243afbe5ed8")
 
@@ -19,11 +19,14 @@ def testGuiOutline_Main(qtbot, monkeypatch, nwGUI, nwLipsum):
     """
     # Block message box
     monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.Yes)
+    monkeypatch.setattr(QMessageBox, "information", lambda *args: QMessageBox.Yes)
 
     assert nwGUI.openProject(nwLipsum)
     nwGUI.mainConf.lastPath = nwLipsum
 
     nwGUI.rebuildIndex()
+    assert nwGUI.waitForIndex()
+    assert not nwGUI.isIndexing
     nwGUI.tabWidget.setCurrentIndex(nwGUI.idxTabProj)
 
     assert nwGUI.projView.topLevelItemCount() > 0
@@ -68,6 +71,38 @@ def testGuiOutline_Main(qtbot, monkeypatch, nwGUI, nwLipsum):
     nwGUI.projMeta._tagClicked("#pov=Bod")
     assert nwGUI.docViewer.theHandle == "4c4f28287af27"
 
+    # Filter the headers by their references
+    theItems = nwGUI.projView.treeMap
+    nwGUI.projFilter.setText("@pov:Bod")
+    qtbot.keyClick(nwGUI.projFilter, Qt.Key_Return, delay=keyDelay)
+    assert nwGUI.projView.theFilter == "@pov:Bod"
+    assert not selItem.isHidden()
+    assert not chpItem.isHidden()
+    assert nwGUI.projView.topLevelItem(0).isHidden()
+    assert nwGUI.projView.setFilter("@pov:Bod") == 7
+
+    assert nwGUI.projView.setFilter("@pov:Bod -@location:Europe") == 0
+    assert all(tItem.isHidden() for tItem in theItems.values())
+    assert nwGUI.projView.setFilter("@unknown:Bod") is None
+
+    nwGUI.projFilter.clear()
+    assert nwGUI.projView.theFilter == ""
+    assert not any(tItem.isHidden() for tItem in theItems.values())
+
+    # Changes to a document's headers update the items in place
+    wCol = nwGUI.projView.colIndex[nwOutline.WCOUNT]
+    selItem = nwGUI.projView.topLevelItem(0)
+    nwGUI.theIndex.scanText("7a992350f3eb6", "# Lorem Ipsum\n\nSome new text.\n")
+    nwGUI.projView.refreshTree()
+    assert nwGUI.projView.topLevelItem(0) is selItem
+    assert selItem.text(wCol) == "5"
+
+    # Added headers require a rebuild
+    nwGUI.theIndex.scanText("7a992350f3eb6", "# Lorem Ipsum\n\n# Dolor Sit\n")
+    nwGUI.projView.refreshTree()
+    assert nwGUI.projView.topLevelItem(0) is not selItem
+    assert nwGUI.projView.topLevelItem(1).text(0) == "Dolor Sit"
+
     # qtbot.stopForInteraction()
 
 # END Test testGuiOutline_Main
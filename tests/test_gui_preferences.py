@@ -17,6 +17,7 @@ from PyQt5.QtWidgets import (
 from nw.gui import GuiPreferences
 from nw.config import Config
 from nw.gui.custom import QuotesDialog
+from nw.constants import nwConst
 
 keyDelay = 2
 typeDelay = 1
@@ -113,6 +114,7 @@ def testGuiPreferences_Main(qtbot, monkeypatch, fncDir, outDir, refDir):
     qtbot.wait(keyDelay)
     tabProjects.autoSaveDoc.setValue(20)
     tabProjects.autoSaveProj.setValue(40)
+    tabProjects.indexFormat.setCurrentIndex(tabProjects.indexFormat.findData(nwConst.IDX_SQLITE))
 
     # Text Layout Settings
     qtbot.wait(keyDelay)
@@ -223,7 +225,7 @@ def testGuiPreferences_Main(qtbot, monkeypatch, fncDir, outDir, refDir):
         2,                          # Timestamp
         9,                          # Release Notes
         12, 13, 14, 15, 16, 17, 18, # Window sizes
-        7, 28,                      # Fonts (depends on system default)
+        7, 29,                      # Fonts (depends on system default)
     ]
     assert cmpFiles(testFile, compFile, ignoreLines)
 
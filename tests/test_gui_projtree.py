@@ -5,11 +5,14 @@
 import pytest
 import os
 
+from time import sleep
 from tools import writeFile
 
 from PyQt5.QtCore import QItemSelectionModel
 from PyQt5.QtWidgets import QAction, QMessageBox
 
+from nw.core import NWIndex
+from nw.core.index import _scanDocFile
 from nw.constants import nwItemType, nwItemClass
 
 @pytest.mark.gui
@@ -205,3 +208,63 @@ def testGuiProjTree_TreeItems(qtbot, caplog, monkeypatch, nwGUI, nwMinimal):
     nwGUI.closeProject()
 
 # END Test testGuiProjTree_TreeItems
+
+@pytest.mark.gui
+def testGuiProjTree_ChangedOnDisk(qtbot, monkeypatch, nwGUI, nwMinimal):
+    """Test that the word counts of documents changed on disk are
+    updated in the tree when the project is opened.
+    """
+    # Block message box
+    monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.Yes)
+
+    # The project has no index, so it is built in the background
+    assert nwGUI.openProject(nwMinimal)
+    assert nwGUI.isIndexing
+    assert nwGUI.waitForIndex()
+    assert not nwGUI.isIndexing
+    assert nwGUI.theIndex.fileStamps != {}
+    assert nwGUI.saveProject()
+    nwGUI.closeProject()
+
+    # Add words to a scene
+    docFile = os.path.join(nwMinimal, "content", "8c659a11cd429.nwd")
+    writeFile(docFile, "### New Scene\n\nThree more words\n")
+
+    # Only the changed document is rescanned, and the counts are
+    # propagated up the tree
+    assert nwGUI.openProject(nwMinimal)
+    assert not nwGUI.isIndexing
+    nwTree = nwGUI.treeView
+    assert nwTree._getTreeItem("8c659a11cd429").text(nwTree.C_COUNT) == "5"
+    assert nwTree._getTreeItem("a6d311a93600a").text(nwTree.C_COUNT) == "7"
+    assert nwGUI.theProject.currWCount == 13
+
+    nwGUI.closeProject()
+
+    # Closing the project while the index is rebuilt waits for it, so
+    # the project is saved with the new counts
+    writeFile(docFile, "### New Scene\n\nFour more words here\n")
+    metaDir = os.path.join(nwMinimal, "meta")
+    for fileName in os.listdir(metaDir):
+        if fileName.startswith("tagsIndex"):
+            os.unlink(os.path.join(metaDir, fileName))
+
+    def slowScan(theJobs):
+        for theResult in map(_scanDocFile, theJobs):
+            sleep(0.1)
+            yield theResult
+
+    with monkeypatch.context() as mp:
+        mp.setattr(NWIndex, "scanDocFiles", slowScan)
+        assert nwGUI.openProject(nwMinimal)
+        assert nwGUI.isIndexing
+        assert nwGUI.closeProject()
+        assert not nwGUI.isIndexing
+
+    assert nwGUI.openProject(nwMinimal)
+    assert nwGUI.theProject.lastWCount == 14
+    assert nwTree._getTreeItem("8c659a11cd429").text(nwTree.C_COUNT) == "6"
+
+    nwGUI.closeProject()
+
+# END Test testGuiProjTree_ChangedOnDisk
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Reference Stats Dialog Class Tester
+"""
+
+import pytest
+
+from tools import getGuiItem
+
+from PyQt5.QtWidgets import QAction, QMessageBox
+
+from nw.gui import GuiRefStats
+from nw.constants import nwItemClass
+
+keyDelay = 2
+typeDelay = 1
+stepDelay = 20
+
+@pytest.mark.gui
+def testGuiRefStats_Dialog(qtbot, monkeypatch, nwGUI, nwLipsum):
+    """Test the reference statistics dialog.
+    """
+    # Block message box
+    monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.Yes)
+    monkeypatch.setattr(QMessageBox, "information", lambda *args: QMessageBox.Yes)
+
+    # Open project
+    nwGUI.theProject.projTree.setSeed(42)
+    assert nwGUI.openProject(nwLipsum)
+    assert nwGUI.waitForIndex()
+
+    # Open the dialog
+    nwGUI.mainMenu.aRefStats.activate(QAction.Trigger)
+    qtbot.waitUntil(lambda: getGuiItem("GuiRefStats") is not None, timeout=1000)
+
+    refStats = getGuiItem("GuiRefStats")
+    assert isinstance(refStats, GuiRefStats)
+    qtbot.wait(stepDelay)
+
+    # Only one character is referenced, so there are no pairs
+    assert refStats.itemClass.currentData() == nwItemClass.CHARACTER
+    assert refStats.pairList.topLevelItemCount() == 0
+    assert refStats.timeList.topLevelItemCount() == 1
+    tagItem = refStats.timeList.topLevelItem(0)
+    assert tagItem.text(0) == "Bod"
+    assert tagItem.text(1) == "7"
+    theStats = nwGUI.theIndex.getRefStats()
+    assert refStats.timeList.columnCount() == len(theStats.theChapters) + 2
+    assert [
+        tagItem.text(n + 2) or "0" for n in range(len(theStats.theChapters))
+    ] == [str(n) for n in theStats.getTimeline("Bod")]
+
+    # Switch to the locations
+    refStats.itemClass.setCurrentIndex(refStats.itemClass.findData(nwItemClass.WORLD))
+    assert refStats.timeList.topLevelItemCount() == 1
+    assert refStats.timeList.topLevelItem(0).text(0) == "Europe"
+
+    # Close, and check that the class is remembered
+    refStats._doClose()
+    assert nwGUI.theProject.optState.getString("GuiRefStats", "itemClass", "") == "WORLD"
+
+    # qtbot.stopForInteraction()
+
+# END Test testGuiRefStats_Dialog